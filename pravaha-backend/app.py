@@ -1,44 +1,191 @@
-# app.py (CORRECTED CODE)
+# app.py
 import os
-import requests # ADD THIS
-from datetime import datetime # ADD THIS, needed for date conversion
-from flask import Flask, request, jsonify
+import csv
+import base64
+import binascii
+import json
+import click
+import secrets
+import tempfile
+from functools import wraps
+from datetime import date, datetime # needed for date conversion
+from flask import Blueprint, Flask, Response, current_app, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
-# Update models import to include Expense
-from models import Company, User, Expense # <-- Make sure Expense is here
-from services.currency_service import get_currency_for_country 
-from services.exchange_service import convert_currency 
+from models import Company, User, Expense, ApprovalRule, ApprovalStep
+from services.currency_service import get_currency_for_country, refresh_country_index
 from services.exchange_service import convert_currency
-from services.ocr_service import extract_text_from_image
-# --- NEW: Import db from extensions.py ---
-from extensions import db 
+from services.ocr_service import extract_text_from_image, extract_text_from_bytes
+from services.ocr_jobs import OcrJobQueue, QueueFull
+from services import (
+    rate_store, expense_summary, bulk_expenses, hierarchy, approval_engine, auth, metrics, duplicates,
+    response_cache, exchange_service, ocr_service
+)
+from services.expense_queries import parse_expense_filters, apply_expense_filters, parse_page_args, paginate
+from services.expense_export import EXPORT_FORMATS, iter_export
+from services.rate_cache import HttpRateSource
+from extensions import db
+import migrations
 
 # Load environment variables
 load_dotenv()
-app = Flask(__name__)
-
-CORS(app)
-# --- Initialization & Configuration ---
-CORS(app, 
-     resources={r"/api/*": {"origins": "*"}},
-     allow_headers=["Content-Type", "Authorization"],
-     methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-     supports_credentials=False)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# --- Attach the database object to the app ---
-db.init_app(app)
-
-# NOW we can safely import models (The circular import is broken)
-from models import Company, User 
-from services.currency_service import get_currency_for_country
+
+# All routes and CLI commands live on this blueprint; create_app() wires it to an app.
+# cli_group=None keeps the commands top-level (flask import-rates, flask db-upgrade, ...)
+api = Blueprint('api', __name__, cli_group=None)
+
+# Registered first so the timing covers authentication too
+@api.before_app_request
+def start_request_metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        return
+    metrics.begin_request()
+    profiler = current_app.extensions['profiler']
+    g.profile_forced = profiler.enabled and request.headers.get('X-Profile') == '1'
+    g.profile = profiler.start(force=g.profile_forced)
+
+def _finish_request_metrics(status):
+    # Streamed responses (CSV export) are timed up to the first byte
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    stats, elapsed = metrics.end_request(request.method, route, status)
+    profile = g.pop('profile', None)
+    if profile is not None:
+        path = current_app.extensions['profiler'].finish(profile, route, elapsed, force=g.get('profile_forced', False))
+        if path:
+            print(f"Profiled {request.method} {route} ({elapsed * 1000:.0f} ms): {path}")
+    return stats, elapsed
+
+@api.after_app_request
+def finish_request_metrics(response):
+    if current_app.config['METRICS_ENABLED']:
+        stats, elapsed = _finish_request_metrics(response.status_code)
+        if stats is not None:
+            response.headers['Server-Timing'] = metrics.server_timing(stats, elapsed)
+    return response
+
+@api.teardown_app_request
+def record_failed_request(error):
+    # An exception that propagates (debug or testing mode) skips after_app_request; count it as a 500
+    if error is not None and current_app.config['METRICS_ENABLED']:
+        _finish_request_metrics(500)
+
+@api.before_app_request
+def load_principal():
+    # Verifies the bearer token, if any; each route decides whether it needs one
+    g.principal, g.auth_error = None, None
+    try:
+        g.principal = current_app.extensions['auth'].authenticate(request.headers.get('Authorization'))
+    except auth.AuthError as e:
+        g.auth_error = str(e)
+
+def login_required(*roles):
+    # Rejects requests without a valid token (401) or, when roles are given, from other roles (403)
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if g.principal is None:
+                return jsonify({"message": g.auth_error or "Authentication required."}), 401
+            if roles and g.principal.role not in roles:
+                return jsonify({"message": f"Permission denied. {' or '.join(roles)} access required."}), 403
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+# Anyone signed in may call the approval routes: approvers named by a workflow step (a role such as
+# Finance, or listed users) decide on that step; expenses without a workflow need a Manager or Admin
+DIRECT_APPROVER_ROLES = ('Manager', 'Admin')
+
+# Company-wide reads (export, analytics)
+COMPANY_REPORT_ROLES = ('Admin', 'Manager', 'Finance')
+
+def cached_read(scopes):
+    # Serves a listing from the response cache until a write bumps one of the data scopes it reads
+    # (scopes(kwargs) -> [('company', id), ('user', id)], or None to bypass), and answers a matching
+    # If-None-Match with 304. Versions are read before the view runs, so a write that commits
+    # meanwhile leaves its result under a key no later read asks for. Entries are per caller, since
+    # a signed-in view may answer differently depending on who asks.
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            read_scopes = scopes(kwargs)
+            if read_scopes is None:
+                return view(*args, **kwargs)
+            cache = current_app.extensions['response_cache']
+            caller = g.principal.user_id if g.principal is not None else None
+            key = (request.path, tuple(sorted(request.args.items(multi=True))), caller, cache.versions(read_scopes))
+            entry = cache.get(key)
+            if entry is None:
+                response, status = view(*args, **kwargs)
+                if status != 200:
+                    return response, status
+                body = response.get_data()
+                entry = (body, response_cache.etag(body), response.headers.get('X-Next-Cursor'))
+                cache.put(key, entry)
+
+            body, etag, next_cursor = entry
+            response = current_app.response_class(body, mimetype='application/json')
+            if next_cursor:
+                response.headers['X-Next-Cursor'] = next_cursor
+            response.set_etag(etag)
+            # Cacheable by the browser, but revalidated (cheaply, via the ETag) on every use
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response.make_conditional(request)
+        return wrapped
+    return decorator
+
+def _principal_company_scope():
+    # Listings of the caller's own company
+    return [('company', g.principal.company_id)]
+
+def listings_changed(company_id, user_ids=()):
+    # Call after the commit: cached listings of the company and of these submitters are now stale
+    scopes = [('company', company_id)] + [('user', user_id) for user_id in set(user_ids)]
+    current_app.extensions['response_cache'].bump(*scopes)
+
+def _cache_stats():
+    # stats() of this process' in-memory caches, by cache name
+    return {
+        'response': current_app.extensions['response_cache'].stats(),
+        'principal': current_app.extensions['auth'].stats(),
+        'approval_rules': approval_engine.cache_stats(),
+        'exchange_rates': exchange_service.get_rate_cache_stats(),
+        'ocr_results': ocr_service.cache.stats(),
+    }
+
+# stats() field -> result label of pravaha_cache_lookups_total
+CACHE_LOOKUP_RESULTS = {'hits': 'hit', 'disk_hits': 'disk_hit', 'misses': 'miss', 'stale': 'stale', 'coalesced': 'coalesced'}
+
+# Read from the caches and the OCR queue at scrape time
+RUNTIME_FAMILIES = [
+    metrics.Collected(
+        'pravaha_cache_entries', "Entries held by the in-memory caches.", ('cache',),
+        lambda: {(name,): stats['entries'] for name, stats in _cache_stats().items()}
+    ),
+    metrics.Collected(
+        'pravaha_cache_lookups_total', "In-memory cache lookups by result.", ('cache', 'result'),
+        lambda: {
+            (name, result): stats[field]
+            for name, stats in _cache_stats().items()
+            for field, result in CACHE_LOOKUP_RESULTS.items() if field in stats
+        },
+        kind='counter'
+    ),
+    metrics.Collected(
+        'pravaha_ocr_jobs', "OCR jobs queued or running (active) and kept for polling (tracked).", ('state',),
+        lambda: {(state,): current_app.extensions['ocr_jobs'].stats()[state] for state in ('active', 'tracked')}
+    ),
+]
+
+@api.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # Prometheus scrape target: request latency, SQL statements, section timings and cache state of this process
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({"message": "Metrics are disabled."}), 404
+    return Response(metrics.render(*RUNTIME_FAMILIES), mimetype='text/plain; version=0.0.4')
 
 # --- Rest of your routes remain the same ---
-@app.route('/api/signup', methods=['POST'])
+@api.route('/api/signup', methods=['POST'])
 def initial_signup():
     # ... (Your existing code for initial_signup remains here) ...
     # (No changes needed inside this function)
@@ -58,6 +205,8 @@ def initial_signup():
 
     try:
         currency_code = get_currency_for_country(country)
+        if currency_code is None:
+            return jsonify({"message": f"Unknown country: {country}."}), 400
         
         new_company = Company(name=company_name, currency_code=currency_code)
         db.session.add(new_company)
@@ -72,6 +221,8 @@ def initial_signup():
         )
         new_admin.set_password(password)
         db.session.add(new_admin)
+        db.session.flush()
+        hierarchy.add_user(new_admin.id)
         
         db.session.commit()
 
@@ -86,7 +237,7 @@ def initial_signup():
         print(f"Error during initial sign-up: {e}")
         return jsonify({"message": "An error occurred during setup. Check server logs."}), 500
     
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
         data = request.get_json()
         email = data.get('email')
@@ -94,16 +245,33 @@ def login():
     
         if not all([email, password]):
             return jsonify({"message": "Email and password are required."}), 400
+        if not isinstance(email, str) or not isinstance(password, str):
+            # No account has a non-string email or password
+            return jsonify({"message": "Invalid email or password."}), 401
+
+        # Repeated failures are refused before spending a password hash on them
+        authenticator = current_app.extensions['auth']
+        throttle_key = f"{request.remote_addr}|{email.strip().lower()}"
+        retry_after = authenticator.throttle.retry_after(throttle_key)
+        if retry_after:
+            response = jsonify({"message": "Too many failed login attempts. Try again later."})
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 429
     
         user = User.query.filter_by(email=email).first()
     
         # Check if user exists OR if the provided password matches the stored hash
         if user is None or not user.check_password(password):
+            authenticator.throttle.failure(throttle_key)
             return jsonify({"message": "Invalid email or password."}), 401
+        authenticator.throttle.success(throttle_key)
     
-        # Returns basic user info and role upon successful login
+        # Returns basic user info, role and the access token for later requests
         return jsonify({
             "message": "Login successful.",
+            "access_token": authenticator.issue(user),
+            "token_type": "Bearer",
+            "expires_in": authenticator.token_ttl,
             "user_id": user.id,
             "email": user.email,
             "full_name": user.full_name,
@@ -111,14 +279,12 @@ def login():
             "company_id": user.company_id
         }), 200
 
-@app.route('/api/admin/users', methods=['GET'])
+@api.route('/api/admin/users', methods=['GET'])
+@login_required('Admin')
 def get_all_users():
-    # Get company_id from query params or use authorization
-    company_id = request.args.get('company_id')
-    
-    if not company_id:
-        return jsonify({"message": "Company ID is required."}), 400
-    
+    # Users of the admin's own company
+    company_id = g.principal.company_id
+
     try:
         users = User.query.filter_by(company_id=company_id).all()
         
@@ -138,24 +304,19 @@ def get_all_users():
         print(f"Error fetching users: {e}")
         return jsonify({"message": "Could not fetch users."}), 500
 
-@app.route('/api/admin/user', methods=['POST'])
+@api.route('/api/admin/user', methods=['POST'])
+@login_required('Admin')
 def create_user():
     data = request.get_json()
-    
-    # Simple authorization check (MUST be replaced by token/session checking later)
-    # For testing, we send the role in the body
-    requester_role = data.get('requester_role') 
-    if requester_role != 'Admin':
-        return jsonify({"message": "Permission denied. Admin access required."}), 403
 
     email = data.get('email')
     password = data.get('password')
     full_name = data.get('full_name')
-    # Admin specifies the role (Manager or Employee)
+    # Admin specifies the role (Manager or Employee); new users join the admin's company
     role = data.get('role', 'Employee') 
-    company_id = data.get('company_id') 
+    company_id = g.principal.company_id
 
-    if not all([email, password, full_name, company_id]):
+    if not all([email, password, full_name]):
         return jsonify({"message": "Missing required fields."}), 400
 
     if User.query.filter_by(email=email).first():
@@ -171,6 +332,8 @@ def create_user():
         )
         new_user.set_password(password)
         db.session.add(new_user)
+        db.session.flush()
+        hierarchy.add_user(new_user.id)
         db.session.commit()
 
         return jsonify({
@@ -183,110 +346,182 @@ def create_user():
         print(f"Error creating user: {e}")
         return jsonify({"message": "Could not create user."}), 500
 
-@app.route('/api/expenses/company/<int:company_id>', methods=['GET'])
+def _expense_page(output, next_cursor):
+    # Keyset pages keep the plain list body; the next cursor travels in a header
+    response = jsonify(output)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@api.route('/api/expenses/company/<int:company_id>', methods=['GET'])
+@cached_read(lambda kwargs: [('company', kwargs['company_id'])])
 def get_company_expenses(company_id):
     try:
-        expenses = Expense.query.filter_by(company_id=company_id).all()
+        filters = parse_expense_filters(request.args)
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        # Only the serialized columns are selected; no Expense objects are hydrated
+        query = db.session.query(
+            Expense.id, Expense.amount, Expense.status, Expense.date
+        ).filter(Expense.company_id == company_id)
+        query = apply_expense_filters(query, filters)
+        rows, next_cursor = paginate(query, limit, cursor)
         
         output = []
-        for expense in expenses:
+        for row in rows:
             output.append({
-                'id': expense.id,
-                'amount': float(expense.amount),
-                'status': expense.status
+                'id': row.id,
+                'amount': float(row.amount),
+                'status': row.status
             })
         
-        return jsonify(output), 200
+        return _expense_page(output, next_cursor), 200
         
     except Exception as e:
         print(f"Error fetching company expenses: {e}")
         return jsonify({"message": "Could not fetch expenses."}), 500
     
-@app.route('/api/expenses/pending', methods=['GET'])
+@api.route('/api/expenses/company/<int:company_id>/export', methods=['GET'])
+@login_required(*COMPANY_REPORT_ROLES)
+def export_company_expenses(company_id):
+    # Streams every matching row as NDJSON (default) or CSV without building the full list
+    if company_id != g.principal.company_id:
+        return jsonify({"message": "Company not found."}), 404
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"message": "Invalid format. Must be 'ndjson' or 'csv'."}), 400
+
+    try:
+        filters = parse_expense_filters(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    response = Response(
+        stream_with_context(iter_export(company_id, filters, export_format)),
+        mimetype=EXPORT_FORMATS[export_format]
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename=company-{company_id}-expenses.{export_format}'
+    return response
+
+@api.route('/api/expenses/pending', methods=['GET'])
+@login_required(*DIRECT_APPROVER_ROLES)
+@cached_read(lambda kwargs: _principal_company_scope())
 def get_pending_expenses():
-    company_id = request.args.get('company_id')
-    manager_id = request.args.get('manager_id')  # Add this
-    
-    if not company_id:
-        return jsonify({"message": "Company ID is required."}), 400
+    # The caller's company; a Manager sees the expenses below them, an Admin everyone's
+    # (or those below the manager_id they pass)
+    company_id = g.principal.company_id
+    if g.principal.role == 'Manager':
+        manager_id = g.principal.user_id
+    else:
+        manager_id = request.args.get('manager_id', type=int)
+    # scope=all (default): everyone below the manager; scope=direct: direct reports only
+    scope = request.args.get('scope', 'all')
+
+    if scope not in ('all', 'direct'):
+        return jsonify({"message": "Invalid scope. Must be one of all, direct."}), 400
+
+    try:
+        filters = parse_expense_filters(request.args)
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    # This listing is always the Pending queue
+    filters.pop('status', None)
     
     try:
-        # If manager_id is provided, filter by their direct reports only
+        # One round trip: submitter name and base currency come from the join,
+        # and the manager filter runs in SQL instead of a separate employee lookup
+        query = db.session.query(
+            Expense.id, Expense.amount, Expense.currency, Expense.base_amount,
+            Expense.category, Expense.description, Expense.date, Expense.status,
+            Expense.user_id, User.full_name.label('user_name'),
+            Company.currency_code.label('base_currency')
+        ).join(
+            User, Expense.user_id == User.id
+        ).join(
+            Company, User.company_id == Company.id
+        ).filter(
+            Expense.company_id == company_id,
+            Expense.status == 'Pending'
+        )
+
+        # If manager_id is provided, filter by the users below them in the hierarchy
+        # (Admin sees all pending expenses)
         if manager_id:
-            # Get all employees who report to this manager
-            employees = User.query.filter_by(manager_id=manager_id).all()
-            employee_ids = [emp.id for emp in employees]
-            
-            expenses = Expense.query.filter(
-                Expense.company_id == company_id,
-                Expense.status == 'Pending',
-                Expense.user_id.in_(employee_ids)
-            ).order_by(Expense.date.desc()).all()
-        else:
-            # Admin sees all pending expenses
-            expenses = Expense.query.filter_by(
-                company_id=company_id,
-                status='Pending'
-            ).order_by(Expense.date.desc()).all()
+            max_depth = 1 if scope == 'direct' else None
+            query = query.filter(hierarchy.reports_filter(Expense.user_id, manager_id, max_depth))
+
+        query = apply_expense_filters(query, filters)
+        rows, next_cursor = paginate(query, limit, cursor)
         
         output = []
-        for expense in expenses:
-            user = User.query.get(expense.user_id)
+        for row in rows:
             output.append({
-                'id': expense.id,
-                'amount': float(expense.amount),
-                'currency': expense.currency,
-                'base_amount': float(expense.base_amount),
-                'base_currency': user.company.currency_code,
-                'category': expense.category,
-                'description': expense.description,
-                'date': expense.date.strftime('%Y-%m-%d'),
-                'status': expense.status,
-                'user_name': user.full_name,
-                'user_id': user.id
+                'id': row.id,
+                'amount': float(row.amount),
+                'currency': row.currency,
+                'base_amount': float(row.base_amount),
+                'base_currency': row.base_currency,
+                'category': row.category,
+                'description': row.description,
+                'date': row.date.strftime('%Y-%m-%d'),
+                'status': row.status,
+                'user_name': row.user_name,
+                'user_id': row.user_id
             })
         
-        return jsonify(output), 200
+        return _expense_page(output, next_cursor), 200
         
     except Exception as e:
         print(f"Error fetching pending expenses: {e}")
         return jsonify({"message": "Could not fetch pending expenses."}), 500
     
-@app.route('/api/admin/assign-manager', methods=['PATCH'])
+@api.route('/api/admin/assign-manager', methods=['PATCH'])
+@login_required('Admin')
 def assign_manager():
     data = request.get_json()
     
-    # NOTE: Authorization check (still using requester_role from body for simplicity)
-    requester_role = data.get('requester_role') 
     employee_id = data.get('employee_id')
     manager_id = data.get('manager_id') # Can be NULL/None to unassign
-
-    # 1. Authorization Check
-    if requester_role != 'Admin':
-        return jsonify({"message": "Permission denied. Admin access required."}), 403
     
-    # 2. Input Validation
+    # 1. Input Validation
     if not employee_id:
         return jsonify({"message": "Employee ID is required."}), 400
 
     try:
-        employee = User.query.get(employee_id)
-        if not employee:
+        # One assignment at a time per company, so the cycle check below sees every committed move
+        hierarchy.lock_company(g.principal.company_id)
+        employee = User.query.populate_existing().get(employee_id)
+        if not employee or employee.company_id != g.principal.company_id:
             return jsonify({"message": "User to assign manager to not found."}), 404
 
-        # 3. Validation: Check if manager exists and has a valid role
+        # 2. Validation: Check if manager exists and has a valid role
         if manager_id is not None:
             manager = User.query.get(manager_id)
             if not manager or manager.role not in ['Admin', 'Manager']:
                 return jsonify({"message": "Invalid Manager ID or user lacks manager role."}), 400
             
-            # 4. Validation: Prevent setting self as manager
+            if manager.company_id != employee.company_id:
+                return jsonify({"message": "Manager must belong to the same company."}), 400
+
+            # 3. Validation: Prevent setting self as manager
             if manager_id == employee_id:
                  return jsonify({"message": "Cannot assign employee as their own manager."}), 400
         
-        # 5. Update Relationship
-        employee.manager_id = manager_id
+        # 4. Update Relationship (and the precomputed hierarchy in the same transaction)
+        if employee.manager_id != manager_id:
+            try:
+                hierarchy.move_subtree(employee.id, manager_id)
+            except hierarchy.HierarchyCycleError:
+                return jsonify({"message": "Cannot assign a manager who reports to this user."}), 400
+            employee.manager_id = manager_id
         db.session.commit()
+        current_app.extensions['auth'].invalidate(employee.id)
+        # Pending listings filtered by manager follow the hierarchy
+        listings_changed(employee.company_id)
 
         return jsonify({
             "message": f"Manager assigned successfully for user ID {employee_id}.",
@@ -298,22 +533,66 @@ def assign_manager():
         print(f"Error assigning manager: {e}")
         return jsonify({"message": "An error occurred during manager assignment."}), 500
     
+def _same_company_user(user_id):
+    # The user, if they belong to the caller's company
+    user = User.query.get(user_id)
+    return user if user is not None and user.company_id == g.principal.company_id else None
+
+@api.route('/api/users/<int:user_id>/reports', methods=['GET'])
+@login_required()
+def get_user_reports(user_id):
+    # Everyone below the user in the manager tree, nearest first (max_depth=1: direct reports)
+    max_depth = request.args.get('max_depth', type=int)
+    if not _same_company_user(user_id):
+        return jsonify({"message": "User not found."}), 404
+    try:
+        rows = db.session.execute(hierarchy.reports_query(user_id, max_depth)).all()
+        return jsonify({
+            "user_id": user_id,
+            "count": len(rows),
+            "reports": [{
+                'id': row.id,
+                'full_name': row.full_name,
+                'email': row.email,
+                'role': row.role,
+                'manager_id': row.manager_id,
+                'depth': row.depth
+            } for row in rows]
+        }), 200
+    except Exception as e:
+        print(f"Error fetching reports: {e}")
+        return jsonify({"message": "Could not fetch reports."}), 500
+
+@api.route('/api/users/<int:user_id>/approval-chain', methods=['GET'])
+@login_required()
+def get_approval_chain(user_id):
+    # Managers above the user, from the direct manager to the top of the tree
+    if not _same_company_user(user_id):
+        return jsonify({"message": "User not found."}), 404
+    try:
+        rows = db.session.execute(hierarchy.approval_chain_query(user_id)).all()
+        return jsonify({
+            "user_id": user_id,
+            "chain": [{
+                'id': row.id,
+                'full_name': row.full_name,
+                'role': row.role,
+                'depth': row.depth
+            } for row in rows]
+        }), 200
+    except Exception as e:
+        print(f"Error fetching approval chain: {e}")
+        return jsonify({"message": "Could not fetch approval chain."}), 500
+    
 # app.py (New Route: Expense Submission)
 
-@app.route('/api/expenses', methods=['POST'])
+@api.route('/api/expenses', methods=['POST'])
+@login_required()
 def submit_expense():
     data = request.get_json()
     
-    # Authentication Placeholder: Use the user_id for submission
-    # In a real app, this would come from a JWT token in the header.
-    user_id = data.get('user_id') 
-    
-    if not user_id:
-        return jsonify({"message": "User ID is required for submission."}), 401
-
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({"message": "User not found."}), 404
+    # The submitter is whoever the access token belongs to
+    user_id = g.principal.user_id
         
     # Input Data
     try:
@@ -325,16 +604,40 @@ def submit_expense():
 
         if not all([amount, currency, category, date_str]):
             return jsonify({"message": "Missing required expense fields."}), 400
+        try:
+            amount = bulk_expenses.parse_amount(amount)
+            currency = bulk_expenses.parse_currency(currency)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        expense_date = datetime.strptime(date_str, '%Y-%m-%d').date()
+
+        # Same receipt image, or same amount and currency within a few days: ask before storing it twice
+        entry = duplicates.Entry(
+            None, user_id, g.principal.company_id, duplicates.fingerprint(amount, currency), expense_date,
+            duplicates.normalize_receipt_hash(data.get('receipt_hash')),
+            duplicates.normalize_merchant(data.get('merchant'))
+        )
+        if data.get('allow_duplicate') is not True:
+            matches = duplicates.find_duplicates(entry)
+            if matches:
+                return jsonify({
+                    "message": f"This looks like a duplicate of expense #{matches[0]['id']} ({matches[0]['date']}). "
+                               "Submit again with allow_duplicate set to true to keep both.",
+                    "duplicates": matches
+                }), 409
 
         # 1. Get Company's Base Currency
-        company = Company.query.get(user.company_id)
+        company = Company.query.get(g.principal.company_id)
         base_currency = company.currency_code
         
-        # 2. Convert Amount to Base Currency
-        base_amount = convert_currency(currency, base_currency, amount)
+        # 2. Convert Amount to Base Currency (rate as of the expense date, from the local store)
+        base_amount = convert_currency(currency, base_currency, amount, as_of=expense_date)
         
         if base_amount is None:
             return jsonify({"message": "Could not calculate base currency amount. Check API status."}), 500
+        if base_amount > bulk_expenses.MAX_AMOUNT:
+            return jsonify({"message": "Amount is too large in the base currency."}), 400
 
         # 3. Create Expense Record
         new_expense = Expense(
@@ -344,17 +647,26 @@ def submit_expense():
             category=category,
             description=description,
             # Convert date string to date object for PostgreSQL
-            date=datetime.strptime(date_str, '%Y-%m-%d').date(), 
+            date=expense_date, 
             user_id=user_id,
-            company_id=user.company_id
+            company_id=g.principal.company_id,
+            fingerprint=entry.fingerprint,
+            receipt_hash=entry.receipt_hash,
+            merchant=entry.merchant
         )
         
         db.session.add(new_expense)
+        db.session.flush()
+        # Keep the analytics rollup and the approval workflow in the same transaction as the insert
+        expense_summary.record_submission(new_expense)
+        routed = approval_engine.start_workflows([new_expense])
         db.session.commit()
+        listings_changed(g.principal.company_id, [user_id])
         
         return jsonify({
             "message": "Expense submitted successfully and base currency calculated.",
             "expense_id": new_expense.id,
+            "approval_workflow": bool(routed),
             "submitted_amount": float(amount),
             "submitted_currency": currency,
             "base_amount": base_amount,
@@ -366,43 +678,100 @@ def submit_expense():
         print(f"Error submitting expense: {e}")
         return jsonify({"message": "An error occurred during expense submission."}), 500
     
-@app.route('/api/expenses/user/<int:user_id>', methods=['GET'])
+@api.route('/api/expenses/bulk', methods=['POST'])
+@login_required()
+def submit_expenses_bulk():
+    # Accepts JSON {"expenses": [...]} or a multipart CSV upload in "file" (columns: amount,
+    # currency, category, description, date and optionally user_id). Rows are the caller's
+    # own expenses; only admins may name other users of their company in user_id. Rows that
+    # duplicate an existing expense (or an earlier row) fail unless allow_duplicates is set.
+    upload = request.files.get('file')
+    try:
+        if upload:
+            rows = bulk_expenses.parse_csv(upload.stream)
+            allow_duplicates = request.form.get('allow_duplicates') == 'true'
+        else:
+            data = request.get_json()
+            rows = data.get('expenses')
+            allow_duplicates = data.get('allow_duplicates') is True
+    except (ValueError, UnicodeDecodeError, AttributeError, csv.Error):
+        return jsonify({"message": "Could not read the uploaded expenses."}), 400
+
+    if not isinstance(rows, list) or not rows:
+        return jsonify({"message": "A non-empty list of expenses is required."}), 400
+    if len(rows) > bulk_expenses.BULK_MAX_ROWS:
+        return jsonify({"message": f"Too many expenses. The limit is {bulk_expenses.BULK_MAX_ROWS} per request."}), 413
+
+    try:
+        results, created = bulk_expenses.submit_bulk(
+            rows, g.principal.user_id, company_id=g.principal.company_id, on_behalf=g.principal.role == 'Admin',
+            allow_duplicates=allow_duplicates
+        )
+        db.session.commit()
+        if created:
+            listings_changed(
+                g.principal.company_id, [result['user_id'] for result in results if result['status'] == 'created']
+            )
+
+        return jsonify({
+            "message": f"{created} of {len(rows)} expenses submitted.",
+            "created": created,
+            "failed": len(rows) - created,
+            "results": results
+        }), 201 if created else 400
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error submitting bulk expenses: {e}")
+        return jsonify({"message": "An error occurred during bulk expense submission."}), 500
+
+@api.route('/api/expenses/user/<int:user_id>', methods=['GET'])
+@cached_read(lambda kwargs: [('user', kwargs['user_id'])])
 def get_user_expenses(user_id):
     # This route retrieves all expenses submitted by a specific user.
-    user = User.query.get(user_id)
+    user = db.session.query(User.id, Company.currency_code).join(
+        Company, User.company_id == Company.id
+    ).filter(User.id == user_id).first()
     if not user:
         return jsonify({"message": "User not found."}), 404
 
+    try:
+        filters = parse_expense_filters(request.args)
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
     # Fetch expenses for the user, ordered by date (newest first)
-    expenses = Expense.query.filter_by(user_id=user_id).order_by(Expense.date.desc()).all()
+    query = db.session.query(
+        Expense.id, Expense.amount, Expense.currency, Expense.base_amount,
+        Expense.category, Expense.description, Expense.date, Expense.status
+    ).filter(Expense.user_id == user_id)
+    query = apply_expense_filters(query, filters)
+    rows, next_cursor = paginate(query, limit, cursor)
     
     output = []
-    for expense in expenses:
+    for row in rows:
         output.append({
-            'id': expense.id,
-            'amount': float(expense.amount),
-            'currency': expense.currency,
-            'base_amount': float(expense.base_amount),
-            'base_currency': user.company.currency_code,
-            'category': expense.category,
-            'description': expense.description,
-            'date': expense.date.strftime('%Y-%m-%d'),
-            'status': expense.status
+            'id': row.id,
+            'amount': float(row.amount),
+            'currency': row.currency,
+            'base_amount': float(row.base_amount),
+            'base_currency': user.currency_code,
+            'category': row.category,
+            'description': row.description,
+            'date': row.date.strftime('%Y-%m-%d'),
+            'status': row.status
         })
 
-    return jsonify(output), 200
+    return _expense_page(output, next_cursor), 200
 
-@app.route('/api/expenses/approve/<int:expense_id>', methods=['PATCH'])
+@api.route('/api/expenses/approve/<int:expense_id>', methods=['PATCH'])
+@login_required()
 def update_expense_status(expense_id):
     data = request.get_json()
     
-    # Placeholder for authorization check
-    requester_role = data.get('requester_role') 
-    # In a real app, manager_id is verified to be the user's actual manager.
-    manager_id = data.get('manager_id') 
-
-    if requester_role not in ['Admin', 'Manager']:
-        return jsonify({"message": "Permission denied. Manager or Admin access required."}), 403
+    # The approver is whoever the access token belongs to
+    manager_id = g.principal.user_id
 
     new_status = data.get('status') 
     if new_status not in ['Approved', 'Rejected']:
@@ -411,14 +780,50 @@ def update_expense_status(expense_id):
     expense = Expense.query.get(expense_id)
     if not expense:
         return jsonify({"message": "Expense not found."}), 404
+    if expense.company_id != g.principal.company_id:
+        return jsonify({"message": "Expense belongs to another company."}), 403
 
     # Simple check: Ensure the requester is not approving their own expense
     if expense.user_id == manager_id:
         return jsonify({"message": "Managers cannot approve or reject their own expenses."}), 403
 
     try:
+        # One decision at a time per expense: lock it, then re-read its status and steps
+        approval_engine.lock_expenses([expense.id])
+        db.session.refresh(expense)
+
+        # Expenses routed by an approval rule move step by step; the rest flip directly
+        steps = approval_engine.load_steps([expense.id]).get(expense.id)
+        if steps:
+            outcome, final_status = approval_engine.decide(steps, manager_id, new_status)
+            if outcome == 'not_approver':
+                db.session.rollback()
+                return jsonify({"message": "You are not an approver for the current step of this expense."}), 403
+            if outcome == 'closed':
+                db.session.rollback()
+                return jsonify({"message": "Approval workflow for this expense is already complete."}), 409
+            if final_status:
+                old_status = expense.status
+                expense.status = final_status
+                expense_summary.record_status_change(expense, old_status, final_status)
+            db.session.commit()
+            if final_status:
+                listings_changed(expense.company_id, [expense.user_id])
+
+            return jsonify({
+                "message": f"Decision recorded. Expense ID {expense_id} is {expense.status}.",
+                "new_status": expense.status,
+                "approved_by": manager_id,
+                "approval_steps": approval_engine.progress(steps)
+            }), 200
+
+        if g.principal.role not in DIRECT_APPROVER_ROLES:
+            return jsonify({"message": "Permission denied. Manager or Admin access required."}), 403
+        old_status = expense.status
         expense.status = new_status
+        expense_summary.record_status_change(expense, old_status, new_status)
         db.session.commit()
+        listings_changed(expense.company_id, [expense.user_id])
         
         return jsonify({
             "message": f"Expense ID {expense_id} status updated to {new_status}.",
@@ -431,20 +836,265 @@ def update_expense_status(expense_id):
         print(f"Error updating expense status: {e}")
         return jsonify({"message": "Could not update expense status."}), 500
     
-@app.route('/api/ocr/process', methods=['POST'])
-def process_receipt_ocr():
+@api.route('/api/expenses/approve/bulk', methods=['PATCH'])
+@login_required()
+def update_expense_status_bulk():
     data = request.get_json()
-    image_data_b64 = data.get('image_data') # Base64 encoded string
+    
+    # Same rules as the single-expense route
+    manager_id = g.principal.user_id
 
-    if not image_data_b64:
-        return jsonify({"message": "Base64 image data is required."}), 400
+    new_status = data.get('status') 
+    if new_status not in ['Approved', 'Rejected']:
+        return jsonify({"message": "Invalid status. Must be 'Approved' or 'Rejected'."}), 400
+
+    expense_ids = data.get('expense_ids')
+    if not isinstance(expense_ids, list) or not expense_ids or not all(isinstance(i, int) for i in expense_ids):
+        return jsonify({"message": "A non-empty list of integer expense IDs is required."}), 400
+    if len(expense_ids) > bulk_expenses.BULK_MAX_DECISIONS:
+        return jsonify({"message": f"Too many expenses. The limit is {bulk_expenses.BULK_MAX_DECISIONS} per request."}), 413
+
+    try:
+        results, updated = bulk_expenses.update_status_bulk(
+            expense_ids, new_status, manager_id, company_id=g.principal.company_id,
+            direct=g.principal.role in DIRECT_APPROVER_ROLES
+        )
+        db.session.commit()
+        if updated:
+            listings_changed(
+                g.principal.company_id, [result['user_id'] for result in results if result['status'] == 'updated']
+            )
+
+        return jsonify({
+            "message": f"{updated} of {len(expense_ids)} expenses updated to {new_status}.",
+            "updated": updated,
+            "approved_by": manager_id,
+            "results": results
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error updating expense statuses: {e}")
+        return jsonify({"message": "Could not update expense statuses."}), 500
+
+def _serialize_rule(rule):
+    return {
+        'id': rule.id,
+        'company_id': rule.company_id,
+        'name': rule.name,
+        'priority': rule.priority,
+        'active': rule.active,
+        'conditions': rule.conditions,
+        'steps': rule.steps
+    }
+
+@api.route('/api/companies/<int:company_id>/approval-rules', methods=['GET'])
+@login_required('Admin')
+def get_approval_rules(company_id):
+    if company_id != g.principal.company_id:
+        return jsonify({"message": "Company not found."}), 404
+    rules = ApprovalRule.query.filter_by(company_id=company_id).order_by(
+        ApprovalRule.priority, ApprovalRule.id
+    ).all()
+    return jsonify([_serialize_rule(rule) for rule in rules]), 200
+
+@api.route('/api/companies/<int:company_id>/approval-rules', methods=['POST'])
+@login_required('Admin')
+def create_approval_rule(company_id):
+    data = request.get_json()
+
+    if company_id != g.principal.company_id:
+        return jsonify({"message": "Company not found."}), 404
+
+    name = data.get('name')
+    priority = data.get('priority', 100)
+    if not name or not isinstance(priority, int):
+        return jsonify({"message": "A rule needs a name and an integer priority."}), 400
+
+    try:
+        # Validate by compiling; the engine recompiles from the stored definition
+        approval_engine.compile_rule(None, name, priority, data.get('conditions'), data.get('steps'))
+    except approval_engine.RuleError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        rule = ApprovalRule(
+            company_id=company_id,
+            name=name,
+            priority=priority,
+            conditions=data.get('conditions') or {},
+            steps=data.get('steps')
+        )
+        db.session.add(rule)
+        db.session.commit()
+        approval_engine.invalidate(company_id)
+
+        return jsonify(dict(_serialize_rule(rule), message="Approval rule created.")), 201
+
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error creating approval rule: {e}")
+        return jsonify({"message": "Could not create approval rule."}), 500
+
+@api.route('/api/approval-rules/<int:rule_id>', methods=['DELETE'])
+@login_required('Admin')
+def deactivate_approval_rule(rule_id):
+    # Rules are deactivated, not deleted: in-flight workflows keep pointing at them
+    rule = ApprovalRule.query.get(rule_id)
+    if not rule or rule.company_id != g.principal.company_id:
+        return jsonify({"message": "Approval rule not found."}), 404
+
+    rule.active = False
+    db.session.commit()
+    approval_engine.invalidate(rule.company_id)
+    return jsonify({"message": f"Approval rule {rule_id} deactivated."}), 200
 
-    # Call the OCR service
-    ocr_result = extract_text_from_image(image_data_b64)
+@api.route('/api/expenses/<int:expense_id>/approvals', methods=['GET'])
+@login_required()
+def get_expense_approvals(expense_id):
+    expense = Expense.query.get(expense_id)
+    if not expense:
+        return jsonify({"message": "Expense not found."}), 404
+    if expense.company_id != g.principal.company_id:
+        return jsonify({"message": "Expense belongs to another company."}), 403
+    steps = approval_engine.load_steps([expense_id]).get(expense_id, [])
+    return jsonify({"expense_id": expense_id, "approval_steps": approval_engine.progress(steps)}), 200
+
+@api.route('/api/approvals/pending', methods=['GET'])
+@login_required()
+def get_pending_approvals():
+    # Expenses whose current approval step is waiting on the caller
+    approver_id = g.principal.user_id
+
+    try:
+        filters = parse_expense_filters(request.args)
+        limit, cursor = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    query = db.session.query(
+        Expense.id, Expense.amount, Expense.currency, Expense.base_amount,
+        Expense.category, Expense.description, Expense.date, Expense.status,
+        Expense.user_id, User.full_name.label('user_name'), ApprovalStep.sequence
+    ).join(
+        ApprovalStep, ApprovalStep.expense_id == Expense.id
+    ).join(
+        User, Expense.user_id == User.id
+    ).filter(
+        ApprovalStep.approver_id == approver_id,
+        ApprovalStep.status == 'Pending'
+    )
+    query = apply_expense_filters(query, filters)
+    rows, next_cursor = paginate(query, limit, cursor)
+
+    output = [{
+        'id': row.id,
+        'amount': float(row.amount),
+        'currency': row.currency,
+        'base_amount': float(row.base_amount),
+        'category': row.category,
+        'description': row.description,
+        'date': row.date.strftime('%Y-%m-%d'),
+        'status': row.status,
+        'user_name': row.user_name,
+        'user_id': row.user_id,
+        'step': row.sequence
+    } for row in rows]
+    return _expense_page(output, next_cursor), 200
+
+@api.route('/api/analytics/summary', methods=['GET'])
+@login_required(*COMPANY_REPORT_ROLES)
+def get_expense_analytics():
+    # Totals in the caller's company base currency, read from the ExpenseSummary rollup
+    company_id = g.principal.company_id
+    group_by = request.args.get('group_by', 'category')
+
+    if group_by not in expense_summary.GROUP_BY_OPTIONS:
+        return jsonify({"message": f"Invalid group_by. Must be one of {', '.join(expense_summary.GROUP_BY_OPTIONS)}."}), 400
+
+    try:
+        filters = parse_expense_filters(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    company = Company.query.get(company_id)
+    if not company:
+        return jsonify({"message": "Company not found."}), 404
+
+    try:
+        groups = expense_summary.query_summary(company_id, group_by, filters)
+
+        # The range the totals cover, to the day (open ends stay null)
+        return jsonify({
+            'group_by': group_by,
+            'start_date': filters['start_date'].isoformat() if 'start_date' in filters else None,
+            'end_date': filters['end_date'].isoformat() if 'end_date' in filters else None,
+            'base_currency': company.currency_code,
+            'total_count': sum(group['count'] for group in groups),
+            'total_base_amount': round(sum(group['base_amount'] for group in groups), 2),
+            'groups': groups
+        }), 200
+
+    except Exception as e:
+        print(f"Error fetching expense analytics: {e}")
+        return jsonify({"message": "Could not fetch analytics."}), 500
+
+def _read_receipt_upload():
+    # Binary receipt upload: multipart field "receipt" (Werkzeug spools large parts to a
+    # temp file) or a raw image/* / application/octet-stream body read in one pass.
+    # Returns (image_bytes, None) or (None, error response).
+    max_bytes = current_app.config['OCR_MAX_IMAGE_BYTES']
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('receipt') or request.files.get('file')
+        if upload is None:
+            return None, (jsonify({"message": "Receipt file is required (multipart field 'receipt')."}), 400)
+        stream = upload.stream
+    elif request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+        # Reject before reading anything when the declared size is already too big
+        if request.content_length and request.content_length > max_bytes:
+            return None, _upload_too_large()
+        stream = request.stream
+    else:
+        return None, (jsonify({"message": "Send JSON with base64 image_data, multipart/form-data, or a raw image body."}), 415)
+
+    image_bytes = stream.read(max_bytes + 1)
+    if len(image_bytes) > max_bytes:
+        return None, _upload_too_large()
+    if not image_bytes:
+        return None, (jsonify({"message": "Receipt image is empty."}), 400)
+    return image_bytes, None
+
+def _upload_too_large():
+    limit_mb = current_app.config['OCR_MAX_IMAGE_BYTES'] // (1024 * 1024)
+    return jsonify({"message": f"Receipt image is too large. The limit is {limit_mb} MB."}), 413
+
+@api.app_errorhandler(413)
+def request_too_large(e):
+    return jsonify({"message": "Request body is too large."}), 413
+
+@api.route('/api/ocr/process', methods=['POST'])
+def process_receipt_ocr():
+    if request.is_json:
+        data = request.get_json()
+        image_data_b64 = data.get('image_data') # Base64 encoded string
+
+        if not image_data_b64:
+            return jsonify({"message": "Base64 image data is required."}), 400
+
+        # Call the OCR service
+        ocr_result = extract_text_from_image(image_data_b64)
+    else:
+        image_bytes, error = _read_receipt_upload()
+        if error:
+            return error
+        ocr_result = extract_text_from_bytes(image_bytes)
 
     if "error" in ocr_result:
         return jsonify(ocr_result), 500
 
+    return jsonify(_with_base_amount(ocr_result)), 200
+
+def _with_base_amount(ocr_result):
     # Optionally, calculate the base amount for the suggested currency
     suggested_amount = ocr_result.get('suggested_amount')
     suggested_currency = ocr_result.get('suggested_currency')
@@ -462,11 +1112,235 @@ def process_receipt_ocr():
         ocr_result['base_amount_calculated'] = base_amount
         ocr_result['base_currency'] = base_currency
 
-    return jsonify(ocr_result), 200
+    return ocr_result
+
+@api.route('/api/ocr/jobs', methods=['POST'])
+def submit_ocr_job():
+    # Queues the OCR work and answers immediately; poll the returned status_url
+    if request.is_json:
+        data = request.get_json()
+        image_data_b64 = data.get('image_data') # Base64 encoded string
+
+        if not image_data_b64:
+            return jsonify({"message": "Base64 image data is required."}), 400
+
+        try:
+            image_bytes = base64.b64decode(image_data_b64)
+        except (binascii.Error, ValueError):
+            return jsonify({"message": "Invalid Base64 image data."}), 400
+    else:
+        image_bytes, error = _read_receipt_upload()
+        if error:
+            return error
+
+    try:
+        job_id = current_app.extensions['ocr_jobs'].submit(image_bytes)
+    except QueueFull as e:
+        response = jsonify({"message": f"{e} Try again shortly."})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    return jsonify({
+        "message": "OCR job queued.",
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/ocr/jobs/{job_id}"
+    }), 202
+
+@api.route('/api/ocr/jobs/<job_id>', methods=['GET'])
+def get_ocr_job(job_id):
+    job = current_app.extensions['ocr_jobs'].get(job_id)
+    if job is None:
+        return jsonify({"message": "OCR job not found or expired."}), 404
+
+    if job['status'] == 'done':
+        job['result'] = _with_base_amount(dict(job['result']))
+    return jsonify(job), 200
+
+# --- CLI: Exchange Rate Snapshots ---
+@api.cli.command('import-rates')
+@click.option('--date', 'date_str', help='Snapshot date (YYYY-MM-DD). Defaults to today.')
+@click.option('--file', 'path', type=click.Path(exists=True, dir_okay=False),
+              help='JSON snapshot(s) to import instead of fetching: {"date", "base", "rates"} or a list of them '
+                   '(no date: --date, or today). '
+                   'Tables for another base are rebased onto the store base.')
+def import_rates(date_str, path):
+    """Imports daily exchange-rate snapshots into the local ExchangeRate table."""
+    def parse_date(value, source):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            raise click.UsageError(f"Invalid date {value!r} in {source}. Expected YYYY-MM-DD.")
+
+    default_date = parse_date(date_str, '--date') if date_str else date.today()
+    if path:
+        try:
+            with open(path) as f:
+                snapshots = json.load(f)
+        except ValueError as e:
+            raise click.UsageError(f"{path} is not valid JSON: {e}")
+        if isinstance(snapshots, dict):
+            snapshots = [snapshots]
+        if not isinstance(snapshots, list) or not all(
+            isinstance(snapshot, dict) and isinstance(snapshot.get('rates'), dict) for snapshot in snapshots
+        ):
+            raise click.UsageError('Each snapshot must be an object with a "rates" object.')
+
+        total = 0
+        for snapshot in snapshots:
+            # Snapshots without a date are for --date, or today
+            as_of = parse_date(snapshot['date'], path) if snapshot.get('date') else default_date
+            base = snapshot.get('base', rate_store.STORE_BASE_CURRENCY)
+            try:
+                total += rate_store.import_snapshot(snapshot['rates'], as_of=as_of, base_currency=base, commit=False)
+            except ValueError as e:
+                db.session.rollback()
+                raise click.ClickException(f"Snapshot for {as_of}: {e}")
+        db.session.commit()
+        click.echo(f"Imported {total} rates from {len(snapshots)} snapshot(s).")
+        return
+
+    count = rate_store.import_daily_snapshot(HttpRateSource(), as_of=default_date)
+    if not count:
+        raise click.ClickException("Could not fetch exchange rates. Check API status.")
+    click.echo(f"Imported {count} rates for {rate_store.STORE_BASE_CURRENCY}.")
+
+@api.cli.command('refresh-countries')
+def refresh_countries():
+    """Re-downloads the country -> currency snapshot from restcountries."""
+    if not refresh_country_index(save=True):
+        raise click.ClickException("Could not refresh the country list. Keeping the bundled snapshot.")
+    click.echo("Country currency snapshot refreshed.")
+
+@api.cli.command('rebuild-summary')
+@click.option('--company-id', type=int, help='Only rebuild this company.')
+def rebuild_summary(company_id):
+    """Recomputes the ExpenseSummary analytics rollup from the Expense table."""
+    count = expense_summary.rebuild(company_id)
+    db.session.commit()
+    click.echo(f"Rebuilt {count} summary rows.")
+
+@api.cli.command('rebuild-hierarchy')
+@click.option('--company-id', type=int, help='Only rebuild this company.')
+def rebuild_hierarchy(company_id):
+    """Recomputes the manager hierarchy closure table from User.manager_id."""
+    count = hierarchy.rebuild(company_id)
+    db.session.commit()
+    click.echo(f"Rebuilt {count} hierarchy rows.")
+
+@api.cli.command('scan-duplicates')
+@click.option('--company-id', type=int, help='Only scan this company.')
+@click.option('--batch-size', type=int, default=1000, show_default=True, help='Expenses checked per query.')
+@click.option('--window-days', type=int, default=duplicates.WINDOW_DAYS, show_default=True,
+              help='Days apart that still count as a near duplicate.')
+@click.option('--json', 'as_json', is_flag=True, help='One JSON object per duplicate.')
+def scan_duplicates(company_id, batch_size, window_days, as_json):
+    """Reports existing expenses that duplicate an earlier one (same receipt, or same user, amount and currency)."""
+    filled = duplicates.backfill()
+    db.session.commit()
+    if filled and not as_json:
+        click.echo(f"Fingerprinted {filled} expenses.")
+
+    found = 0
+    for match in duplicates.scan(company_id, batch_size=batch_size, window_days=window_days):
+        found += 1
+        if as_json:
+            click.echo(json.dumps(match))
+        else:
+            original = match['duplicate_of']
+            click.echo(
+                f"Expense #{match['id']} ({match['date']}, {match['amount']} {match['currency']}, "
+                f"user {match['user_id']}) duplicates #{original['id']} ({original['date']}): {match['reason']}"
+            )
+    if not as_json:
+        click.echo(f"{found} possible duplicates.")
+
+@api.cli.command('db-upgrade')
+@click.option('--target', type=int, help='Stop at this migration version.')
+def db_upgrade(target):
+    """Applies pending schema migrations (tables and indexes)."""
+    version = migrations.upgrade(target=target, echo=click.echo)
+    click.echo(f"Database schema is at version {version}.")
+
+def create_app(config=None):
+    """
+    Application factory. Building the app is cheap: the OCR engine, its Vision
+    client, the receipt parser, the country index and the OCR worker pool are all
+    created on first use. `config` overrides the environment-derived settings.
+    """
+    app = Flask(__name__)
+
+    # --- Initialization & Configuration ---
+    CORS(app,
+         resources={r"/api/*": {"origins": "*"}},
+         allow_headers=["Content-Type", "Authorization", "X-Profile"],
+         methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
+         expose_headers=["X-Next-Cursor", "Content-Disposition", "Retry-After", "Server-Timing", "ETag"],
+         supports_credentials=False)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    # Access token lifetime, and how long a cached principal is trusted before it is reloaded
+    app.config['AUTH_TOKEN_TTL'] = int(os.getenv('AUTH_TOKEN_TTL', 12 * 3600))
+    app.config['AUTH_PRINCIPAL_TTL'] = int(os.getenv('AUTH_PRINCIPAL_TTL', 300))
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Whole-request cap, enforced by Werkzeug before the body is read (fits a base64 JSON receipt)
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+    # Largest decoded receipt image accepted by the OCR routes
+    app.config['OCR_MAX_IMAGE_BYTES'] = int(os.getenv('OCR_MAX_IMAGE_BYTES', 10 * 1024 * 1024))
+    # Request metrics (/metrics, Server-Timing) and opt-in profiling of a share of requests
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', '1') != '0'
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    app.config['PROFILE_SLOW_MS'] = float(os.getenv('PROFILE_SLOW_MS', 500))
+    app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'pravaha-profiles'))
+    # Serialized expense listings kept per process (0 turns storing off; ETags still apply), and how
+    # long one may be served before it is recomputed, which bounds staleness from other processes' writes
+    app.config['RESPONSE_CACHE_SIZE'] = int(os.getenv('RESPONSE_CACHE_SIZE', 512))
+    app.config['RESPONSE_CACHE_TTL'] = float(os.getenv('RESPONSE_CACHE_TTL', 30))
+    if config:
+        app.config.update(config)
+
+    # --- Attach the database object to the app ---
+    db.init_app(app)
+
+    if not app.config['SECRET_KEY']:
+        # Tokens still work, but only until this process restarts
+        print("SECRET_KEY is not set; using a random key for signing access tokens.")
+        app.config['SECRET_KEY'] = secrets.token_hex(32)
+    app.extensions['auth'] = auth.Authenticator(
+        app.config['SECRET_KEY'],
+        token_ttl=app.config['AUTH_TOKEN_TTL'],
+        principal_ttl=app.config['AUTH_PRINCIPAL_TTL']
+    )
+
+    if app.config['METRICS_ENABLED']:
+        metrics.instrument_sql()
+    app.extensions['profiler'] = metrics.Profiler(
+        app.config['PROFILE_DIR'],
+        sample_rate=app.config['PROFILE_SAMPLE_RATE'],
+        slow_ms=app.config['PROFILE_SLOW_MS']
+    )
+
+    app.extensions['response_cache'] = response_cache.ResponseCache(
+        max_entries=app.config['RESPONSE_CACHE_SIZE'],
+        ttl=app.config['RESPONSE_CACHE_TTL']
+    )
+
+    # Background OCR: bounded queue served by a thread (or process) pool, started on the first job
+    app.extensions['ocr_jobs'] = OcrJobQueue(
+        extract_text_from_bytes,
+        workers=int(os.getenv('OCR_WORKERS', 2)),
+        max_depth=int(os.getenv('OCR_QUEUE_DEPTH', 32)),
+        timeout=int(os.getenv('OCR_JOB_TIMEOUT', 30)),
+        executor=os.getenv('OCR_EXECUTOR', 'thread')
+    )
+
+    app.register_blueprint(api)
+    return app
 
 # --- Server Start and Database Setup ---
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
-        # This will now successfully create your tables!
-        db.create_all() 
+        # Brings the schema (tables and indexes) up to the latest migration
+        migrations.upgrade()
     app.run(debug=True)
\ No newline at end of file
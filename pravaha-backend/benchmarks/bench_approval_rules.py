@@ -0,0 +1,165 @@
+# benchmarks/bench_approval_rules.py
+"""
+Approval rule matching with hundreds of rules per company: the compiled RuleSet
+(per-category bisect over precomputed interval winners) against a linear scan
+of the rules in priority order, plus routing a batch of new expenses through
+start_workflows against a database.
+
+    python -m benchmarks.bench_approval_rules --rules 500 --lookups 100000
+    python -m benchmarks.bench_approval_rules --rules 200 --expenses 5000 --json
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date
+from types import SimpleNamespace
+
+from sqlalchemy import func, insert, select
+
+from benchmarks.seed import CATEGORIES, DEFAULT_DATABASE_URL, make_app, seed_org_tree
+from extensions import db
+from models import ApprovalRule, ApprovalStep, Company, Expense, User
+from services import approval_engine
+import migrations
+
+
+def make_rules(count, seed=7):
+    """
+    Rule definitions shaped like per-team policies: narrow amount bands, mostly scoped
+    to one or two categories, with a few broad catch-all rules at low priority.
+    """
+    rng = random.Random(seed)
+    rules = []
+    for index in range(count):
+        if index % 50 == 0:
+            conditions = {'min_amount': rng.randrange(1000, 5000, 500)}
+            priority = 1000 + index
+        else:
+            low = rng.randrange(0, 24000, 10)
+            conditions = {
+                'min_amount': low,
+                'max_amount': low + rng.randrange(50, 1000, 10),
+                'categories': rng.sample(CATEGORIES, rng.randint(1, 2)),
+            }
+            priority = rng.randint(1, 999)
+        steps = [{'approver': 'manager', 'levels': rng.randint(1, 3)}]
+        if rng.random() < 0.5:
+            steps.append({'approver': 'role', 'role': 'Admin', 'ratio': 0.5})
+        rules.append({
+            'name': f'Rule {index}', 'priority': priority, 'conditions': conditions, 'steps': steps
+        })
+    return rules
+
+
+def linear_match(rules, category, amount):
+    """The straightforward evaluation: first rule in priority order whose conditions hold."""
+    for rule in rules:
+        if rule.categories is not None and category not in rule.categories:
+            continue
+        if rule.min_amount <= amount < rule.max_amount:
+            return rule
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--rules', type=int, default=500, help='Active rules in the company.')
+    parser.add_argument('--lookups', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--expenses', type=int, default=5000, help='Expenses routed through start_workflows (0 skips).')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    definitions = make_rules(args.rules)
+    rng = random.Random(1)
+    lookups = [(rng.choice(CATEGORIES), rng.uniform(0, 25000)) for _ in range(args.lookups)]
+
+    started = time.perf_counter()
+    compiled = [
+        approval_engine.compile_rule(index, rule['name'], rule['priority'], rule['conditions'], rule['steps'])
+        for index, rule in enumerate(definitions, start=1)
+    ]
+    ruleset = approval_engine.RuleSet(compiled)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    for category in CATEGORIES:
+        ruleset.match(category, 0)
+    tables_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    indexed = [ruleset.match(category, amount) for category, amount in lookups]
+    indexed_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scanned = [linear_match(ruleset.rules, category, amount) for category, amount in lookups]
+    linear_s = time.perf_counter() - started
+    assert indexed == scanned, "compiled and linear matching disagree"
+
+    results = {
+        'rules': len(compiled),
+        'lookups': len(lookups),
+        'matched': sum(rule is not None for rule in indexed),
+        'compile_ms': round(compile_ms, 2),
+        'category_tables_ms': round(tables_ms, 2),
+        'match_us': {
+            'compiled': round(indexed_s / len(lookups) * 1e6, 3),
+            'linear': round(linear_s / len(lookups) * 1e6, 3),
+        },
+        'speedup': round(linear_s / indexed_s, 1),
+    }
+
+    if args.expenses:
+        app = make_app(args.database_url)
+        with app.app_context():
+            migrations.reset()
+            migrations.upgrade(echo=lambda message: None)
+            db.session.add(Company(id=1, name='Rules Bench', currency_code='USD'))
+            db.session.commit()
+            levels = seed_org_tree(args.users, 6)
+            # A handful of admins for the role steps
+            db.session.execute(
+                User.__table__.update().where(User.id.in_(levels[1][:5])).values(role='Admin')
+            )
+            db.session.execute(insert(ApprovalRule), [dict(rule, company_id=1) for rule in definitions])
+            db.session.commit()
+
+            everyone = [user_id for level in levels[1:] for user_id in level]
+            rows = [{
+                'amount': amount, 'currency': 'USD', 'base_amount': amount, 'category': category,
+                'date': date(2025, 1, 1), 'status': 'Pending', 'user_id': rng.choice(everyone), 'company_id': 1
+            } for category, amount in (
+                (rng.choice(CATEGORIES), round(rng.uniform(0, 25000), 2)) for _ in range(args.expenses)
+            )]
+            ids = db.session.execute(insert(Expense).returning(Expense.id), rows).scalars().all()
+            expenses = [SimpleNamespace(id=expense_id, **row) for expense_id, row in zip(ids, rows)]
+
+            approval_engine.invalidate()
+            started = time.perf_counter()
+            routed = approval_engine.start_workflows(expenses)
+            db.session.commit()
+            results['start_workflows'] = {
+                'expenses': len(expenses),
+                'routed': routed,
+                'steps_written': db.session.scalar(select(func.count()).select_from(ApprovalStep)),
+                'ms': round((time.perf_counter() - started) * 1000, 1),
+            }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['rules']} rules compiled in {results['compile_ms']} ms "
+          f"(+{results['category_tables_ms']} ms for {len(CATEGORIES)} category tables)")
+    print(f"{results['lookups']} lookups, {results['matched']} matched: "
+          f"compiled {results['match_us']['compiled']} us, linear {results['match_us']['linear']} us "
+          f"({results['speedup']}x)")
+    if 'start_workflows' in results:
+        run = results['start_workflows']
+        print(f"start_workflows: {run['routed']}/{run['expenses']} expenses routed, "
+              f"{run['steps_written']} step rows in {run['ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
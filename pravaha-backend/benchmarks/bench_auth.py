@@ -0,0 +1,103 @@
+# benchmarks/bench_auth.py
+"""
+Per-request authentication cost: verifying a signed access token and serving
+its principal from the in-process cache, against reloading the user with
+User.query.get on every request. Also times a login against a throttled
+(refused) attempt.
+
+    python -m benchmarks.bench_auth --users 1000 --requests 20000
+    python -m benchmarks.bench_auth --json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from app import create_app
+from benchmarks.seed import DEFAULT_DATABASE_URL, seed_org_tree
+from extensions import db
+from models import Company, User
+import migrations
+
+
+def per_call_us(fn, calls):
+    started = time.perf_counter()
+    for argument in calls:
+        fn(argument)
+    return (time.perf_counter() - started) / len(calls) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--logins', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url, 'SECRET_KEY': 'bench-secret'})
+    with app.app_context():
+        migrations.reset()
+        migrations.upgrade(echo=lambda message: None)
+        db.session.add(Company(id=1, name='Auth Bench', currency_code='USD'))
+        db.session.commit()
+        user_ids = [user_id for level in seed_org_tree(args.users, 8) for user_id in level]
+
+        authenticator = app.extensions['auth']
+        users = {user.id: user for user in User.query.all()}
+        headers = {user_id: f"Bearer {authenticator.issue(user)}" for user_id, user in users.items()}
+        rng = random.Random(1)
+        sample = [rng.choice(user_ids) for _ in range(args.requests)]
+
+        def reload_user(user_id):
+            # The old per-request path: a fresh session, one primary key query
+            user = db.session.get(User, user_id)
+            db.session.remove()
+            return user.role
+
+        results = {'users': len(user_ids), 'requests': len(sample), 'us_per_request': {}}
+        timings = results['us_per_request']
+        timings['reload_user'] = per_call_us(reload_user, sample)
+
+        authenticator.invalidate()
+        # First request of each user: signature check and one principal load
+        timings['token_cold_cache'] = per_call_us(lambda user_id: authenticator.authenticate(headers[user_id]), user_ids)
+        timings['token_warm_cache'] = per_call_us(lambda user_id: authenticator.authenticate(headers[user_id]), sample)
+        timings = {name: round(value, 2) for name, value in timings.items()}
+        results['us_per_request'] = timings
+        results['speedup'] = round(timings['reload_user'] / timings['token_warm_cache'], 1)
+        results['principal_cache'] = authenticator.stats()
+
+        # Login: the password hash dominates; a throttled attempt skips it
+        client = app.test_client()
+        user = users[user_ids[-1]]
+        user.set_password('correct horse')
+        db.session.commit()
+        authenticator.throttle.max_failures = 10 ** 9
+        login_ms = []
+        for _ in range(args.logins):
+            started = time.perf_counter()
+            response = client.post('/api/login', json={'email': user.email, 'password': 'wrong'})
+            login_ms.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 401, response.status_code
+        authenticator.throttle.max_failures = 1
+        started = time.perf_counter()
+        response = client.post('/api/login', json={'email': user.email, 'password': 'wrong'})
+        throttled_ms = (time.perf_counter() - started) * 1000
+        assert response.status_code == 429, response.status_code
+        results['login_ms'] = {'checked': round(statistics.median(login_ms), 2), 'throttled': round(throttled_ms, 2)}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['requests']} authenticated requests over {results['users']} users")
+    for name, value in timings.items():
+        print(f"{name:>18}: {value:>9.2f} us")
+    print(f"token + cached principal is {results['speedup']}x cheaper than reloading the user")
+    print(f"failed login: {results['login_ms']['checked']} ms checked, {results['login_ms']['throttled']} ms throttled")
+
+
+if __name__ == '__main__':
+    main()
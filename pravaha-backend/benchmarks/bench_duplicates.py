@@ -0,0 +1,110 @@
+# benchmarks/bench_duplicates.py
+"""
+Duplicate check at submission time as expense history grows: the indexed
+fingerprint lookup (services/duplicates.py) against loading the submitter's whole
+history and comparing in Python. Also times the batch scan of the backlog.
+
+    python -m benchmarks.bench_duplicates --sizes 10000,100000,500000
+    python -m benchmarks.bench_duplicates --database-url postgresql://localhost/pravaha_bench --json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from sqlalchemy import select
+
+from benchmarks.seed import CURRENCIES, DEFAULT_DATABASE_URL, make_app, seed_dataset
+from extensions import db
+from models import Expense
+from services import duplicates
+import migrations
+
+
+def naive_duplicates(entry, window_days=duplicates.WINDOW_DAYS):
+    """The unindexed way: every expense of the user, compared one by one."""
+    window = timedelta(days=window_days)
+    return [
+        row.id for row in db.session.execute(
+            select(Expense.id, Expense.amount, Expense.currency, Expense.date).where(Expense.user_id == entry.user_id)
+        )
+        if duplicates.fingerprint(row.amount, row.currency) == entry.fingerprint
+        and abs(row.date - entry.date) <= window
+    ]
+
+
+def median_ms(fn, probes):
+    timings = []
+    for probe in probes:
+        started = time.perf_counter()
+        fn(probe)
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--sizes', default='10000,100000,300000', help='Comma-separated expense counts.')
+    parser.add_argument('--users', type=int, default=100, help='Users sharing the history.')
+    parser.add_argument('--probes', type=int, default=200)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    results = []
+    with app.app_context():
+        for size in [int(value) for value in args.sizes.split(',')]:
+            migrations.reset()
+            migrations.upgrade(echo=lambda message: None)
+            seed_dataset(users_per_company=args.users, managers_per_company=max(1, args.users // 10), expenses=size)
+
+            rng = random.Random(size)
+            # Half resubmit an existing expense, half are new amounts
+            existing = db.session.execute(
+                select(Expense.user_id, Expense.company_id, Expense.amount, Expense.currency, Expense.date)
+                .where(Expense.id.in_(rng.sample(range(1, size + 1), args.probes)),
+                       Expense.status.notin_(duplicates.IGNORED_STATUSES))
+                .limit(args.probes // 2)
+            ).all()
+            probes = [duplicates.entry_for(row._asdict()) for row in existing]
+            probes += [
+                duplicates.entry_for({
+                    'user_id': row.user_id, 'company_id': row.company_id, 'date': row.date,
+                    'amount': round(rng.uniform(5, 2000), 2), 'currency': rng.choice(CURRENCIES),
+                }) for row in existing
+            ]
+
+            for probe in probes[:len(existing)]:
+                assert duplicates.find_duplicates(probe), "a resubmitted expense must be flagged"
+            indexed = median_ms(duplicates.find_duplicates, probes)
+            naive = median_ms(naive_duplicates, probes)
+
+            started = time.perf_counter()
+            found = sum(1 for _ in duplicates.scan())
+            scan_seconds = time.perf_counter() - started
+            results.append({
+                'expenses': size,
+                'history_per_user': size // args.users,
+                'indexed_ms': indexed,
+                'naive_ms': naive,
+                'speedup': round(naive / indexed, 1),
+                'scan_rows_per_s': round(size / scan_seconds),
+                'scan_duplicates': found,
+            })
+            db.session.remove()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'expenses':>9} {'per user':>9} {'indexed ms':>11} {'naive ms':>9} {'speedup':>8} "
+          f"{'scan rows/s':>12} {'found':>6}")
+    for row in results:
+        print(f"{row['expenses']:>9} {row['history_per_user']:>9} {row['indexed_ms']:>11} {row['naive_ms']:>9} "
+              f"{row['speedup']:>8} {row['scan_rows_per_s']:>12} {row['scan_duplicates']:>6}")
+
+
+if __name__ == '__main__':
+    main()
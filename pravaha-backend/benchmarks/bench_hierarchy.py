@@ -0,0 +1,159 @@
+# benchmarks/bench_hierarchy.py
+"""
+Manager hierarchy lookups on a large org tree: the closure table against a
+recursive CTE over User.manager_id, plus closure rebuild and re-parenting cost.
+
+    python -m benchmarks.bench_hierarchy --users 20000 --fanout 8
+    python -m benchmarks.bench_hierarchy --users 5000 --fanout 2 --json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date
+
+from sqlalchemy import func, insert, literal, select
+
+from benchmarks.seed import DEFAULT_DATABASE_URL, make_app, seed_org_tree
+from extensions import db
+from models import Company, Expense, User, UserHierarchy
+from services import hierarchy
+import migrations
+
+
+def closure_reports(manager_id):
+    return select(UserHierarchy.descendant_id).where(
+        UserHierarchy.ancestor_id == manager_id, UserHierarchy.depth > 0
+    )
+
+
+def cte_reports(manager_id):
+    reports = select(User.id, literal(1).label('depth')).where(
+        User.manager_id == manager_id
+    ).cte('reports', recursive=True)
+    reports = reports.union_all(
+        select(User.id, reports.c.depth + 1).join(reports, User.manager_id == reports.c.id)
+    )
+    return select(reports.c.id)
+
+
+def cte_chain(user_id):
+    chain = select(User.manager_id.label('id'), literal(1).label('depth')).where(
+        User.id == user_id, User.manager_id.isnot(None)
+    ).cte('chain', recursive=True)
+    chain = chain.union_all(
+        select(User.manager_id, chain.c.depth + 1).join(chain, User.id == chain.c.id).where(
+            User.manager_id.isnot(None)
+        )
+    )
+    return select(chain.c.id).order_by(chain.c.depth)
+
+
+def pending_count(user_filter):
+    return select(func.count()).select_from(Expense).where(Expense.status == 'Pending', user_filter)
+
+
+def timed(fn, repeat):
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return round(statistics.median(samples) * 1000, 3), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--fanout', type=int, default=8, help='Reports per manager (2 gives a deep tree).')
+    parser.add_argument('--expenses', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        migrations.reset()
+        migrations.upgrade(echo=lambda message: None)
+        db.session.add(Company(id=1, name='Org Bench', currency_code='USD'))
+        db.session.commit()
+
+        started = time.perf_counter()
+        levels = seed_org_tree(args.users, args.fanout)
+        seed_seconds = time.perf_counter() - started
+
+        rng = random.Random(1)
+        everyone = [user_id for level in levels for user_id in level]
+        rows = [{
+            'amount': 10, 'currency': 'USD', 'base_amount': 10, 'category': 'Travel',
+            'date': date(2025, 1, 1), 'status': 'Pending', 'user_id': rng.choice(everyone), 'company_id': 1
+        } for _ in range(args.expenses)]
+        for start in range(0, len(rows), 5000):
+            db.session.execute(insert(Expense), rows[start:start + 5000])
+        db.session.commit()
+
+        session = db.session
+        top, mid, leaf = levels[0][0], levels[min(2, len(levels) - 1)][0], levels[-1][-1]
+        results = {
+            'users': args.users,
+            'fanout': args.fanout,
+            'tree_depth': len(levels) - 1,
+            'closure_rows': session.scalar(select(func.count()).select_from(UserHierarchy)),
+            'seed_and_rebuild_s': round(seed_seconds, 2),
+            'ms': {},
+        }
+        ms = results['ms']
+
+        for label, manager_id in (('top', top), ('mid', mid)):
+            # Report ids only, then the full rows the /reports endpoint serializes
+            ms[f'reports_{label}_closure'], closure = timed(
+                lambda: session.execute(closure_reports(manager_id)).all(), args.repeat)
+            ms[f'reports_{label}_endpoint_rows'], _ = timed(
+                lambda: session.execute(hierarchy.reports_query(manager_id)).all(), args.repeat)
+            ms[f'reports_{label}_cte'], cte = timed(
+                lambda: session.execute(cte_reports(manager_id)).all(), args.repeat)
+            assert len(closure) == len(cte), (len(closure), len(cte))
+            results[f'reports_{label}'] = len(closure)
+
+            ms[f'pending_{label}_closure'], closure = timed(lambda: session.scalar(
+                pending_count(hierarchy.reports_filter(Expense.user_id, manager_id))), args.repeat)
+            ms[f'pending_{label}_cte'], cte = timed(lambda: session.scalar(
+                pending_count(Expense.user_id.in_(cte_reports(manager_id)))), args.repeat)
+            assert closure == cte, (closure, cte)
+
+        ms['chain_leaf_closure'], closure = timed(
+            lambda: session.execute(hierarchy.approval_chain_query(leaf)).all(), args.repeat)
+        ms['chain_leaf_cte'], cte = timed(lambda: session.execute(cte_chain(leaf)).all(), args.repeat)
+        assert [row.id for row in closure] == [row.id for row in cte]
+
+        ms['cycle_check'], _ = timed(lambda: hierarchy.would_create_cycle(mid, leaf), args.repeat)
+
+        # Re-parent a level-2 subtree under another level-1 manager and back, in one transaction
+        if len(levels) > 2:
+            original = session.get(User, mid).manager_id
+            other = next(user_id for user_id in levels[1] if user_id != original)
+            started = time.perf_counter()
+            hierarchy.move_subtree(mid, other)
+            hierarchy.move_subtree(mid, original)
+            ms['move_subtree_round_trip'] = round((time.perf_counter() - started) * 1000, 3)
+            session.rollback()
+
+        started = time.perf_counter()
+        hierarchy.rebuild()
+        session.commit()
+        ms['rebuild'] = round((time.perf_counter() - started) * 1000, 1)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['users']} users, fanout {results['fanout']}, depth {results['tree_depth']}, "
+          f"{results['closure_rows']} closure rows; top manager has {results['reports_top']} reports, "
+          f"mid manager {results['reports_mid']}")
+    for name, value in ms.items():
+        print(f"{name:>26}: {value:>10.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
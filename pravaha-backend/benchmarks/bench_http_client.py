@@ -0,0 +1,182 @@
+# benchmarks/bench_http_client.py
+"""
+Outbound HTTP against a local stub rate server: per-call requests.get (a new
+connection every time) versus the shared HttpClient (keep-alive pool, coalescing,
+retries, circuit breaker). The stub charges a delay per new connection to stand
+in for DNS/TCP/TLS setup and a delay per request for the upstream itself.
+
+    python -m benchmarks.bench_http_client --calls 100 --threads 32
+    python -m benchmarks.bench_http_client --connect-delay-ms 50 --fail-rate 0.3 --json
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from services.http_client import CircuitOpen, HttpClient, HttpError
+
+
+class StubRateServer:
+    """
+    ThreadingHTTPServer on localhost serving /latest/<BASE> like ExchangeRate-API.
+    `fail_rate` of requests get a 503; `down` makes every request a 503.
+    """
+
+    def __init__(self, connect_delay=0.03, latency=0.02, fail_rate=0.0, seed=1):
+        self.connect_delay = connect_delay
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.down = False
+        self.connections = 0
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+                time.sleep(stub.connect_delay)
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                    failed = stub.down or stub._rng.random() < stub.fail_rate
+                time.sleep(stub.latency)
+                if failed:
+                    body, status = b'{"error": "unavailable"}', 503
+                else:
+                    base = self.path.rsplit('/', 1)[-1]
+                    body, status = json.dumps({'base': base, 'rates': {base: 1.0, 'INR': 83.1, 'EUR': 0.92}}).encode(), 200
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/latest/{{BASE_CURRENCY}}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset_counts(self):
+        with self._lock:
+            self.connections = self.requests = 0
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def legacy_get(url):
+    """The previous behaviour: module-level requests.get, no session, no retries."""
+    response = requests.get(url, timeout=5)
+    response.raise_for_status()
+    return response.json()
+
+
+def run(label, stub, fn, urls, threads=1):
+    stub.reset_counts()
+    latencies, failures = [], 0
+
+    def call(url):
+        started = time.perf_counter()
+        try:
+            fn(url)
+            ok = True
+        except (requests.exceptions.RequestException, HttpError):
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for elapsed, ok in pool.map(call, urls):
+            latencies.append(elapsed)
+            failures += not ok
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'scenario': label,
+        'calls': len(urls),
+        'failed': failures,
+        'wall_ms': round(wall * 1000, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000, 2),
+        'upstream_requests': stub.requests,
+        'upstream_connections': stub.connections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=100)
+    parser.add_argument('--threads', type=int, default=32, help='Concurrent submissions in the burst scenario.')
+    parser.add_argument('--connect-delay-ms', type=float, default=30)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--fail-rate', type=float, default=0.2, help='Share of 503s in the flaky scenario.')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    stub = StubRateServer(args.connect_delay_ms / 1000, args.latency_ms / 1000)
+    bases = ['USD', 'EUR', 'GBP', 'JPY', 'INR']
+    sequential = [stub.url.format(BASE_CURRENCY=bases[i % len(bases)]) for i in range(args.calls)]
+    burst = [stub.url.format(BASE_CURRENCY='USD')] * args.threads
+    results = []
+
+    try:
+        def fresh_client(**kwargs):
+            return HttpClient(pool_size=args.threads, backoff=0.01, **kwargs)
+
+        results.append(run('sequential legacy', stub, legacy_get, sequential))
+        client = fresh_client()
+        results.append(run('sequential pooled', stub, client.get_json, sequential))
+
+        # Many submissions needing the same (uncached) rate table at once
+        results.append(run('burst legacy', stub, legacy_get, burst, threads=args.threads))
+        client = fresh_client()
+        results.append(run('burst pooled+coalesced', stub, client.get_json, burst, threads=args.threads))
+
+        stub.fail_rate = args.fail_rate
+        results.append(run('flaky legacy', stub, legacy_get, sequential))
+        client = fresh_client()
+        results.append(run('flaky with retries', stub, client.get_json, sequential))
+        stub.fail_rate = 0.0
+
+        # Upstream outage: once the breaker opens, callers fail fast instead of waiting on retries
+        stub.down = True
+        results.append(run('outage legacy', stub, legacy_get, sequential))
+        client = fresh_client(breaker_threshold=3, breaker_reset=60)
+        results.append(run('outage with breaker', stub, client.get_json, sequential))
+        try:
+            client.get_json(sequential[0])
+        except CircuitOpen:
+            pass
+        endpoint_stats = client.stats()
+    finally:
+        stub.close()
+
+    if args.json:
+        print(json.dumps({'scenarios': results, 'client_stats': endpoint_stats}, indent=2))
+        return
+    print(f"stub: {args.connect_delay_ms} ms per new connection, {args.latency_ms} ms per request")
+    print(f"{'scenario':>24} {'calls':>6} {'failed':>6} {'wall ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'upstream':>9} {'conns':>6}")
+    for row in results:
+        print(f"{row['scenario']:>24} {row['calls']:>6} {row['failed']:>6} {row['wall_ms']:>9} "
+              f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['upstream_requests']:>9} {row['upstream_connections']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/bench_indexes.py
+"""
+Query plans and timings for the expense hot filters, before and after the
+index migration, on a seeded dataset.
+
+    python -m benchmarks.bench_indexes --expenses 500000
+    python -m benchmarks.bench_indexes --database-url postgresql://localhost/pravaha_bench --json
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from sqlalchemy import select, text
+
+from benchmarks.seed import DEFAULT_DATABASE_URL, make_app, seed_dataset
+from extensions import db
+from models import User, Expense
+import migrations
+
+PAGE = 50
+
+
+def _queries(company_id, manager_id, user_id):
+    columns = (Expense.id, Expense.amount, Expense.currency, Expense.base_amount,
+               Expense.category, Expense.date, Expense.status)
+    newest_first = (Expense.date.desc(), Expense.id.desc())
+    return {
+        'pending_company': select(*columns).where(
+            Expense.company_id == company_id, Expense.status == 'Pending'
+        ).order_by(*newest_first).limit(PAGE),
+        'pending_manager': select(*columns).join(User, Expense.user_id == User.id).where(
+            Expense.company_id == company_id, Expense.status == 'Pending', User.manager_id == manager_id
+        ).order_by(*newest_first).limit(PAGE),
+        'company_listing': select(*columns).where(
+            Expense.company_id == company_id
+        ).order_by(*newest_first).limit(PAGE),
+        'user_listing': select(*columns).where(
+            Expense.user_id == user_id
+        ).order_by(*newest_first).limit(PAGE),
+        'team_lookup': select(User.id).where(User.manager_id == manager_id),
+    }
+
+
+def _plan(statement):
+    sql = str(statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = db.session.execute(text(prefix + sql)).all()
+    return [str(row[-1]) for row in rows]
+
+
+def _time(statement, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        db.session.execute(statement).all()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95) - 1], 3),
+    }
+
+
+def _measure(queries, repeat):
+    return {name: {'plan': _plan(stmt), **_time(stmt, repeat)} for name, stmt in queries.items()}
+
+
+def _drop_hot_filter_indexes():
+    for table in (User.__table__, Expense.__table__):
+        for index in table.indexes:
+            index.drop(db.engine, checkfirst=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL', DEFAULT_DATABASE_URL))
+    parser.add_argument('--expenses', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        migrations.reset()
+        migrations.upgrade(target=1, echo=lambda message: None)
+        _drop_hot_filter_indexes()
+        seed_dataset(users_per_company=args.users, managers_per_company=args.users // 10, expenses=args.expenses)
+
+        # Probe ids from the seeded data: the first manager with a team, and one of their reports
+        manager_id, user_id = db.session.execute(
+            select(User.manager_id, User.id).where(User.manager_id.isnot(None)).limit(1)
+        ).one()
+        queries = _queries(1, manager_id, user_id)
+
+        results = {'expenses': args.expenses, 'backend': db.engine.dialect.name}
+        results['before'] = _measure(queries, args.repeat)
+        migrations.upgrade(echo=lambda message: None)
+        db.session.execute(text('ANALYZE'))
+        results['after'] = _measure(queries, args.repeat)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.expenses} expenses on {results['backend']}")
+    for name in queries:
+        before, after = results['before'][name], results['after'][name]
+        print(f"\n{name}: {before['median_ms']} ms -> {after['median_ms']} ms (median)")
+        print(f"  before: {' | '.join(before['plan'])}")
+        print(f"  after:  {' | '.join(after['plan'])}")
+
+
+if __name__ == '__main__':
+    main()
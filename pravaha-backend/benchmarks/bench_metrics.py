@@ -0,0 +1,96 @@
+# benchmarks/bench_metrics.py
+"""
+Cost of request instrumentation: the same list route served with metrics off,
+with metrics on (latency histograms, SQL statement timing, Server-Timing) and
+with every request profiled, plus the time to render /metrics.
+
+    python -m benchmarks.bench_metrics --expenses 20000 --requests 2000
+    python -m benchmarks.bench_metrics --json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from app import create_app
+from benchmarks.seed import DEFAULT_DATABASE_URL, seed_dataset
+from models import User
+from services import metrics
+import migrations
+
+
+def serve(client, user_ids, tokens):
+    latencies = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        response = client.get(f"/api/expenses/user/{user_id}?limit=50", headers={'Authorization': tokens[user_id]})
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+    latencies.sort()
+    return {
+        'mean_us': round(statistics.fmean(latencies) * 1e6, 1),
+        'p50_us': round(latencies[len(latencies) // 2] * 1e6, 1),
+        'p95_us': round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--expenses', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    # Response cache off: every request runs the query, which is what is being instrumented
+    config = {'SQLALCHEMY_DATABASE_URI': args.database_url, 'SECRET_KEY': 'bench-secret', 'RESPONSE_CACHE_SIZE': 0}
+    # In this order: the first enabled app calls instrument_sql(), which hooks every engine in the process
+    scenarios = [
+        ('metrics off', {**config, 'METRICS_ENABLED': False}),
+        ('metrics on', config),
+        ('profile every request', {**config, 'PROFILE_SAMPLE_RATE': 1.0, 'PROFILE_SLOW_MS': 10 ** 9}),
+    ]
+
+    results = {'requests': args.requests, 'scenarios': {}}
+    for label, app_config in scenarios:
+        app = create_app(app_config)
+        if 'dataset' not in results:
+            with app.app_context():
+                migrations.reset()
+                migrations.upgrade(echo=lambda message: None)
+                results['dataset'] = seed_dataset(expenses=args.expenses)
+                employees = User.query.filter_by(role='Employee').all()
+            rng = random.Random(1)
+            sample = [rng.choice(employees).id for _ in range(args.requests)]
+
+        authenticator = app.extensions['auth']
+        with app.app_context():
+            tokens = {user.id: f"Bearer {authenticator.issue(user)}" for user in employees}
+        client = app.test_client()
+        serve(client, sample[:100], tokens)  # warm-up: connections, caches, first-use imports
+        results['scenarios'][label] = serve(client, sample, tokens)
+
+    scenarios = results['scenarios']
+    off, on = scenarios['metrics off']['mean_us'], scenarios['metrics on']['mean_us']
+    results['overhead_us'] = round(on - off, 1)
+    results['overhead_pct'] = round((on - off) / off * 100, 1)
+
+    started = time.perf_counter()
+    exposition = metrics.render()
+    results['render_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    results['render_lines'] = exposition.count('\n')
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['requests']} GET /api/expenses/user/<id> over {results['dataset']['expenses']} expenses")
+    print(f"{'scenario':>22} {'mean us':>9} {'p50 us':>9} {'p95 us':>9}")
+    for label, row in scenarios.items():
+        print(f"{label:>22} {row['mean_us']:>9} {row['p50_us']:>9} {row['p95_us']:>9}")
+    print(f"instrumentation adds {results['overhead_us']} us per request ({results['overhead_pct']}%)")
+    print(f"/metrics renders {results['render_lines']} lines in {results['render_ms']} ms")
+
+
+if __name__ == '__main__':
+    main()
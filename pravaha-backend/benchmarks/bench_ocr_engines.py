@@ -0,0 +1,115 @@
+# benchmarks/bench_ocr_engines.py
+"""
+OCR engine throughput on a fixed set of generated receipt photos (needs Pillow).
+
+Each engine reads the same preprocessed images from `--concurrency` threads,
+like the OCR job queue's workers. Amount accuracy is scored with ReceiptParser
+against the generated ground truth. Engines that cannot start here (missing
+credentials, packages or binary) are reported and skipped. The static engine
+stands in for a remote backend, with `--static-latency` seconds per call.
+
+    python -m benchmarks.bench_ocr_engines --engines static,tesseract --receipts 24
+    python -m benchmarks.bench_ocr_engines --engines google,tesseract --concurrency 8 --json
+"""
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_preprocess import make_photo
+from benchmarks.receipts import generate_receipts
+from services.image_preprocess import ImagePreprocessor
+from services.ocr_engines import OcrEngineError, StaticTextEngine, create_engine
+from services.receipt_parser import ReceiptParser
+
+
+def build_engine(name, images, texts, static_latency):
+    if name == StaticTextEngine.name:
+        return StaticTextEngine(texts=dict(zip(images, texts)), delay=static_latency)
+    return create_engine(name)
+
+
+def run(engine, images, truths, concurrency):
+    parser = ReceiptParser()
+
+    def timed(image_bytes):
+        started = time.perf_counter()
+        try:
+            text = engine.detect_text(image_bytes)
+        except OcrEngineError as e:
+            return None, time.perf_counter() - started, str(e)
+        return text, time.perf_counter() - started, None
+
+    # One untimed call so pool start-up is not charged to the first receipt
+    timed(images[0])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed, images))
+    elapsed = time.perf_counter() - started
+
+    errors = [error for _, _, error in outcomes if error]
+    if len(errors) == len(outcomes):
+        return {'error': errors[0]}
+
+    latencies = sorted(latency for _, latency, _ in outcomes)
+    correct = 0
+    for (text, _, _), truth in zip(outcomes, truths):
+        amount = parser.parse(text)['suggested_amount'] if text else None
+        correct += amount is not None and abs(amount - truth['amount']) < 0.005
+    return {
+        'receipts_per_sec': round(len(images) / elapsed, 2),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        'errors': len(errors),
+        'amount_accuracy': round(correct / len(images), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engines', default='static,tesseract', help='Comma separated engine names.')
+    parser.add_argument('--receipts', type=int, default=16)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--static-latency', type=float, default=0.3,
+                        help='Seconds per call for the static engine (typical remote round trip).')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    receipts = generate_receipts(args.receipts)
+    preprocessor = ImagePreprocessor()
+    images = [
+        preprocessor.process(make_photo(text, 4032, 3024, seed))[0]
+        for seed, (text, _) in enumerate(receipts)
+    ]
+    texts = [text for text, _ in receipts]
+    truths = [truth for _, truth in receipts]
+
+    results = {'receipts': len(images), 'concurrency': args.concurrency, 'engines': {}}
+    for name in args.engines.split(','):
+        try:
+            engine = build_engine(name, images, texts, args.static_latency)
+        except Exception as e:
+            results['engines'][name] = {'error': f"unavailable: {e}"}
+            continue
+        try:
+            results['engines'][name] = run(engine, images, truths, args.concurrency)
+        finally:
+            if hasattr(engine, 'close'):
+                engine.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['receipts']} receipts, {results['concurrency']} concurrent callers")
+    for name, result in results['engines'].items():
+        if 'error' in result:
+            print(f"{name:>10}: {result['error']}")
+            continue
+        print(f"{name:>10}: {result['receipts_per_sec']:>7} receipts/s | p50 {result['p50_ms']} ms, "
+              f"p95 {result['p95_ms']} ms | amount {result['amount_accuracy']:.1%} | errors {result['errors']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_preprocess.py
+"""
+Byte savings and per-stage cost of the OCR image preprocessing on generated
+camera-sized receipt photos (needs Pillow).
+
+    python -m benchmarks.bench_preprocess --images 10 --width 4032 --height 3024
+    python -m benchmarks.bench_preprocess --max-dimension 1024 --color --json
+"""
+import argparse
+import io
+import json
+import random
+import statistics
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from benchmarks.receipts import generate_receipts
+from services.image_preprocess import ImagePreprocessor
+
+
+def make_photo(text, width, height, seed, quality=92):
+    """A receipt drawn on a noisy, slightly warm background, stored sideways with EXIF orientation 6."""
+    rng = random.Random(seed)
+    photo = Image.effect_noise((width, height), 40).convert('RGB')
+    photo = Image.blend(photo, Image.new('RGB', (width, height), (200, 180, 150)), 0.6)
+
+    draw = ImageDraw.Draw(photo)
+    left, top = width // 4, height // 10
+    draw.rectangle([left, top, width - left, height - top], fill=(245, 245, 240))
+    # Print-sized lettering relative to the frame, so a real OCR engine can read it
+    font_size = max(12, width // 60)
+    font = ImageFont.load_default(size=font_size)
+    for index, line in enumerate(text.splitlines()):
+        draw.text((left + font_size, top + font_size + index * font_size * 1.4), line,
+                  fill=(rng.randint(0, 40),) * 3, font=font)
+    photo = photo.filter(ImageFilter.GaussianBlur(0.6))
+
+    # Phones store the sensor orientation and a rotation tag instead of rotating the pixels
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    photo.transpose(Image.ROTATE_90).save(buffer, format='JPEG', quality=quality, exif=exif)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=8)
+    parser.add_argument('--width', type=int, default=4032)
+    parser.add_argument('--height', type=int, default=3024)
+    parser.add_argument('--max-dimension', type=int, default=1600)
+    parser.add_argument('--quality', type=int, default=80)
+    parser.add_argument('--color', action='store_true', help='Keep colour instead of converting to grayscale.')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    photos = [
+        make_photo(text, args.width, args.height, seed)
+        for seed, (text, _) in enumerate(generate_receipts(args.images))
+    ]
+    preprocessor = ImagePreprocessor(
+        max_dimension=args.max_dimension, grayscale=not args.color, quality=args.quality
+    )
+    reports = [preprocessor.process(photo)[1] for photo in photos]
+
+    stages = reports[0]['timings_ms'].keys()
+    bytes_in = sum(report['bytes_in'] for report in reports)
+    bytes_out = sum(report['bytes_out'] for report in reports)
+    results = {
+        'images': len(reports),
+        'original_size': reports[0]['original_size'],
+        'processed_size': reports[0].get('size'),
+        'mean_bytes_in': bytes_in // len(reports),
+        'mean_bytes_out': bytes_out // len(reports),
+        'reduction': round(1 - bytes_out / bytes_in, 4),
+        'stage_median_ms': {
+            stage: round(statistics.median(report['timings_ms'][stage] for report in reports), 2)
+            for stage in stages
+        },
+    }
+    results['total_median_ms'] = round(sum(results['stage_median_ms'].values()), 2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['images']} images {results['original_size']} -> {results['processed_size']}")
+    print(f"bytes: {results['mean_bytes_in']:,} -> {results['mean_bytes_out']:,} per image "
+          f"({results['reduction']:.1%} smaller)")
+    for stage, ms in results['stage_median_ms'].items():
+        print(f"{stage:>10}: {ms:>8.2f} ms")
+    print(f"{'total':>10}: {results['total_median_ms']:>8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# benchmarks/bench_read_cache.py
+"""
+Repeat polls of the expense listings the dashboards refresh: every poll running
+the query (response cache off), polls served from the response cache, and polls
+that revalidate with If-None-Match and get 304 Not Modified. Reports latency,
+SQL statements and body bytes per request.
+
+    python -m benchmarks.bench_read_cache --expenses 50000 --requests 2000
+    python -m benchmarks.bench_read_cache --json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from sqlalchemy import event
+
+from app import create_app
+from benchmarks.seed import DEFAULT_DATABASE_URL, seed_dataset
+from extensions import db
+from models import User
+import migrations
+
+
+def poll(client, paths, statements, revalidate=False, auth=None):
+    etags, latencies, sql, sent = {}, [], 0, 0
+    for path in paths:
+        headers = {'If-None-Match': etags[path]} if revalidate and path in etags else {}
+        headers.update(auth or {})
+        before = statements[0]
+        started = time.perf_counter()
+        response = client.get(path, headers=headers)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code in (200, 304), response.status_code
+        sql += statements[0] - before
+        sent += len(response.get_data())
+        etags[path] = response.headers.get('ETag', '')
+    return {
+        'mean_us': round(statistics.fmean(latencies) * 1e6, 1),
+        'p95_us': round(sorted(latencies)[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1e6, 1),
+        'sql_per_request': round(sql / len(paths), 2),
+        'bytes_per_request': round(sent / len(paths)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--expenses', type=int, default=50000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--pollers', type=int, default=50, help='Distinct users polling their own listing.')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    config = {'SQLALCHEMY_DATABASE_URI': args.database_url, 'SECRET_KEY': 'bench-secret', 'METRICS_ENABLED': False}
+    scenarios = [
+        ('no cache', {**config, 'RESPONSE_CACHE_SIZE': 0}, False),
+        ('cache hit', config, False),
+        ('304 revalidate', config, True),
+    ]
+
+    results = {'requests': args.requests, 'endpoints': {}}
+    for label, app_config, revalidate in scenarios:
+        app = create_app(app_config)
+        with app.app_context():
+            if 'dataset' not in results:
+                migrations.reset()
+                migrations.upgrade(echo=lambda message: None)
+                results['dataset'] = seed_dataset(expenses=args.expenses)
+                rng = random.Random(1)
+                employees = [user.id for user in User.query.filter_by(role='Employee').limit(args.pollers)]
+                admin = User.query.filter_by(role='Admin').first()
+                endpoints = {
+                    'user listing': [f"/api/expenses/user/{rng.choice(employees)}?limit=50"
+                                     for _ in range(args.requests)],
+                    'pending listing': ["/api/expenses/pending?limit=50"] * args.requests,
+                }
+            # The pending listing is the signed-in admin's company queue
+            auth = {'Authorization': f"Bearer {app.extensions['auth'].issue(admin)}"}
+            statements = [0]
+
+            def count(*_):
+                statements[0] += 1
+            event.listen(db.engine, 'before_cursor_execute', count)
+
+        client = app.test_client()
+        for endpoint, paths in endpoints.items():
+            poll(client, paths[:100], statements, revalidate, auth)  # warm-up, and fills the cache
+            results['endpoints'].setdefault(endpoint, {})[label] = poll(client, paths, statements, revalidate, auth)
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', count)
+            db.session.remove()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['requests']} polls per listing over {results['dataset']['expenses']} expenses")
+    print(f"{'listing':>16} {'scenario':>15} {'mean us':>9} {'p95 us':>9} {'sql/req':>8} {'bytes/req':>10}")
+    for endpoint, rows in results['endpoints'].items():
+        for label, row in rows.items():
+            print(f"{endpoint:>16} {label:>15} {row['mean_us']:>9} {row['p95_us']:>9} "
+                  f"{row['sql_per_request']:>8} {row['bytes_per_request']:>10}")
+
+
+if __name__ == '__main__':
+    main()
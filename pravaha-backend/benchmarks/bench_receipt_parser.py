@@ -0,0 +1,78 @@
+# benchmarks/bench_receipt_parser.py
+"""
+Throughput and extraction accuracy of the receipt parser on synthetic receipts,
+next to the previous regex heuristic.
+
+    python -m benchmarks.bench_receipt_parser --receipts 5000 --json
+"""
+import argparse
+import json
+import re
+import time
+
+from benchmarks.receipts import generate_receipts
+from services.receipt_parser import ReceiptParser
+
+
+def legacy_parse(full_text):
+    """The heuristic ocr_service used before ReceiptParser (last currency match is the total)."""
+    currency_pattern = r'([A-Z]{3}|\$|€|£|¥)\s*(\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2})?)'
+    matches = re.findall(currency_pattern, full_text, re.IGNORECASE)
+    result = {'suggested_amount': None, 'suggested_currency': None, 'suggested_category': 'Miscellaneous'}
+    if matches:
+        symbol, amount_str = matches[-1]
+        symbol = symbol.upper()
+        result['suggested_currency'] = {'$': 'USD', '€': 'EUR', '£': 'GBP', '¥': 'JPY'}.get(symbol, symbol)
+        result['suggested_amount'] = float(amount_str.replace(',', ''))
+        if re.search(r'uber|taxi|transport|flight|train', full_text, re.IGNORECASE):
+            result['suggested_category'] = 'Travel'
+        elif re.search(r'hotel|lodging|inn|resort', full_text, re.IGNORECASE):
+            result['suggested_category'] = 'Lodging'
+        elif re.search(r'food|restaurant|cafe|dinner', full_text, re.IGNORECASE):
+            result['suggested_category'] = 'Food'
+    return result
+
+
+def run(parse, receipts):
+    correct = {'amount': 0, 'currency': 0, 'category': 0}
+    started = time.perf_counter()
+    outputs = [parse(text) for text, _ in receipts]
+    elapsed = time.perf_counter() - started
+
+    for output, (_, truth) in zip(outputs, receipts):
+        amount = output['suggested_amount']
+        correct['amount'] += amount is not None and abs(amount - truth['amount']) < 0.005
+        correct['currency'] += output['suggested_currency'] == truth['currency']
+        correct['category'] += output['suggested_category'] == truth['category']
+
+    return {
+        'receipts_per_sec': round(len(receipts) / elapsed, 1),
+        'accuracy': {field: round(hits / len(receipts), 4) for field, hits in correct.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--receipts', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    receipts = generate_receipts(args.receipts, args.seed)
+    results = {
+        'receipts': len(receipts),
+        'receipt_parser': run(ReceiptParser().parse, receipts),
+        'legacy_heuristic': run(legacy_parse, receipts),
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name in ('receipt_parser', 'legacy_heuristic'):
+        result = results[name]
+        accuracy = ', '.join(f"{field} {value:.1%}" for field, value in result['accuracy'].items())
+        print(f"{name:>16}: {result['receipts_per_sec']:>9} receipts/s | {accuracy}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start cost of the backend, measured in fresh interpreters: importing `app`,
+building it with create_app(), the first served API request and the first OCR
+request. Also lists which heavy optional modules were loaded at each point, so a
+regression that makes them eager again shows up.
+
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --runs 10 --json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['google.cloud.vision', 'requests', 'PIL', 'pytesseract']
+
+PROBE = r'''
+import base64, json, sys, time
+started = time.perf_counter()
+heavy = HEAVY_MODULES
+
+def loaded():
+    return [name for name in heavy if name in sys.modules]
+
+timings, modules = {}, {}
+import app as app_module
+timings['import_app'] = time.perf_counter() - started
+modules['after_import'] = loaded()
+
+mark = time.perf_counter()
+app = app_module.create_app()
+timings['create_app'] = time.perf_counter() - mark
+
+client = app.test_client()
+mark = time.perf_counter()
+status = client.get('/api/expenses/company/1?limit=10').status_code
+timings['first_request'] = time.perf_counter() - mark
+modules['after_first_request'] = loaded()
+assert status == 200, status
+
+mark = time.perf_counter()
+status = client.post('/api/ocr/process', json={'image_data': base64.b64encode(b'receipt').decode()}).status_code
+timings['first_ocr_request'] = time.perf_counter() - mark
+modules['after_first_ocr'] = loaded()
+assert status == 200, status
+
+timings['total'] = time.perf_counter() - started
+print(json.dumps({'timings': timings, 'modules': modules}))
+'''
+
+
+def prepare_database(path):
+    """Schema only, created once in its own process so it is not part of the timings."""
+    script = (
+        "from benchmarks.seed import make_app\nimport migrations\n"
+        "app = make_app(%r)\nwith app.app_context():\n    migrations.upgrade(echo=lambda *a: None)\n"
+    ) % f"sqlite:///{path}"
+    subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, check=True)
+
+
+def run_once(env):
+    probe = PROBE.replace('HEAVY_MODULES', repr(HEAVY_MODULES))
+    output = subprocess.run(
+        [sys.executable, '-c', probe], cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    # Services may log to stdout; the result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--ocr-engine', default='static',
+                        help='Engine for the first OCR request (static needs no credentials or network).')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, 'startup.db')
+        prepare_database(database)
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}", OCR_ENGINE=args.ocr_engine,
+                   OCR_CACHE_DIR='', SECRET_KEY='bench')
+        runs = [run_once(env) for _ in range(args.runs)]
+
+    results = {
+        'runs': len(runs),
+        'median_ms': {
+            stage: round(statistics.median(run['timings'][stage] for run in runs) * 1000, 1)
+            for stage in runs[0]['timings']
+        },
+        'modules': runs[-1]['modules'],
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['runs']} cold starts (median)")
+    for stage, ms in results['median_ms'].items():
+        print(f"{stage:>18}: {ms:>8.1f} ms")
+    for point, names in results['modules'].items():
+        print(f"heavy modules {point}: {', '.join(names) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
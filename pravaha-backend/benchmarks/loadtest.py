@@ -0,0 +1,298 @@
+# benchmarks/loadtest.py
+"""
+Load test of the hot routes on a seeded database. Requests go through the Flask
+test client in this process, with local fake rate and OCR providers, so no network
+is involved and runs are repeatable. Each scenario reports throughput, latency
+percentiles and SQL statements per request; --json output can be kept as a
+baseline, and a later run compared against it fails when a scenario regressed.
+
+Scenarios: submit, list_pending, approve, export, ocr_parse. SQL statements of
+the streamed export run after the request is recorded and are not counted. The
+response cache is off unless --response-cache is given, so list_pending times the
+query; a baseline only compares against runs in the same mode.
+
+    python -m benchmarks.loadtest --expenses 200000 --requests 1000
+    python -m benchmarks.seed --companies 10 --users 2000 --managers 400 --fanout 2 --expenses 5000000
+    python -m benchmarks.loadtest --reuse --threads 4 --json > baseline.json
+    python -m benchmarks.loadtest --reuse --scenarios submit,approve --baseline baseline.json --tolerance 0.25
+    python -m benchmarks.loadtest --reuse --scenarios list_pending --response-cache
+"""
+import argparse
+import base64
+import contextlib
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import sqlalchemy
+from sqlalchemy import func, select
+
+from app import create_app
+from benchmarks.receipts import generate_receipts
+from benchmarks.seed import CATEGORIES, CURRENCIES, DEFAULT_DATABASE_URL, seed_dataset
+from extensions import db
+from models import Company, Expense, User
+from services import exchange_service, metrics, ocr_service
+from services.ocr_engines import StaticTextEngine
+from services.rate_cache import StaticRateSource
+import migrations
+
+SCENARIOS = ['submit', 'list_pending', 'approve', 'export', 'ocr_parse']
+
+# Units per USD; every other pair is derived from these
+USD_RATES = {'USD': 1.0, 'EUR': 0.92, 'GBP': 0.79, 'INR': 83.1, 'JPY': 151.4}
+
+
+def fake_rate_source():
+    return StaticRateSource({
+        base: {code: rate / USD_RATES[base] for code, rate in USD_RATES.items()} for base in USD_RATES
+    })
+
+
+class Fixture:
+    """Users, tokens and ids the scenario drivers draw from, all loaded before timing starts."""
+
+    def __init__(self, app, rng, pending_needed, pool_size=500):
+        self.rng = rng
+        authenticator = app.extensions['auth']
+        users = User.query.filter(User.role.in_(['Admin', 'Manager'])).all()
+        users += db.session.scalars(
+            select(User).where(User.role == 'Employee').order_by(User.id).limit(pool_size * 10)
+        ).all()
+        self.tokens = {user.id: f"Bearer {authenticator.issue(user)}" for user in users}
+        self.admins = {user.company_id: user.id for user in users if user.role == 'Admin'}
+        employees = [user for user in users if user.role == 'Employee']
+        self.employees = rng.sample(employees, min(pool_size, len(employees)))
+        managers = [user for user in users if user.role == 'Manager']
+        self.managers = rng.sample(managers, min(pool_size, len(managers)))
+
+        # Each approval consumes one pending expense
+        pending = db.session.execute(
+            select(Expense.id, Expense.company_id).where(Expense.status == 'Pending').order_by(Expense.id.desc())
+            .limit(pending_needed)
+        ).all()
+        self.pending = [tuple(row) for row in pending]
+        rng.shuffle(self.pending)
+        self.export_since = (date.today() - timedelta(days=30)).isoformat()
+
+        # Distinct fake images, so every OCR request misses the result cache
+        receipts = generate_receipts(pool_size)
+        self.images = [f"loadtest receipt {i}".encode() for i in range(len(receipts))]
+        self.ocr_engine = StaticTextEngine(texts={image: text for image, (text, _) in zip(self.images, receipts)})
+
+    def auth(self, user_id):
+        return {'Authorization': self.tokens[user_id]}
+
+
+def submit(fixture, i):
+    user = fixture.employees[i % len(fixture.employees)]
+    body = {
+        'amount': round(fixture.rng.uniform(5, 2000), 2),
+        'currency': fixture.rng.choice(CURRENCIES),
+        'category': fixture.rng.choice(CATEGORIES),
+        'description': 'Load test expense',
+        'date': (date.today() - timedelta(days=fixture.rng.randrange(60))).isoformat(),
+    }
+    return 'POST', '/api/expenses', {'json': body, 'headers': fixture.auth(user.id)}
+
+
+def list_pending(fixture, i):
+    manager = fixture.managers[i % len(fixture.managers)]
+    # The company and the manager filter come from the token
+    query = {'limit': 50}
+    return 'GET', '/api/expenses/pending', {'query_string': query, 'headers': fixture.auth(manager.id)}
+
+
+def approve(fixture, i):
+    expense_id, company_id = fixture.pending[i]
+    body = {'status': 'Approved' if fixture.rng.random() < 0.8 else 'Rejected'}
+    headers = fixture.auth(fixture.admins[company_id])
+    return 'PATCH', f'/api/expenses/approve/{expense_id}', {'json': body, 'headers': headers}
+
+
+def export(fixture, i):
+    company_id = sorted(fixture.admins)[i % len(fixture.admins)]
+    query = {'format': 'csv', 'start_date': fixture.export_since}
+    headers = fixture.auth(fixture.admins[company_id])
+    return 'GET', f'/api/expenses/company/{company_id}/export', {'query_string': query, 'headers': headers}
+
+
+def ocr_parse(fixture, i):
+    image = fixture.images[i % len(fixture.images)]
+    return 'POST', '/api/ocr/process', {'json': {'image_data': base64.b64encode(image).decode()}}
+
+
+DRIVERS = {'submit': submit, 'list_pending': list_pending, 'approve': approve, 'export': export, 'ocr_parse': ocr_parse}
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _statements(before, after):
+    count = sum(c for c, _ in after.values()) - sum(c for c, _ in before.values())
+    total = sum(s for _, s in after.values()) - sum(s for _, s in before.values())
+    return round(total / count, 1) if count else None
+
+
+def run_scenario(app, fixture, name, requests, warmup, threads):
+    driver = DRIVERS[name]
+    client = app.test_client()
+
+    def call(i):
+        method, path, options = driver(fixture, i)
+        started = time.perf_counter()
+        response = client.open(path, method=method, **options)
+        response.get_data()  # drains streamed bodies (export)
+        return time.perf_counter() - started, response.status_code
+
+    for i in range(warmup):
+        call(i)
+    before = metrics.REQUEST_STATEMENTS.snapshot()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(call, range(warmup, warmup + requests)))
+    wall = time.perf_counter() - started
+    after = metrics.REQUEST_STATEMENTS.snapshot()
+
+    latencies = sorted(elapsed for elapsed, _ in results)
+    statuses = Counter(status for _, status in results)
+    return {
+        'requests': requests,
+        'errors': sum(count for status, count in statuses.items() if status >= 400),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(requests / wall, 1),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 2),
+        'p90_ms': round(_percentile(latencies, 0.90) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+        'sql_per_request': _statements(before, after),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Scenario regressions against a previous --json run: slower p95 or lower throughput beyond `tolerance`."""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s")
+        statements, previous_statements = current['sql_per_request'] or 0, previous['sql_per_request'] or 0
+        if statements > previous_statements * (1 + tolerance):
+            regressions.append(f"{name}: SQL statements per request {previous_statements} -> {statements}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=DEFAULT_DATABASE_URL)
+    parser.add_argument('--reuse', action='store_true', help='Keep the data already in the database.')
+    parser.add_argument('--companies', type=int, default=2)
+    parser.add_argument('--users', type=int, default=500, help='Users per company.')
+    parser.add_argument('--managers', type=int, default=60, help='Managers per company.')
+    parser.add_argument('--fanout', type=int, default=3, help='Reports per manager in the manager tree.')
+    parser.add_argument('--expenses', type=int, default=100000)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated subset of the scenarios.')
+    parser.add_argument('--requests', type=int, default=500, help='Timed requests per scenario.')
+    parser.add_argument('--warmup', type=int, default=20, help='Untimed requests per scenario.')
+    parser.add_argument('--threads', type=int, default=1, help='Concurrent clients.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--response-cache', action='store_true',
+                        help='Serve repeat reads from the response cache (off: every read runs its query).')
+    parser.add_argument('--json', action='store_true', help='Print machine-readable results.')
+    parser.add_argument('--baseline', help='A previous --json result; exit 1 if any scenario regressed.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown against --baseline.')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = sorted(set(scenarios) - set(DRIVERS))
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('environment', {}).get('response_cache', False) != args.response_cache:
+            parser.error("the baseline was recorded with the response cache "
+                         f"{'off' if args.response_cache else 'on'}; match it with --response-cache")
+
+    config = {'SQLALCHEMY_DATABASE_URI': args.database_url, 'SECRET_KEY': 'loadtest-secret'}
+    if not args.response_cache:
+        config['RESPONSE_CACHE_SIZE'] = 0
+    app = create_app(config)
+    exchange_service.set_rate_source(fake_rate_source())
+    rng = random.Random(args.seed)
+
+    with app.app_context():
+        if not args.reuse:
+            migrations.reset()
+            migrations.upgrade(echo=lambda message: None)
+            seed_dataset(args.companies, args.users, args.managers, args.expenses, seed=args.seed,
+                         fanout=args.fanout, echo=lambda message: print(f"seed: {message}", file=sys.stderr))
+        dataset = {
+            'companies': db.session.scalar(select(func.count()).select_from(Company)),
+            'users': db.session.scalar(select(func.count()).select_from(User)),
+            'expenses': db.session.scalar(select(func.count()).select_from(Expense)),
+        }
+        fixture = Fixture(app, rng, pending_needed=args.requests + args.warmup)
+        dialect = db.engine.dialect.name
+        db.session.remove()
+    ocr_service.set_engine(fixture.ocr_engine)
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'database': dialect,
+            'threads': args.threads,
+            'response_cache': args.response_cache,
+        },
+        'dataset': dataset,
+        'scenarios': {},
+    }
+    for name in scenarios:
+        requests = args.requests
+        if name == 'approve':
+            requests = min(requests, len(fixture.pending) - args.warmup)
+            if requests <= 0:
+                print("approve: no pending expenses left; reseed or drop --reuse.", file=sys.stderr)
+                continue
+        # The routes print diagnostics; keep stdout for the results
+        with contextlib.redirect_stdout(sys.stderr):
+            results['scenarios'][name] = run_scenario(app, fixture, name, requests, args.warmup, args.threads)
+
+    regressions = []
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        results['regressions'] = regressions
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{dataset['expenses']} expenses, {dataset['users']} users, {dataset['companies']} companies; "
+              f"{args.threads} client thread(s), response cache {'on' if args.response_cache else 'off'}")
+        print(f"{'scenario':>13} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} {'sql/req':>7}")
+        for name, row in results['scenarios'].items():
+            print(f"{name:>13} {row['throughput_rps']:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+                  f"{row['errors']:>6} {'-' if row['sql_per_request'] is None else row['sql_per_request']:>7}")
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/receipts.py
+"""Synthetic receipt texts with known totals, currencies and categories."""
+import random
+
+MERCHANTS = {
+    'Travel': ['City Taxi Co', 'Uber Trip Receipt', 'Rail Express Train', 'Metro Fuel Station', 'SkyHigh Airline'],
+    'Lodging': ['Grand Hotel', 'Seaside Resort', 'Budget Inn', 'Central Motel', 'Harbour Hostel'],
+    'Food': ['Blue Door Cafe', 'Luigi Pizza', 'The Burger Grill', 'Golden Restaurant', 'Corner Bakery'],
+    'Miscellaneous': ['Office Depot', 'Print Shop', 'Hardware World', 'Stationery Hub', 'Electronics Mart'],
+}
+
+# Includes words that spell ISO currency codes (CUP, PEN, TOP) to catch them being read as one
+ITEMS = ['Service', 'Item', 'Charge', 'Fee', 'Product', 'Extra', 'Cup', 'Gel pen', 'Top']
+
+# (currency, format(amount) -> str) covering symbol/code prefixes, suffixes and EU decimals.
+# Plain numbers carry no currency, so none should be suggested.
+FORMATS = [
+    (None, lambda a: f"{a:.2f}"),
+    ('USD', lambda a: f"${a:,.2f}"),
+    ('USD', lambda a: f"USD {a:,.2f}"),
+    ('EUR', lambda a: f"{a:,.2f} €".replace(',', 'X').replace('.', ',').replace('X', '.')),
+    ('EUR', lambda a: f"EUR {a:.2f}"),
+    ('GBP', lambda a: f"£{a:,.2f}"),
+    ('INR', lambda a: f"{a:,.2f} INR"),
+    ('INR', lambda a: f"₹{a:,.2f}"),
+]
+
+
+def generate_receipts(count=1000, seed=7):
+    """Returns [(text, {'amount', 'currency', 'category'})]."""
+    rng = random.Random(seed)
+    receipts = []
+    for _ in range(count):
+        category = rng.choice(list(MERCHANTS))
+        currency, fmt = rng.choice(FORMATS)
+
+        lines = [rng.choice(MERCHANTS[category]), f"Date: {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2025",
+                 f"Tel: 0{rng.randint(100000000, 999999999)}"]
+        subtotal = 0.0
+        for _ in range(rng.randint(1, 6)):
+            quantity, price = rng.randint(1, 3), round(rng.uniform(1, 400), 2)
+            subtotal += quantity * price
+            lines.append(f"{quantity} x {rng.choice(ITEMS)} {fmt(quantity * price)}")
+        subtotal = round(subtotal, 2)
+        tax = round(subtotal * 0.08, 2)
+        total = round(subtotal + tax, 2)
+
+        lines.append(f"Subtotal {fmt(subtotal)}")
+        lines.append(f"Tax {fmt(tax)}")
+        if rng.random() < 0.3:
+            # Label and value on separate lines
+            lines.extend(['TOTAL', fmt(total)])
+        else:
+            lines.append(f"{rng.choice(['TOTAL', 'Total', 'Grand Total', 'Amount Due'])} {fmt(total)}")
+        if rng.random() < 0.5:
+            tendered = round(total + rng.uniform(1, 50), 2)
+            lines.append(f"Cash {fmt(tendered)}")
+            lines.append(f"Change {fmt(round(tendered - total, 2))}")
+        lines.append('Thank you for your visit!')
+
+        receipts.append(('\n'.join(lines), {'amount': total, 'currency': currency, 'category': category}))
+    return receipts
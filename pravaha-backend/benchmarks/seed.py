@@ -0,0 +1,200 @@
+# benchmarks/seed.py
+"""
+Synthetic data for benchmarks.
+
+    python -m benchmarks.seed --database-url sqlite:////tmp/pravaha_bench.db --expenses 200000
+    python -m benchmarks.seed --companies 10 --users 2000 --managers 400 --fanout 2 --expenses 5000000
+    python -m benchmarks.seed --database-url postgresql://localhost/pravaha_bench --expenses 2000000
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+from flask import Flask
+from sqlalchemy import inspect, insert, text
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import db
+from models import Company, User, Expense
+from services import duplicates, expense_summary, hierarchy
+
+DEFAULT_DATABASE_URL = 'sqlite:////tmp/pravaha_bench.db'
+
+CATEGORIES = ['Travel', 'Lodging', 'Food', 'Office Supplies', 'Miscellaneous']
+CURRENCIES = ['USD', 'EUR', 'GBP', 'INR', 'JPY']
+STATUSES = ['Pending', 'Approved', 'Rejected']
+
+# Hashing a password per seeded user would dominate seeding time
+PASSWORD_HASH = generate_password_hash('bench-password')
+
+
+def make_app(database_url=DEFAULT_DATABASE_URL):
+    """Minimal app bound to the shared db object, without importing the routes."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def _insert_chunks(table, rows, chunk_size=5000):
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(insert(table), rows[start:start + chunk_size])
+
+
+def _sync_sequences(tables):
+    # Rows were inserted with explicit ids; move Postgres' serial counters past them
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    for table in tables:
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), COALESCE(MAX(id), 1)) FROM \"{table}\""
+        ))
+
+
+def seed_dataset(companies=1, users_per_company=200, managers_per_company=20, expenses=100000,
+                 pending_ratio=0.2, days=730, seed=42, fanout=None, echo=None):
+    """
+    Inserts companies, users (employees spread across managers) and expenses, and
+    builds the closure table and the monthly summary when the schema has them.
+    Managers report to nobody, or with `fanout` form a tree under each company's
+    admin (`fanout` reports per manager, so a small fanout gives a deep hierarchy).
+    `echo` receives progress messages. Must run inside an app context on empty
+    tables. Returns a summary dict.
+    """
+    rng = random.Random(seed)
+    today = date.today()
+
+    _insert_chunks(Company, [
+        {'id': c, 'name': f'Bench Company {c}', 'currency_code': CURRENCIES[c % len(CURRENCIES)]}
+        for c in range(1, companies + 1)
+    ])
+
+    users, employee_ids = [], []
+    user_id = 0
+    for company_id in range(1, companies + 1):
+        manager_ids = []
+        for i in range(users_per_company):
+            user_id += 1
+            is_manager = i < managers_per_company
+            users.append({
+                'id': user_id,
+                'email': f'user{user_id}@bench.example',
+                'password_hash': PASSWORD_HASH,
+                'full_name': f'Bench User {user_id}',
+                'role': 'Admin' if i == 0 else ('Manager' if is_manager else 'Employee'),
+                'company_id': company_id,
+                'manager_id': _manager_of(i, manager_ids, is_manager, fanout, rng),
+            })
+            if is_manager:
+                manager_ids.append(user_id)
+            else:
+                employee_ids.append((user_id, company_id))
+    _insert_chunks(User, users)
+    # On an older schema (bench_indexes seeds at version 1) the migrations backfill these later
+    derived = inspect(db.session.get_bind()).get_table_names()
+    if 'user_hierarchy' in derived:
+        hierarchy.rebuild()
+    if echo:
+        echo(f"{len(users)} users in {companies} companies")
+
+    rows = []
+    for expense_id in range(1, expenses + 1):
+        submitter, company_id = rng.choice(employee_ids)
+        amount = round(rng.uniform(5, 2000), 2)
+        currency = rng.choice(CURRENCIES)
+        rows.append({
+            'id': expense_id,
+            'amount': amount,
+            'currency': currency,
+            'base_amount': amount,
+            'category': rng.choice(CATEGORIES),
+            'description': 'Seeded expense',
+            'date': today - timedelta(days=rng.randrange(days)),
+            'status': 'Pending' if rng.random() < pending_ratio else rng.choice(STATUSES[1:]),
+            'user_id': submitter,
+            'company_id': company_id,
+            'fingerprint': duplicates.fingerprint(amount, currency),
+        })
+        if len(rows) >= 20000:
+            _insert_chunks(Expense, rows)
+            rows = []
+            if echo and expense_id % 500000 == 0:
+                echo(f"{expense_id} expenses")
+    _insert_chunks(Expense, rows)
+
+    if 'expense_summary' in derived:
+        expense_summary.rebuild()
+    _sync_sequences(['company', 'user', 'expense'])
+    db.session.commit()
+    return {'companies': companies, 'users': len(users), 'expenses': expenses}
+
+
+def _manager_of(index, manager_ids, is_manager, fanout, rng):
+    if not manager_ids:
+        return None
+    if not is_manager:
+        return rng.choice(manager_ids)
+    # manager_ids holds this company's managers so far, the admin first
+    return manager_ids[(index - 1) // fanout] if fanout else None
+
+
+def seed_org_tree(users=20000, fanout=8, company_id=1, first_user_id=1):
+    """
+    A balanced manager tree (user 1 at the top, `fanout` reports per manager) for an
+    existing company, with its closure table. Returns the ids by depth, top first.
+    """
+    rows, levels = [], [[first_user_id]]
+    for offset in range(users):
+        user_id = first_user_id + offset
+        manager_id = None if offset == 0 else first_user_id + (offset - 1) // fanout
+        rows.append({
+            'id': user_id,
+            'email': f'org{user_id}@bench.example',
+            'password_hash': PASSWORD_HASH,
+            'full_name': f'Org User {user_id}',
+            'role': 'Admin' if offset == 0 else 'Manager',
+            'company_id': company_id,
+            'manager_id': manager_id,
+        })
+    _insert_chunks(User, rows)
+    hierarchy.rebuild(company_id)
+    _sync_sequences(['user'])
+    db.session.commit()
+
+    depth_of = {first_user_id: 0}
+    for row in rows[1:]:
+        depth_of[row['id']] = depth_of[row['manager_id']] + 1
+        if depth_of[row['id']] == len(levels):
+            levels.append([])
+        levels[depth_of[row['id']]].append(row['id'])
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed a database with synthetic expense data.')
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL', DEFAULT_DATABASE_URL))
+    parser.add_argument('--companies', type=int, default=1)
+    parser.add_argument('--users', type=int, default=200, help='Users per company.')
+    parser.add_argument('--managers', type=int, default=20, help='Managers per company.')
+    parser.add_argument('--fanout', type=int, help='Arrange managers in a tree with this many reports each.')
+    parser.add_argument('--expenses', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    import migrations
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        migrations.reset()
+        migrations.upgrade(echo=lambda message: None)
+        print(seed_dataset(args.companies, args.users, args.managers, args.expenses,
+                           seed=args.seed, fanout=args.fanout, echo=print))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+# migrations.py
+"""
+Ordered, idempotent schema migrations.
+
+Applied versions are recorded in the `schema_migrations` table, so `upgrade()` only
+runs what a database has not seen yet. Every step is written to be safe on a
+database that `db.create_all()` already brought up to date.
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from extensions import db
+from models import (
+    Company, User, UserHierarchy, Expense, ExchangeRate, ExpenseSummary, ApprovalRule, ApprovalStep
+)
+from services import duplicates, expense_summary, hierarchy
+
+
+def _create_tables(bind, *tables):
+    for table in tables:
+        table.create(bind, checkfirst=True)
+
+def _create_indexes(bind, *indexes):
+    for index in indexes:
+        index.create(bind, checkfirst=True)
+
+def _table_index(table, name):
+    return next(index for index in table.indexes if index.name == name)
+
+
+def _initial_schema(bind):
+    _create_tables(bind, Company.__table__, User.__table__, Expense.__table__, ExchangeRate.__table__)
+
+def _hot_filter_indexes(bind):
+    _create_indexes(
+        bind,
+        _table_index(User.__table__, 'ix_user_company_id'),
+        _table_index(User.__table__, 'ix_user_manager_id'),
+        _table_index(Expense.__table__, 'ix_expense_company_status_date'),
+        _table_index(Expense.__table__, 'ix_expense_company_date'),
+        _table_index(Expense.__table__, 'ix_expense_user_date'),
+        _table_index(Expense.__table__, 'ix_expense_pending_company_date'),
+    )
+
+def _expense_summary(bind):
+    _create_tables(bind, ExpenseSummary.__table__)
+    expense_summary.rebuild(session=bind)
+
+def _user_hierarchy(bind):
+    _create_tables(bind, UserHierarchy.__table__)
+    hierarchy.rebuild(session=bind)
+
+def _approval_workflows(bind):
+    _create_tables(bind, ApprovalRule.__table__, ApprovalStep.__table__)
+
+def _add_columns(bind, table, *columns):
+    existing = {column['name'] for column in inspect(bind).get_columns(table.name)}
+    for column in columns:
+        if column.name not in existing:
+            bind.execute(text(
+                f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(bind.dialect)}'
+            ))
+
+def _duplicate_detection(bind):
+    table = Expense.__table__
+    _add_columns(bind, table, table.c.fingerprint, table.c.receipt_hash, table.c.merchant)
+    _create_indexes(
+        bind,
+        _table_index(table, 'ix_expense_user_fingerprint_date'),
+        _table_index(table, 'ix_expense_company_receipt_hash'),
+    )
+    duplicates.backfill(session=bind)
+
+
+# (version, description, step) -- append only, never renumber
+MIGRATIONS = [
+    (1, 'initial schema', _initial_schema),
+    (2, 'indexes for expense and team hot filters', _hot_filter_indexes),
+    (3, 'expense summary rollup for analytics', _expense_summary),
+    (4, 'manager hierarchy closure table', _user_hierarchy),
+    (5, 'approval rules and approval steps', _approval_workflows),
+    (6, 'expense fingerprints for duplicate detection', _duplicate_detection),
+]
+
+
+def _ensure_version_table(bind):
+    bind.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(200) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+def current_version():
+    with db.engine.begin() as bind:
+        _ensure_version_table(bind)
+        return bind.execute(text("SELECT MAX(version) FROM schema_migrations")).scalar() or 0
+
+def upgrade(target=None, echo=print):
+    """Applies pending migrations in order, each in its own transaction. Returns the new version."""
+    version = current_version()
+
+    for step_version, name, step in MIGRATIONS:
+        if step_version <= version or (target is not None and step_version > target):
+            continue
+        echo(f"Applying migration {step_version}: {name}")
+        with db.engine.begin() as bind:
+            step(bind)
+            bind.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {'v': step_version, 'n': name, 't': datetime.utcnow()}
+            )
+        version = step_version
+
+    return version
+
+def reset():
+    """Drops every model table and the version table. Only for throwaway (benchmark) databases."""
+    db.drop_all()
+    with db.engine.begin() as bind:
+        bind.execute(text("DROP TABLE IF EXISTS schema_migrations"))
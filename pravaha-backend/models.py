@@ -19,8 +19,9 @@ class User(db.Model):
     full_name = db.Column(db.String(100), nullable=False)
     role = db.Column(db.String(20), default='Employee', nullable=False) 
     
-    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
-    manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) 
+    # Indexed: team lookups filter users by company and by manager
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False, index=True)
+    manager_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True) 
     
     team_members = db.relationship('User', backref=db.backref('manager', remote_side=[id]), lazy='dynamic')
     
@@ -30,6 +31,19 @@ class User(db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+# --- Manager Hierarchy (closure table) ---
+class UserHierarchy(db.Model):
+    # One row per (manager above, user below) pair at any distance, plus a depth 0 row
+    # per user for itself. Kept in step with User.manager_id by services/hierarchy.py
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+
+    # The primary key answers "everyone under X"; this one answers "everyone above Y", nearest first
+    __table_args__ = (
+        db.Index('ix_user_hierarchy_descendant_depth', 'descendant_id', 'depth'),
+    )
+
 class Expense(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     
@@ -51,6 +65,93 @@ class Expense(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
 
+    # Duplicate detection (see services/duplicates.py)
+    fingerprint = db.Column(db.String(24))   # Normalized currency and amount, e.g. "USD:1250"
+    receipt_hash = db.Column(db.String(64))  # SHA-256 of the OCR'd receipt image
+    merchant = db.Column(db.String(100))     # Normalized merchant words from the OCR text
+
     # Relationships (Optional but good practice)
     user = db.relationship('User', backref='expenses')
-    company = db.relationship('Company', backref='company_expenses')
\ No newline at end of file
+    company = db.relationship('Company', backref='company_expenses')
+
+    # Indexes matching the listing access patterns (filter, then newest first on date, id)
+    __table_args__ = (
+        db.Index('ix_expense_company_status_date', 'company_id', 'status', 'date', 'id'),
+        db.Index('ix_expense_company_date', 'company_id', 'date', 'id'),
+        db.Index('ix_expense_user_date', 'user_id', 'date', 'id'),
+        # Approval queue: only Pending rows, on backends with partial indexes
+        db.Index(
+            'ix_expense_pending_company_date', 'company_id', 'date', 'id',
+            postgresql_where=db.text("status = 'Pending'"),
+            sqlite_where=db.text("status = 'Pending'")
+        ),
+        # One lookup per submission: same user and amount within a date window, or the same receipt image
+        db.Index('ix_expense_user_fingerprint_date', 'user_id', 'fingerprint', 'date'),
+        db.Index('ix_expense_company_receipt_hash', 'company_id', 'receipt_hash'),
+    )
+
+# --- Exchange Rate Snapshot Model ---
+class ExchangeRate(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+
+    # One row per (snapshot base, day, currency): 1 base_currency = rate currency
+    base_currency = db.Column(db.String(3), nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    rate_date = db.Column(db.Date, nullable=False)
+    rate = db.Column(db.Numeric(20, 10), nullable=False)
+
+    # Also serves as the lookup index for "latest snapshot on or before a date"
+    __table_args__ = (
+        db.UniqueConstraint('base_currency', 'rate_date', 'currency', name='uq_exchange_rate_snapshot'),
+    )
+
+# --- Expense Summary Model (analytics rollup) ---
+class ExpenseSummary(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+
+    # One row per (company, month, submitter, category, status); kept in step with Expense
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # First day of the expense month
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+
+    expense_count = db.Column(db.Integer, default=0, nullable=False)
+    total_base_amount = db.Column(db.Numeric(14, 2), default=0, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('company_id', 'month', 'user_id', 'category', 'status', name='uq_expense_summary_key'),
+    )
+
+
+# --- Approval Workflow Models ---
+class ApprovalRule(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey('company.id'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    # Lower runs first; the first active rule whose conditions match routes the expense
+    priority = db.Column(db.Integer, default=100, nullable=False)
+    active = db.Column(db.Boolean, default=True, nullable=False)
+    # {"min_amount": 1000, "max_amount": 5000, "categories": ["Travel"]}; amounts in base currency
+    conditions = db.Column(db.JSON, nullable=False, default=dict)
+    # [{"approver": "manager"}, {"approver": "role", "role": "Finance", "ratio": 0.6}, ...]
+    steps = db.Column(db.JSON, nullable=False)
+
+class ApprovalStep(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    # One row per approver per step of an expense's workflow, created at submission
+    expense_id = db.Column(db.Integer, db.ForeignKey('expense.id'), nullable=False)
+    rule_id = db.Column(db.Integer, db.ForeignKey('approval_rule.id'), nullable=False)
+    sequence = db.Column(db.Integer, nullable=False)
+    approver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Approvals needed to complete the step (the same on every row of the step)
+    required = db.Column(db.Integer, nullable=False)
+    # Waiting (later step) -> Pending (current step) -> Approved / Rejected, or Skipped
+    status = db.Column(db.String(20), nullable=False)
+    decided_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_approval_step_expense', 'expense_id', 'sequence'),
+        # "Awaiting my decision" queue
+        db.Index('ix_approval_step_approver_status', 'approver_id', 'status'),
+    )
@@ -0,0 +1,379 @@
+# services/approval_engine.py
+import math
+import os
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+
+from extensions import db
+from models import User, Expense, UserHierarchy, ApprovalRule, ApprovalStep
+
+APPROVER_KINDS = ('manager', 'role', 'users')
+
+# Compiled rule sets are reused for this long; writes through this process drop them at once
+RULES_TTL = int(os.getenv('APPROVAL_RULES_TTL', 60))
+
+# kind: manager | role | users; target: manager level, role name, or tuple of user ids
+CompiledStep = namedtuple('CompiledStep', 'kind target ratio min_approvals')
+CompiledRule = namedtuple('CompiledRule', 'id name priority min_amount max_amount categories steps')
+
+
+class RuleError(ValueError):
+    """Raised for a rule definition that cannot be compiled."""
+
+
+def _amount(conditions, key):
+    value = conditions.get(key)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise RuleError(f"{key} must be a number.")
+
+
+def _compile_steps(steps):
+    if not isinstance(steps, list) or not steps:
+        raise RuleError("A rule needs a non-empty list of steps.")
+
+    compiled = []
+    for step in steps:
+        if not isinstance(step, dict) or step.get('approver') not in APPROVER_KINDS:
+            raise RuleError(f"Each step needs an approver: one of {', '.join(APPROVER_KINDS)}.")
+
+        ratio = step.get('ratio')
+        if ratio is not None and not (isinstance(ratio, (int, float)) and 0 < ratio <= 1):
+            raise RuleError("ratio must be a number in (0, 1].")
+        min_approvals = step.get('min_approvals', 1)
+        if not isinstance(min_approvals, int) or min_approvals < 1:
+            raise RuleError("min_approvals must be a positive integer.")
+
+        kind = step['approver']
+        if kind == 'manager':
+            # levels=N: the submitter's manager, then theirs, ... one step per level
+            levels = step.get('levels', 1)
+            if not isinstance(levels, int) or levels < 1:
+                raise RuleError("levels must be a positive integer.")
+            compiled.extend(CompiledStep('manager', level, None, 1) for level in range(1, levels + 1))
+        elif kind == 'role':
+            if not step.get('role'):
+                raise RuleError("A role step needs a role.")
+            compiled.append(CompiledStep('role', step['role'], ratio, min_approvals))
+        else:
+            user_ids = step.get('user_ids')
+            if not isinstance(user_ids, list) or not user_ids or not all(isinstance(i, int) for i in user_ids):
+                raise RuleError("A users step needs a non-empty list of integer user_ids.")
+            compiled.append(CompiledStep('users', tuple(dict.fromkeys(user_ids)), ratio, min_approvals))
+    return tuple(compiled)
+
+
+def compile_rule(rule_id, name, priority, conditions, steps):
+    """
+    Validates and compiles one rule. Conditions (all optional): min_amount (inclusive)
+    and max_amount (exclusive) in the company's base currency, and categories.
+    Raises RuleError with a message fit for the API response.
+    """
+    conditions = conditions or {}
+    if not isinstance(conditions, dict):
+        raise RuleError("conditions must be an object.")
+    min_amount, max_amount = _amount(conditions, 'min_amount'), _amount(conditions, 'max_amount')
+    if min_amount is not None and max_amount is not None and min_amount >= max_amount:
+        raise RuleError("min_amount must be below max_amount.")
+
+    categories = conditions.get('categories')
+    if categories is not None and (not isinstance(categories, list) or not categories):
+        raise RuleError("categories must be a non-empty list.")
+
+    return CompiledRule(
+        id=rule_id,
+        name=name,
+        priority=priority,
+        min_amount=-math.inf if min_amount is None else min_amount,
+        max_amount=math.inf if max_amount is None else max_amount,
+        categories=frozenset(categories) if categories else None,
+        steps=_compile_steps(steps)
+    )
+
+
+class RuleSet:
+    """
+    A company's active rules, compiled. match() returns the first rule in priority
+    order whose conditions hold. Per category, the amount axis is cut at every rule
+    threshold and the winner of each interval is precomputed, so a match is one
+    dict lookup and one bisect however many rules the company has. Category tables
+    are built on first use.
+    """
+
+    def __init__(self, rules):
+        self.rules = sorted(rules, key=lambda rule: (rule.priority, rule.id))
+        self._categories = {category for rule in self.rules if rule.categories for category in rule.categories}
+        self._tables = {}
+
+    def _table(self, category):
+        applicable = [rule for rule in self.rules if rule.categories is None or category in rule.categories]
+        breaks = sorted({
+            bound for rule in applicable for bound in (rule.min_amount, rule.max_amount) if math.isfinite(bound)
+        })
+        # Interval i is [breaks[i - 1], breaks[i]); any amount inside it matches the same rules
+        winners = []
+        for point in [-math.inf] + breaks:
+            winners.append(next(
+                (rule for rule in applicable if rule.min_amount <= point < rule.max_amount), None
+            ))
+        table = (breaks, winners)
+        self._tables[category] = table
+        return table
+
+    def match(self, category, amount):
+        key = category if category in self._categories else None
+        breaks, winners = self._tables.get(key) or self._table(key)
+        return winners[bisect_right(breaks, amount)]
+
+    def __len__(self):
+        return len(self.rules)
+
+
+_rulesets = {}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def get_ruleset(company_id, session=None):
+    """The company's compiled RuleSet, from the cache while it is fresh."""
+    now = time.monotonic()
+    entry = _rulesets.get(company_id)
+    if entry is not None and entry[0] > now:
+        _stats['hits'] += 1
+        return entry[1]
+
+    session = session or db.session
+    rules = []
+    for row in session.execute(
+        select(ApprovalRule.id, ApprovalRule.name, ApprovalRule.priority, ApprovalRule.conditions, ApprovalRule.steps)
+        .where(ApprovalRule.company_id == company_id, ApprovalRule.active.is_(True))
+    ):
+        try:
+            rules.append(compile_rule(row.id, row.name, row.priority, row.conditions, row.steps))
+        except RuleError as e:
+            print(f"Skipping approval rule {row.id}: {e}")
+
+    ruleset = RuleSet(rules)
+    with _lock:
+        _stats['misses'] += 1
+        _rulesets[company_id] = (now + RULES_TTL, ruleset)
+    return ruleset
+
+
+def invalidate(company_id=None):
+    """Drops the compiled rules of one company (or all) after a rule change."""
+    with _lock:
+        if company_id is None:
+            _rulesets.clear()
+        else:
+            _rulesets.pop(company_id, None)
+
+
+def cache_stats():
+    return {'entries': len(_rulesets), **_stats}
+
+
+def _required(step, approver_count):
+    if step.ratio is not None:
+        return max(1, math.ceil(step.ratio * approver_count - 1e-9))
+    return min(step.min_approvals, approver_count)
+
+
+def start_workflows(expenses, session=None):
+    """
+    Routes newly submitted expenses (objects with id, user_id, company_id, category and
+    base_amount) through their company's rules and creates the ApprovalStep rows, in the
+    caller's transaction. Approvers are resolved in batched queries. Steps that resolve
+    to nobody (no manager, empty role) are left out; an expense whose steps all resolve
+    to nobody gets no workflow and keeps the direct approve/reject path.
+    Returns the number of expenses that got a workflow.
+    """
+    session = session or db.session
+
+    plans = []
+    for expense in expenses:
+        rule = get_ruleset(expense.company_id, session).match(expense.category, float(expense.base_amount))
+        if rule is not None:
+            plans.append((expense, rule))
+    if not plans:
+        return 0
+
+    # Managers above each submitter, up to the deepest level any matched rule asks for
+    levels = max((step.target for _, rule in plans for step in rule.steps if step.kind == 'manager'), default=0)
+    managers = defaultdict(dict)
+    if levels:
+        for row in session.execute(
+            select(UserHierarchy.descendant_id, UserHierarchy.depth, UserHierarchy.ancestor_id).where(
+                UserHierarchy.descendant_id.in_({expense.user_id for expense, _ in plans}),
+                UserHierarchy.depth.between(1, levels)
+            )
+        ):
+            managers[row.descendant_id][row.depth] = row.ancestor_id
+
+    # Members of every role any matched rule asks for, per company
+    roles = {(expense.company_id, step.target) for expense, rule in plans for step in rule.steps if step.kind == 'role'}
+    members = defaultdict(list)
+    if roles:
+        for row in session.execute(
+            select(User.id, User.company_id, User.role).where(
+                User.company_id.in_({company for company, _ in roles}),
+                User.role.in_({role for _, role in roles})
+            ).order_by(User.id)
+        ):
+            members[(row.company_id, row.role)].append(row.id)
+
+    rows, routed = [], 0
+    for expense, rule in plans:
+        sequence = 0
+        for step in rule.steps:
+            if step.kind == 'manager':
+                manager_id = managers[expense.user_id].get(step.target)
+                approvers = [manager_id] if manager_id is not None else []
+            elif step.kind == 'role':
+                approvers = members[(expense.company_id, step.target)]
+            else:
+                approvers = step.target
+            # Nobody approves their own expense
+            approvers = [approver for approver in approvers if approver != expense.user_id]
+            if not approvers:
+                continue
+
+            required = _required(step, len(approvers))
+            rows.extend({
+                'expense_id': expense.id,
+                'rule_id': rule.id,
+                'sequence': sequence,
+                'approver_id': approver,
+                'required': required,
+                'status': 'Pending' if sequence == 0 else 'Waiting',
+            } for approver in approvers)
+            sequence += 1
+        routed += sequence > 0
+
+    if rows:
+        session.execute(insert(ApprovalStep), rows)
+    return routed
+
+
+def lock_expenses(expense_ids, session=None):
+    """
+    Serializes decisions on these expenses until the caller's transaction ends: row-locks
+    them (SELECT ... FOR UPDATE, in id order) before their status and steps are read, so
+    two approvers of one step cannot both tally it without the other's decision. SQLite
+    has no row locks: a no-op UPDATE takes its database write lock up front instead (as
+    BEGIN IMMEDIATE would), so the later decision waits, then reads the earlier one.
+    """
+    session = session or db.session
+    ids = sorted(set(expense_ids))
+    if session.get_bind().dialect.name == 'sqlite':
+        session.execute(
+            update(Expense).where(Expense.id.in_(ids)).values(status=Expense.status),
+            execution_options={'synchronize_session': False}
+        )
+    else:
+        session.execute(select(Expense.id).where(Expense.id.in_(ids)).order_by(Expense.id).with_for_update())
+
+
+def load_steps(expense_ids, session=None):
+    """
+    {expense_id: [ApprovalStep, ...]} for the expenses that have a workflow, in one query.
+    Rows already in the session are re-read, so under lock_expenses() every committed
+    decision is seen.
+    """
+    session = session or db.session
+    steps = defaultdict(list)
+    for step in session.scalars(
+        select(ApprovalStep).where(ApprovalStep.expense_id.in_(set(expense_ids)))
+        .order_by(ApprovalStep.expense_id, ApprovalStep.sequence, ApprovalStep.id)
+        .execution_options(populate_existing=True)
+    ):
+        steps[step.expense_id].append(step)
+    return steps
+
+
+def decide(steps, approver_id, decision):
+    """
+    Records approver_id's decision ('Approved' or 'Rejected') on the current step of one
+    expense's workflow (its loaded ApprovalStep rows, updated in place). A step completes
+    once `required` approvers approve; it fails, rejecting the expense, once too many have
+    rejected for the quorum to be reachable. Load the steps with load_steps() under
+    lock_expenses(): the tally then counts every committed decision, so whichever approver
+    completes the step is the one who gets the final status.
+    Returns (outcome, final_status): outcome is 'recorded', 'not_approver' or 'closed';
+    final_status is 'Approved' or 'Rejected' when the workflow finished, else None.
+    """
+    pending = [step for step in steps if step.status == 'Pending']
+    if not pending:
+        return 'closed', None
+
+    sequence = min(step.sequence for step in pending)
+    current = [step for step in steps if step.sequence == sequence]
+    mine = next((step for step in current if step.approver_id == approver_id and step.status == 'Pending'), None)
+    if mine is None:
+        return 'not_approver', None
+
+    now = datetime.utcnow()
+    mine.status = decision
+    mine.decided_at = now
+
+    required = current[0].required
+    approvals = sum(step.status == 'Approved' for step in current)
+    rejections = sum(step.status == 'Rejected' for step in current)
+
+    if approvals >= required:
+        for step in current:
+            if step.status == 'Pending':
+                step.status = 'Skipped'
+        later = [step.sequence for step in steps if step.sequence > sequence]
+        if not later:
+            return 'recorded', 'Approved'
+        for step in steps:
+            if step.sequence == min(later):
+                step.status = 'Pending'
+        return 'recorded', None
+
+    if rejections > len(current) - required:
+        for step in steps:
+            if step.status in ('Pending', 'Waiting'):
+                step.status = 'Skipped'
+        return 'recorded', 'Rejected'
+
+    return 'recorded', None
+
+
+def progress(steps):
+    """Serializable view of a workflow: one entry per step with its approvers' decisions."""
+    by_sequence = defaultdict(list)
+    for step in steps:
+        by_sequence[step.sequence].append(step)
+
+    output = []
+    for sequence in sorted(by_sequence):
+        rows = by_sequence[sequence]
+        statuses = [row.status for row in rows]
+        if 'Pending' in statuses or 'Waiting' in statuses:
+            status = 'Pending' if 'Pending' in statuses else 'Waiting'
+        elif statuses.count('Approved') >= rows[0].required:
+            status = 'Approved'
+        else:
+            status = 'Rejected' if 'Rejected' in statuses else 'Skipped'
+        output.append({
+            'sequence': sequence,
+            'rule_id': rows[0].rule_id,
+            'status': status,
+            'required': rows[0].required,
+            'approvers': [{
+                'approver_id': row.approver_id,
+                'status': row.status,
+                'decided_at': row.decided_at.isoformat() if row.decided_at else None
+            } for row in rows]
+        })
+    return output
@@ -0,0 +1,179 @@
+# services/auth.py
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from sqlalchemy import select
+
+from extensions import db
+from models import User
+
+# Who is making the request, as far as authorization is concerned
+Principal = namedtuple('Principal', 'user_id role company_id manager_id')
+
+
+class AuthError(Exception):
+    """Raised for a bearer token that is malformed, forged, expired or out of date."""
+
+
+def load_principal(user_id, session=None):
+    """The current Principal of a user from the database, or None if the user is gone."""
+    session = session or db.session
+    row = session.execute(
+        select(User.id, User.role, User.company_id, User.manager_id).where(User.id == user_id)
+    ).first()
+    return Principal(*row) if row is not None else None
+
+
+class LoginThrottle:
+    """
+    Sliding-window limit on failed logins per key (client address and email). Once a
+    key has `max_failures` failures within `window` seconds, further attempts are
+    refused until the oldest failure ages out, without spending a password hash on
+    them. A successful login clears the key. At most `max_keys` keys are tracked.
+    """
+
+    def __init__(self, max_failures=5, window=300, max_keys=10000):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_keys = max_keys
+        self._failures = OrderedDict()  # key -> deque of failure times
+        self._lock = threading.Lock()
+
+    def retry_after(self, key):
+        """Seconds until `key` may try again, or 0 if it may try now."""
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.get(key)
+            if not failures:
+                return 0
+            while failures and now - failures[0] >= self.window:
+                failures.popleft()
+            if len(failures) < self.max_failures:
+                return 0
+            return max(1, int(failures[0] + self.window - now + 1))
+
+    def failure(self, key):
+        with self._lock:
+            failures = self._failures.get(key)
+            if failures is None:
+                failures = self._failures[key] = deque(maxlen=self.max_failures)
+            failures.append(time.monotonic())
+            self._failures.move_to_end(key)
+            while len(self._failures) > self.max_keys:
+                self._failures.popitem(last=False)
+
+    def success(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+
+class Authenticator:
+    """
+    Signed, stateless access tokens plus a process-local cache of the principals
+    they name.
+
+    A token carries the user id, role and company and is signed with the app's
+    secret key; verifying it is an HMAC check, not a database query. The principal
+    behind it is served from an LRU cache (refreshed after `principal_ttl` seconds)
+    so that a role or manager change takes effect without waiting for the token
+    to expire: the route making the change calls invalidate(), and a token whose
+    role or company no longer matches is refused, prompting a new login.
+    Clients send the same token on every request, so verified tokens are also
+    remembered (up to `max_tokens`) and their signature is checked only once.
+    """
+
+    def __init__(self, secret_key, token_ttl=43200, principal_ttl=300, max_principals=4096, max_tokens=8192,
+                 loader=load_principal):
+        self._serializer = URLSafeTimedSerializer(secret_key, salt='pravaha-access-token')
+        self.token_ttl = token_ttl
+        self.principal_ttl = principal_ttl
+        self.max_principals = max_principals
+        self.max_tokens = max_tokens
+        self.loader = loader
+        self.throttle = LoginThrottle()
+        self._principals = OrderedDict()  # user_id -> (loaded_at, Principal)
+        self._tokens = {}  # token -> (expires_at wall clock, claims), oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def issue(self, user):
+        """A new access token for `user` (a User row); also primes the principal cache."""
+        principal = Principal(user.id, user.role, user.company_id, user.manager_id)
+        self._remember(principal)
+        return self._serializer.dumps({'uid': user.id, 'role': user.role, 'cid': user.company_id})
+
+    def authenticate(self, authorization):
+        """
+        The Principal for an `Authorization: Bearer <token>` header value, or None
+        when there is no bearer token. Raises AuthError for a token that must be refused.
+        """
+        if not authorization:
+            return None
+        scheme, _, token = authorization.partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return None
+
+        claims = self._verify(token.strip())
+        principal = self.get_principal(claims['uid'])
+        if principal is None:
+            raise AuthError("Invalid access token.")
+        if principal.role != claims['role'] or principal.company_id != claims['cid']:
+            raise AuthError("Your account has changed. Please log in again.")
+        return principal
+
+    def _verify(self, token):
+        entry = self._tokens.get(token)
+        if entry is None:
+            try:
+                claims, issued_at = self._serializer.loads(token, max_age=self.token_ttl, return_timestamp=True)
+            except SignatureExpired:
+                raise AuthError("Session expired. Please log in again.")
+            except BadSignature:
+                raise AuthError("Invalid access token.")
+            entry = (issued_at.timestamp() + self.token_ttl, claims)
+            with self._lock:
+                self._tokens[token] = entry
+                while len(self._tokens) > self.max_tokens:
+                    del self._tokens[next(iter(self._tokens))]
+        elif time.time() > entry[0]:
+            with self._lock:
+                self._tokens.pop(token, None)
+            raise AuthError("Session expired. Please log in again.")
+        return entry[1]
+
+    def get_principal(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._principals.get(user_id)
+            if entry is not None and now - entry[0] < self.principal_ttl:
+                self._principals.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        principal = self.loader(user_id)
+        if principal is not None:
+            self._remember(principal)
+        return principal
+
+    def _remember(self, principal):
+        with self._lock:
+            self._principals[principal.user_id] = (time.monotonic(), principal)
+            self._principals.move_to_end(principal.user_id)
+            while len(self._principals) > self.max_principals:
+                self._principals.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        """Drops the cached principal of one user (or all) after their role or manager changes."""
+        with self._lock:
+            if user_id is None:
+                self._principals.clear()
+            else:
+                self._principals.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._principals)}
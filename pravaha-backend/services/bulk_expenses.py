@@ -0,0 +1,335 @@
+# services/bulk_expenses.py
+import csv
+import io
+import math
+import os
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import insert, select, update
+
+from extensions import db
+from models import Company, User, Expense
+from services import approval_engine, duplicates, expense_summary
+from services.exchange_service import get_rate
+
+# Upper bound on rows accepted by one bulk request
+BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', 10000))
+
+# Upper bound on expense ids in one bulk approval
+BULK_MAX_DECISIONS = int(os.getenv('BULK_MAX_DECISIONS', 1000))
+
+CSV_FIELDS = ('amount', 'currency', 'category', 'description', 'date', 'user_id')
+
+# Largest value the Numeric(10, 2) amount columns hold
+MAX_AMOUNT = 99999999.99
+
+
+def parse_amount(value):
+    """A submitted amount as a float rounded to cents; ValueError unless it is finite, positive and storable."""
+    try:
+        amount = round(float(value), 2)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid amount.")
+    if not math.isfinite(amount):
+        raise ValueError("Invalid amount.")
+    if amount <= 0:
+        raise ValueError("Amount must be positive.")
+    if amount > MAX_AMOUNT:
+        raise ValueError(f"Amount must not exceed {MAX_AMOUNT:,.2f}.")
+    return amount
+
+
+def parse_currency(value):
+    """A submitted currency code, stripped and upper-cased; ValueError unless it is three letters."""
+    if not isinstance(value, str):
+        raise ValueError("Invalid currency code.")
+    currency = value.strip().upper()
+    if len(currency) != 3 or not (currency.isascii() and currency.isalpha()):
+        raise ValueError("Invalid currency code.")
+    return currency
+
+
+def parse_csv(stream):
+    """Reads an uploaded CSV (header row with CSV_FIELDS) into a list of row dicts."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    return [
+        {key.strip().lower(): (value.strip() if isinstance(value, str) else value) for key, value in row.items() if key}
+        for row in csv.DictReader(text)
+    ]
+
+
+def _validate(row, default_user_id):
+    """Returns (clean row, None) or (None, error message)."""
+    if not isinstance(row, dict):
+        return None, "Row must be an object."
+
+    user_id = row.get('user_id') or default_user_id
+    amount = row.get('amount')
+    currency = row.get('currency')
+    category = row.get('category')
+    date_str = row.get('date')
+
+    if not all([user_id, amount, currency, category, date_str]):
+        return None, "Missing required expense fields."
+
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None, "Invalid user_id."
+    try:
+        amount = parse_amount(amount)
+    except ValueError as e:
+        return None, str(e)
+    try:
+        currency = parse_currency(currency)
+    except ValueError as e:
+        return None, str(e)
+
+    try:
+        expense_date = datetime.strptime(str(date_str), '%Y-%m-%d').date()
+    except ValueError:
+        return None, "Invalid date. Expected YYYY-MM-DD."
+
+    return {
+        'user_id': user_id,
+        'amount': amount,
+        'currency': currency,
+        'category': category,
+        'description': row.get('description'),
+        'date': expense_date,
+        'fingerprint': duplicates.fingerprint(amount, currency),
+        'receipt_hash': duplicates.normalize_receipt_hash(row.get('receipt_hash')),
+        'merchant': duplicates.normalize_merchant(row.get('merchant')),
+    }, None
+
+
+def submit_bulk(rows, default_user_id=None, company_id=None, on_behalf=True, allow_duplicates=False):
+    """
+    Validates every row, converts each distinct (currency, base currency, date) once,
+    and inserts all valid rows with one executemany in the caller's transaction.
+    With company_id set, rows for users of other companies fail as not found; with
+    on_behalf False, rows may only be for default_user_id. Unless allow_duplicates,
+    rows duplicating an existing expense or an earlier row fail (one query for all).
+    Returns per-row results in input order; the caller commits.
+    """
+    results = [None] * len(rows)
+    valid = []
+
+    # 1. Validate all rows up front
+    for index, row in enumerate(rows):
+        clean, error = _validate(row, default_user_id)
+        if not error and not on_behalf and clean['user_id'] != default_user_id:
+            error = "You can only submit your own expenses."
+        if error:
+            results[index] = {'row': index, 'status': 'error', 'message': error}
+        else:
+            valid.append((index, clean))
+
+    # 2. Resolve every submitter's company and base currency in one query
+    user_ids = {clean['user_id'] for _, clean in valid}
+    users = {
+        row.id: row
+        for row in db.session.execute(
+            select(User.id, User.company_id, Company.currency_code).join(
+                Company, User.company_id == Company.id
+            ).where(User.id.in_(user_ids), *([User.company_id == company_id] if company_id is not None else []))
+        )
+    } if user_ids else {}
+
+    # 3. One rate lookup per distinct currency pair and day
+    rates = {}
+    inserts, positions = [], []
+    for index, clean in valid:
+        user = users.get(clean['user_id'])
+        if user is None:
+            results[index] = {'row': index, 'status': 'error', 'message': "User not found."}
+            continue
+
+        pair = (clean['currency'], user.currency_code, clean['date'])
+        if pair not in rates:
+            rates[pair] = get_rate(*pair)
+        rate = rates[pair]
+        if rate is None:
+            results[index] = {'row': index, 'status': 'error', 'message': "Could not calculate base currency amount."}
+            continue
+
+        base_amount = round(clean['amount'] * rate, 2)
+        if base_amount > MAX_AMOUNT:
+            results[index] = {'row': index, 'status': 'error', 'message': "Amount is too large in the base currency."}
+            continue
+
+        inserts.append(dict(clean, base_amount=base_amount, company_id=user.company_id, status='Pending'))
+        positions.append(index)
+
+    # 4. Duplicate check for the whole batch in one query
+    if inserts and not allow_duplicates:
+        matches = duplicates.check_batch([duplicates.entry_for(values) for values in inserts])
+        kept = []
+        for index, values, found in zip(positions, inserts, matches):
+            if not found:
+                kept.append((index, values))
+                continue
+            # Earlier rows of this batch are reported by their input position
+            found = [match if 'id' in match else dict(match, row=positions[match['row']]) for match in found]
+            first = found[0]
+            original = f"expense #{first['id']}" if 'id' in first else f"row {first['row']}"
+            results[index] = {
+                'row': index, 'status': 'error', 'message': f"Possible duplicate of {original}.", 'duplicates': found
+            }
+        positions, inserts = [index for index, _ in kept], [values for _, values in kept]
+
+    if not inserts:
+        return results, 0
+
+    # 5. Single executemany insert, ids returned in parameter order
+    expense_ids = db.session.scalars(
+        insert(Expense).returning(Expense.id, sort_by_parameter_order=True), inserts
+    ).all()
+
+    # 6. Analytics rollup: one upsert per touched summary key
+    deltas = defaultdict(lambda: [0, 0.0])
+    for values in inserts:
+        delta = deltas[expense_summary.summary_key(
+            values['company_id'], values['user_id'], values['date'], values['category'], values['status']
+        )]
+        delta[0] += 1
+        delta[1] += values['base_amount']
+    expense_summary.apply_deltas({key: tuple(delta) for key, delta in deltas.items()})
+
+    # 7. Approval workflows for companies with rules, created in one batch
+    approval_engine.start_workflows([
+        SimpleNamespace(id=expense_id, **values) for expense_id, values in zip(expense_ids, inserts)
+    ])
+
+    for index, expense_id, values in zip(positions, expense_ids, inserts):
+        results[index] = {
+            'row': index,
+            'status': 'created',
+            'expense_id': expense_id,
+            'user_id': values['user_id'],
+            'base_amount': values['base_amount']
+        }
+    return results, len(inserts)
+
+
+def update_status_bulk(expense_ids, new_status, manager_id=None, company_id=None, direct=True):
+    """
+    Applies one decision to many expenses: a single query loads every target with its
+    permission facts, then one UPDATE ... WHERE id IN (...) changes the eligible rows.
+    Expenses under an approval workflow record the decision on their current step
+    instead, and only change status when that finishes the workflow.
+    company_id is the requester's company; without it, it is looked up from manager_id.
+    direct=False (an approver who is not a Manager or Admin) limits the requester to
+    workflow steps: expenses without a workflow are forbidden.
+    The targets are locked first (approval_engine.lock_expenses), and each UPDATE only
+    changes rows still in the status that was read; a row changed concurrently anyway
+    is reported as 'conflict' and left out of the rollup.
+    Returns (per-id outcomes in input order, updated count); the caller commits.
+    """
+    approval_engine.lock_expenses(expense_ids)
+    requester_company = company_id if company_id is not None else (
+        select(User.company_id).where(User.id == manager_id).scalar_subquery()
+    )
+    rows = {
+        row.id: row
+        for row in db.session.execute(
+            select(
+                Expense.id, Expense.user_id, Expense.company_id, Expense.status, Expense.date,
+                Expense.category, Expense.base_amount,
+                (Expense.company_id == requester_company).label('same_company')
+            ).where(Expense.id.in_(set(expense_ids)))
+        )
+    }
+
+    results, eligible, seen = [], [], set()
+    for expense_id in expense_ids:
+        row = rows.get(expense_id)
+        if expense_id in seen:
+            results.append({'id': expense_id, 'status': 'skipped', 'message': "Duplicate expense ID."})
+            continue
+        seen.add(expense_id)
+
+        if row is None:
+            results.append({'id': expense_id, 'status': 'not_found', 'message': "Expense not found."})
+        elif manager_id is not None and row.user_id == manager_id:
+            results.append({'id': expense_id, 'status': 'forbidden', 'message': "Managers cannot approve or reject their own expenses."})
+        elif manager_id is not None and not row.same_company:
+            results.append({'id': expense_id, 'status': 'forbidden', 'message': "Expense belongs to another company."})
+        elif row.status == new_status:
+            results.append({'id': expense_id, 'status': 'unchanged', 'new_status': new_status})
+        else:
+            results.append({'id': expense_id, 'status': 'updated', 'new_status': new_status})
+            eligible.append(row)
+
+    # Workflow expenses: decide on the loaded steps (one query), flip only the finished ones
+    workflows = approval_engine.load_steps([row.id for row in eligible]) if eligible else {}
+    if not direct:
+        for result in results:
+            if result['status'] == 'updated' and result['id'] not in workflows:
+                result.update(status='forbidden', message="Permission denied. Manager or Admin access required.")
+                result.pop('new_status')
+        eligible = [row for row in eligible if row.id in workflows]
+    if workflows:
+        outcomes = {}
+        for row in eligible:
+            if row.id in workflows:
+                outcomes[row.id] = approval_engine.decide(workflows[row.id], manager_id, new_status)
+
+        finished = []
+        for result in results:
+            outcome = outcomes.get(result['id'])
+            if outcome is None or result['status'] != 'updated':
+                continue
+            if outcome[0] == 'not_approver':
+                result.update(status='forbidden', message="Not an approver for the current step of this expense.")
+                result.pop('new_status')
+            elif outcome[0] == 'closed':
+                result.update(status='forbidden', message="Approval workflow for this expense is already complete.")
+                result.pop('new_status')
+            elif outcome[1] is None:
+                result.update(status='recorded', new_status=rows[result['id']].status)
+            else:
+                finished.append(result['id'])
+        eligible = [row for row in eligible if row.id not in outcomes or row.id in finished]
+
+    if not eligible:
+        return results, 0
+
+    # Guarded by the status each row was read with; only rows actually changed count
+    by_status = defaultdict(list)
+    for row in eligible:
+        by_status[row.status].append(row.id)
+    changed = set()
+    for old_status, ids in by_status.items():
+        changed.update(db.session.scalars(
+            update(Expense).where(Expense.id.in_(ids), Expense.status == old_status)
+            .values(status=new_status).returning(Expense.id),
+            execution_options={'synchronize_session': False}
+        ))
+
+    # Whose expenses changed, so the caller can refresh what depends on them
+    for result in results:
+        if result['status'] != 'updated':
+            continue
+        if result['id'] in changed:
+            result['user_id'] = rows[result['id']].user_id
+        else:
+            result.update(status='conflict', message="Expense status changed concurrently. Reload and try again.")
+            result.pop('new_status')
+
+    deltas = defaultdict(lambda: [0, 0.0])
+    for row in eligible:
+        if row.id not in changed:
+            continue
+        amount = float(row.base_amount)
+        old = deltas[expense_summary.summary_key(row.company_id, row.user_id, row.date, row.category, row.status)]
+        old[0] -= 1
+        old[1] -= amount
+        new = deltas[expense_summary.summary_key(row.company_id, row.user_id, row.date, row.category, new_status)]
+        new[0] += 1
+        new[1] += amount
+    expense_summary.apply_deltas({key: tuple(delta) for key, delta in deltas.items()})
+
+    return results, len(changed)
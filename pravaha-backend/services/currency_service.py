@@ -1,24 +1,80 @@
 # services/currency_service.py
-import requests
+import json
+import os
+import threading
 
-REST_COUNTRIES_URL = 'https://restcountries.com/v3.1/all?fields=name,currencies'
+from services import http_client
 
-def get_currency_for_country(country_name='India'):
-    try:
-        response = requests.get(REST_COUNTRIES_URL, timeout=5)
-        response.raise_for_status()
-        countries = response.json()
+REST_COUNTRIES_URL = 'https://restcountries.com/v3.1/all?fields=name,currencies,cca2,cca3,altSpellings'
+
+# Bundled restcountries snapshot, so lookups never need the network
+COUNTRIES_SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), 'data', 'countries.json')
+
+_index = None
+_index_lock = threading.Lock()
+
+def build_country_index(countries):
+    """
+    Builds {case-folded name or code: currency code} from restcountries records.
+    Common names, official names, alt spellings and ISO alpha-2/alpha-3 codes all map to
+    the country's first listed currency.
+    """
+    primary, secondary = [], []
+    for country in countries:
+        currencies = country.get('currencies') or {}
+        if not currencies:
+            continue
+        currency_code = next(iter(currencies))
 
-        target_country = next((
-            c for c in countries if c.get('name', {}).get('common', '').lower() == country_name.lower()
-        ), None)
+        name = country.get('name', {})
+        primary.extend((alias, currency_code) for alias in (name.get('common'), country.get('cca2'), country.get('cca3')))
+        secondary.extend((alias, currency_code) for alias in [name.get('official')] + (country.get('altSpellings') or []))
 
-        if target_country and target_country.get('currencies'):
-            currency_code = list(target_country['currencies'].keys())[0]
-            return currency_code
+    # Common names and codes win over another country's official name or alias
+    index = {}
+    for alias, currency_code in primary + secondary:
+        if alias:
+            index.setdefault(alias.strip().casefold(), currency_code)
+    return index
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching country currency: {e}")
+def _load_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                with open(COUNTRIES_SNAPSHOT_PATH, encoding='utf-8') as f:
+                    _index = build_country_index(json.load(f))
+    return _index
 
-    # Fallback currency
-    return 'USD'
\ No newline at end of file
+def refresh_country_index(save=False):
+    """
+    Optionally rebuilds the index from the live restcountries API, and with `save`
+    rewrites the bundled snapshot. Keeps the current index on failure.
+    Returns True if the index was replaced.
+    """
+    global _index
+    try:
+        countries = http_client.get_client().get_json(REST_COUNTRIES_URL, endpoint='restcountries', timeout=15)
+        index = build_country_index(countries)
+    except (http_client.HttpError, AttributeError, TypeError) as e:
+        print(f"Error refreshing country currency index: {e}")
+        return False
+
+    if not index:
+        return False
+    with _index_lock:
+        _index = index
+    if save:
+        with open(COUNTRIES_SNAPSHOT_PATH, 'w', encoding='utf-8') as f:
+            json.dump(countries, f, ensure_ascii=False)
+    return True
+
+def known_currency_codes():
+    """Every ISO currency code used by some country in the index."""
+    return frozenset(_load_index().values())
+
+def get_currency_for_country(country_name='India'):
+    """The country's currency code (name, official name, alias or ISO code), or None if unknown."""
+    if not isinstance(country_name, str):
+        return None
+    return _load_index().get(country_name.strip().casefold())
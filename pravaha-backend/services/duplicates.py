@@ -0,0 +1,217 @@
+# services/duplicates.py
+import os
+import re
+from collections import defaultdict, namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import timedelta
+
+from sqlalchemy import Integer, String, and_, cast, func, or_, select, update
+
+from extensions import db
+from models import Expense
+from services.receipt_parser import merchant_tokens
+
+# Same user, amount and currency up to this many days apart counts as a near duplicate
+WINDOW_DAYS = int(os.getenv('DUPLICATE_WINDOW_DAYS', 3))
+
+# Rejected expenses are typically corrected and resubmitted; they never flag a new one
+IGNORED_STATUSES = ('Rejected',)
+
+_RECEIPT_HASH = re.compile(r'^[0-9a-f]{64}$')
+
+# What a submission is checked as; id is None for one not inserted yet
+Entry = namedtuple('Entry', 'id user_id company_id fingerprint date receipt_hash merchant')
+
+_COLUMNS = (
+    Expense.id, Expense.user_id, Expense.company_id, Expense.fingerprint, Expense.date,
+    Expense.receipt_hash, Expense.merchant, Expense.amount, Expense.currency, Expense.status
+)
+
+
+def fingerprint(amount, currency):
+    """Normalized currency and amount in minor units: 12.5 USD -> 'USD:1250'."""
+    cents = (Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+    return f"{currency.strip().upper()}:{int(cents)}"
+
+
+def normalize_merchant(value):
+    """Client-supplied merchant text in the same form as OCR'd merchant names, or None."""
+    return (merchant_tokens(value, max_lines=1) or None) if value else None
+
+
+def normalize_receipt_hash(value):
+    """A lower-case SHA-256 hex digest, or None for anything else."""
+    value = (value or '').strip().lower()
+    return value if _RECEIPT_HASH.match(value) else None
+
+
+def entry_for(values, expense_id=None):
+    """Entry for a dict of expense column values (user_id, company_id, amount, currency, date, ...)."""
+    return Entry(
+        expense_id, values['user_id'], values['company_id'],
+        values.get('fingerprint') or fingerprint(values['amount'], values['currency']),
+        values['date'], values.get('receipt_hash'), values.get('merchant')
+    )
+
+
+def _same_merchant(a, b):
+    # Unknown on either side cannot rule a match out; two known names must share a word
+    return not a or not b or bool(set(a.split()) & set(b.split()))
+
+
+class _Matcher:
+    """Groups known expenses by (user, fingerprint) and (company, receipt hash) for pairwise checks."""
+
+    def __init__(self, window_days):
+        self.window = timedelta(days=window_days)
+        self._by_amount = defaultdict(list)
+        self._by_receipt = defaultdict(list)
+
+    def add(self, row):
+        self._by_amount[(row.user_id, row.fingerprint)].append(row)
+        if row.receipt_hash:
+            self._by_receipt[(row.company_id, row.receipt_hash)].append(row)
+
+    def matches(self, entry, earlier_only=False):
+        """[(row, reason)] for `entry`; reason is 'same_receipt', 'exact' or 'near'."""
+        found = {}
+        if entry.receipt_hash:
+            for row in self._by_receipt.get((entry.company_id, entry.receipt_hash), ()):
+                found[row.id] = (row, 'same_receipt')
+        for row in self._by_amount.get((entry.user_id, entry.fingerprint), ()):
+            if row.id in found or abs(row.date - entry.date) > self.window:
+                continue
+            if _same_merchant(row.merchant, entry.merchant):
+                found[row.id] = (row, 'exact' if row.date == entry.date else 'near')
+        if entry.id is not None:
+            found.pop(entry.id, None)
+            if earlier_only:
+                found = {row_id: match for row_id, match in found.items() if row_id < entry.id}
+        return [found[row_id] for row_id in sorted(found)]
+
+
+def _candidates(entries, window_days, session, extra=()):
+    """
+    Stored expenses that could match any of `entries`, in one query. Each branch is
+    an index range: (user_id, fingerprint, date) and (company_id, receipt_hash).
+    """
+    window = timedelta(days=window_days)
+    branches = [and_(
+        Expense.user_id.in_({entry.user_id for entry in entries}),
+        Expense.fingerprint.in_({entry.fingerprint for entry in entries}),
+        Expense.date.between(
+            min(entry.date for entry in entries) - window, max(entry.date for entry in entries) + window
+        ),
+    )]
+    receipts = {entry.receipt_hash for entry in entries if entry.receipt_hash}
+    if receipts:
+        branches.append(and_(
+            Expense.company_id.in_({entry.company_id for entry in entries}),
+            Expense.receipt_hash.in_(receipts),
+        ))
+    return session.execute(
+        select(*_COLUMNS).where(or_(*branches), Expense.status.notin_(IGNORED_STATUSES), *extra)
+    ).all()
+
+
+def describe(row, reason):
+    return {
+        'id': row.id,
+        'reason': reason,
+        'user_id': row.user_id,
+        'amount': float(row.amount),
+        'currency': row.currency,
+        'date': row.date.strftime('%Y-%m-%d'),
+        'status': row.status,
+    }
+
+
+def find_duplicates(entry, window_days=WINDOW_DAYS, session=None):
+    """
+    Earlier expenses that `entry` (a submission) duplicates: the same receipt image
+    anywhere in the company, or the same user, amount and currency within
+    `window_days` at a compatible merchant. One indexed lookup, however long the
+    user's history. Returns describe() dicts, oldest first.
+    """
+    session = session or db.session
+    matcher = _Matcher(window_days)
+    for row in _candidates([entry], window_days, session):
+        matcher.add(row)
+    return [describe(row, reason) for row, reason in matcher.matches(entry)]
+
+
+def check_batch(entries, window_days=WINDOW_DAYS, session=None):
+    """
+    find_duplicates for many submissions with one query. Earlier entries of the
+    batch count too, so a row repeated within one upload is caught; those matches
+    are {'row': position, 'reason'}. Returns one list per entry, in order.
+    """
+    session = session or db.session
+    if not entries:
+        return []
+    matcher = _Matcher(window_days)
+    for row in _candidates(entries, window_days, session):
+        matcher.add(row)
+
+    results = []
+    for position, entry in enumerate(entries):
+        results.append([
+            describe(row, reason) if row.id > 0 else {'row': -row.id - 1, 'reason': reason}
+            for row, reason in matcher.matches(entry)
+        ])
+        # Stands in for the row until it is inserted, under a negative id
+        matcher.add(entry._replace(id=-(position + 1)))
+    return results
+
+
+def scan(company_id=None, batch_size=1000, window_days=WINDOW_DAYS, session=None):
+    """
+    Walks the existing expenses in id order, `batch_size` at a time, and yields one
+    dict per expense that duplicates an earlier one: its own describe() fields plus
+    'duplicate_of' (the earlier expense's describe()). One candidate query per batch.
+    """
+    session = session or db.session
+    scope = [Expense.company_id == company_id] if company_id is not None else []
+    last_id = 0
+    while True:
+        batch = session.execute(
+            select(*_COLUMNS).where(
+                Expense.id > last_id, Expense.fingerprint.isnot(None),
+                Expense.status.notin_(IGNORED_STATUSES), *scope
+            ).order_by(Expense.id).limit(batch_size)
+        ).all()
+        if not batch:
+            return
+        last_id = batch[-1].id
+
+        matcher = _Matcher(window_days)
+        for row in _candidates(batch, window_days, session, extra=[Expense.id < last_id, *scope]):
+            matcher.add(row)
+        for row in batch:
+            for earlier, reason in matcher.matches(row, earlier_only=True):
+                yield dict(describe(row, reason), duplicate_of=describe(earlier, reason))
+
+
+def fingerprint_expression():
+    """fingerprint() in SQL, for backfilling existing rows."""
+    cents = cast(cast(func.round(Expense.amount * 100), Integer), String)
+    return func.upper(Expense.currency) + ':' + cents
+
+
+def backfill(batch_size=50000, session=None):
+    """Fills in missing fingerprints, one id range per UPDATE. Returns the number of rows updated."""
+    session = session or db.session
+    low, high = session.execute(
+        select(func.min(Expense.id), func.max(Expense.id)).where(Expense.fingerprint.is_(None))
+    ).one()
+    if low is None:
+        return 0
+    updated = 0
+    for start in range(low, high + 1, batch_size):
+        result = session.execute(
+            update(Expense).where(
+                Expense.id.between(start, start + batch_size - 1), Expense.fingerprint.is_(None)
+            ).values(fingerprint=fingerprint_expression())
+        )
+        updated += result.rowcount
+    return updated
@@ -1,37 +1,55 @@
 # services/exchange_service.py
-import requests
+import os
 
-# Using ExchangeRate-API for conversion
-EXCHANGE_API_URL = "https://api.exchangerate-api.com/v4/latest/{BASE_CURRENCY}"
+from services import metrics, rate_store
+from services.rate_cache import RateCache, HttpRateSource
 
-def convert_currency(base_currency, target_currency, amount):
+# One cached rate table per base currency, shared by every request in this process.
+# EXCHANGE_RATE_PIVOT (e.g. USD) makes a single download cover every currency pair.
+rate_cache = RateCache(
+    source=HttpRateSource(),
+    ttl=int(os.getenv('EXCHANGE_RATE_TTL', 3600)),
+    max_entries=int(os.getenv('EXCHANGE_RATE_MAX_ENTRIES', 32)),
+    pivot=os.getenv('EXCHANGE_RATE_PIVOT') or None
+)
+
+def set_rate_source(source):
+    """Swaps the backing rate source (e.g. StaticRateSource in tests) and drops cached tables."""
+    rate_cache.source = source
+    rate_cache.clear()
+
+def get_rate_cache_stats():
+    return rate_cache.stats()
+
+def get_rate(base_currency, target_currency, as_of=None):
     """
-    Fetches the exchange rate and converts the amount.
+    Returns target units per 1 base unit (e.g., 1 USD = 83 INR), or None on failure.
+    With `as_of` (a date), the rate comes from the local snapshot store for that day,
+    falling back to the live table only when no snapshot covers it.
+    """
+    if base_currency == target_currency:
+        return 1.0
+
+    rate = None
+    if as_of is not None:
+        rate = rate_store.get_rate(base_currency, target_currency, as_of)
+    if rate is None:
+        rate = rate_cache.get_rate(base_currency, target_currency)
+    return rate
+
+@metrics.timed('convert_currency')
+def convert_currency(base_currency, target_currency, amount, as_of=None):
+    """
+    Converts the amount using the cached exchange rate table (see get_rate).
     Returns the converted amount (float) or None on failure.
     NOTE: This API uses the request currency (base_currency) as the numerator.
     """
     if base_currency == target_currency:
         return float(amount)
 
-    url = EXCHANGE_API_URL.format(BASE_CURRENCY=base_currency)
-    
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        
-        rates = data.get('rates', {})
-        if target_currency in rates:
-            # Rate is X target units per 1 base unit (e.g., 1 USD = 83 INR)
-            rate = rates[target_currency]
-            
-            # Converted Amount = Submitted Amount * Rate
-            converted_amount = float(amount) * rate 
-            
-            return round(converted_amount, 2)
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching exchange rate: {e}")
-
-    # Fallback/Error return
-    return None
\ No newline at end of file
+    rate = get_rate(base_currency, target_currency, as_of)
+    if rate is None:
+        return None
+
+    # Converted Amount = Submitted Amount * Rate
+    return round(float(amount) * rate, 2)
@@ -0,0 +1,72 @@
+# services/expense_export.py
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from extensions import db
+from models import Company, User, Expense
+from services.expense_queries import apply_expense_filters
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    'id', 'date', 'amount', 'currency', 'base_amount', 'base_currency',
+    'category', 'description', 'status', 'user_id', 'user_name'
+]
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_statement(company_id, filters):
+    """Company expenses joined with submitter name and base currency, oldest first."""
+    statement = select(
+        Expense.id, Expense.date, Expense.amount, Expense.currency, Expense.base_amount,
+        Company.currency_code.label('base_currency'), Expense.category, Expense.description,
+        Expense.status, Expense.user_id, User.full_name.label('user_name')
+    ).join(
+        User, Expense.user_id == User.id
+    ).join(
+        Company, Expense.company_id == Company.id
+    ).where(
+        Expense.company_id == company_id
+    )
+    return apply_expense_filters(statement, filters).order_by(Expense.date, Expense.id)
+
+
+def _records(company_id, filters, batch_size):
+    # yield_per streams through a server-side cursor in fixed-size batches
+    result = db.session.execute(
+        export_statement(company_id, filters).execution_options(yield_per=batch_size)
+    )
+    for batch in result.partitions():
+        yield [
+            (row.id, row.date.strftime('%Y-%m-%d'), float(row.amount), row.currency,
+             float(row.base_amount), row.base_currency, row.category, row.description,
+             row.status, row.user_id, row.user_name)
+            for row in batch
+        ]
+
+
+def iter_export(company_id, filters, export_format='ndjson', batch_size=EXPORT_BATCH_SIZE):
+    """Yields the export body in chunks of one batch each, so memory stays constant."""
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()
+
+        for batch in _records(company_id, filters, batch_size):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(batch)
+            yield buffer.getvalue()
+        return
+
+    for batch in _records(company_id, filters, batch_size):
+        yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, record))) + '\n' for record in batch)
@@ -0,0 +1,116 @@
+# services/expense_queries.py
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import Expense
+
+# Hard cap on rows per page, whatever `limit` the client asks for
+MAX_PAGE_SIZE = 500
+
+EXPENSE_STATUSES = ('Pending', 'Approved', 'Rejected')
+
+
+def _parse_date(value, field):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"Invalid {field}. Expected YYYY-MM-DD.")
+
+
+def encode_cursor(expense_date, expense_id):
+    """Opaque keyset cursor pointing just past (date, id)."""
+    raw = f"{expense_date.strftime('%Y-%m-%d')}:{expense_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date_str, expense_id = raw.split(':')
+        return _parse_date(date_str, 'cursor'), int(expense_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+
+
+def parse_expense_filters(args):
+    """
+    Reads the listing filters shared by the expense endpoints from query args:
+    status, category, start_date, end_date (inclusive, YYYY-MM-DD).
+    Raises ValueError with a client-facing message on bad input.
+    """
+    filters = {}
+
+    status = args.get('status')
+    if status:
+        if status not in EXPENSE_STATUSES:
+            raise ValueError(f"Invalid status. Must be one of {', '.join(EXPENSE_STATUSES)}.")
+        filters['status'] = status
+
+    category = args.get('category')
+    if category:
+        filters['category'] = category
+
+    if args.get('start_date'):
+        filters['start_date'] = _parse_date(args['start_date'], 'start_date')
+    if args.get('end_date'):
+        filters['end_date'] = _parse_date(args['end_date'], 'end_date')
+
+    return filters
+
+
+def apply_expense_filters(query, filters):
+    if 'status' in filters:
+        query = query.filter(Expense.status == filters['status'])
+    if 'category' in filters:
+        query = query.filter(Expense.category == filters['category'])
+    if 'start_date' in filters:
+        query = query.filter(Expense.date >= filters['start_date'])
+    if 'end_date' in filters:
+        query = query.filter(Expense.date <= filters['end_date'])
+    return query
+
+
+def parse_page_args(args):
+    """
+    Returns (limit, cursor) from query args. Pagination is opt-in: without `limit`
+    or `cursor` the limit is None and the caller gets the full (filtered) list.
+    """
+    limit = args.get('limit')
+    cursor = args.get('cursor')
+    if limit is None and cursor is None:
+        return None, None
+
+    try:
+        limit = int(limit) if limit is not None else MAX_PAGE_SIZE
+    except ValueError:
+        raise ValueError("Invalid limit.")
+    if limit < 1:
+        raise ValueError("Invalid limit.")
+
+    return min(limit, MAX_PAGE_SIZE), (decode_cursor(cursor) if cursor else None)
+
+
+def paginate(query, limit=None, cursor=None):
+    """
+    Orders newest first on (date, id) and applies the keyset window.
+    The query must select Expense.date and Expense.id as `date` and `id`.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query = query.order_by(Expense.date.desc(), Expense.id.desc())
+
+    if cursor is not None:
+        query = query.filter(tuple_(Expense.date, Expense.id) < cursor)
+
+    if limit is None:
+        return query.all(), None
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].date, rows[-1].id)
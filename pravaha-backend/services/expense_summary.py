@@ -0,0 +1,230 @@
+# services/expense_summary.py
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import User, Expense, ExpenseSummary
+
+SUMMARY_KEY = ('company_id', 'month', 'user_id', 'category', 'status')
+
+GROUP_BY_OPTIONS = ('category', 'status', 'month', 'submitter', 'team')
+
+_UPSERT_DIALECTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def month_of(expense_date):
+    return expense_date.replace(day=1)
+
+
+def month_end(expense_date):
+    next_month = (expense_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def split_range(start_date, end_date):
+    """
+    Splits the inclusive range [start_date, end_date] (either bound may be None) into the
+    whole months the rollup can answer, as (first month, last month) with open ends as
+    None, or None when there are none; and the partial months at either end, as
+    [(from_date, to_date)] ranges that have to be read from Expense.
+    """
+    partial = []
+    first, last = start_date, end_date
+    if start_date is not None and start_date.day != 1:
+        head_end = month_end(start_date)
+        if end_date is not None and end_date <= head_end:
+            return None, [(start_date, end_date)]
+        partial.append((start_date, head_end))
+        first = head_end + timedelta(days=1)
+    if end_date is not None and end_date != month_end(end_date):
+        partial.append((month_of(end_date), end_date))
+        last = month_of(end_date) - timedelta(days=1)
+    if first is not None and last is not None and first > last:
+        return None, partial
+    return (first and month_of(first), last and month_of(last)), partial
+
+
+def summary_key(company_id, user_id, expense_date, category, status):
+    return (company_id, month_of(expense_date), user_id, category, status)
+
+
+def apply_deltas(deltas, session=None):
+    """
+    Adds {summary key: (count delta, base amount delta)} into the rollup, inside the
+    caller's transaction. Keys are tuples in SUMMARY_KEY order.
+    """
+    session = session or db.session
+    rows = [
+        dict(zip(SUMMARY_KEY, key), expense_count=count, total_base_amount=round(amount, 2))
+        for key, (count, amount) in deltas.items()
+        if count or amount
+    ]
+    if not rows:
+        return
+
+    upsert = _UPSERT_DIALECTS.get(session.get_bind().dialect.name)
+    if upsert is not None:
+        statement = upsert(ExpenseSummary)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(SUMMARY_KEY),
+            set_={
+                'expense_count': ExpenseSummary.expense_count + statement.excluded.expense_count,
+                'total_base_amount': ExpenseSummary.total_base_amount + statement.excluded.total_base_amount,
+            }
+        )
+        session.execute(statement, rows)
+        return
+
+    # Portable fallback: update the existing row, insert when there is none
+    for row in rows:
+        result = session.execute(
+            update(ExpenseSummary).where(
+                *(getattr(ExpenseSummary, column) == row[column] for column in SUMMARY_KEY)
+            ).values(
+                expense_count=ExpenseSummary.expense_count + row['expense_count'],
+                total_base_amount=ExpenseSummary.total_base_amount + row['total_base_amount']
+            )
+        )
+        if result.rowcount == 0:
+            session.execute(insert(ExpenseSummary), [row])
+
+
+def record_submission(expense):
+    key = summary_key(expense.company_id, expense.user_id, expense.date, expense.category, expense.status)
+    apply_deltas({key: (1, float(expense.base_amount))})
+
+
+def record_status_change(expense, old_status, new_status):
+    if old_status == new_status:
+        return
+    amount = float(expense.base_amount)
+    apply_deltas({
+        summary_key(expense.company_id, expense.user_id, expense.date, expense.category, old_status): (-1, -amount),
+        summary_key(expense.company_id, expense.user_id, expense.date, expense.category, new_status): (1, amount),
+    })
+
+
+def rebuild(company_id=None, session=None):
+    """
+    Recomputes the rollup from Expense (all companies, or one). Aggregates per day in SQL,
+    folds days into months here, and bulk inserts. Returns the number of summary rows.
+    """
+    session = session or db.session
+
+    cleared = delete(ExpenseSummary)
+    grouped = select(
+        Expense.company_id, Expense.user_id, Expense.category, Expense.status, Expense.date,
+        func.count(Expense.id), func.sum(Expense.base_amount)
+    ).group_by(
+        Expense.company_id, Expense.user_id, Expense.category, Expense.status, Expense.date
+    )
+    if company_id is not None:
+        cleared = cleared.where(ExpenseSummary.company_id == company_id)
+        grouped = grouped.where(Expense.company_id == company_id)
+
+    session.execute(cleared)
+
+    totals = defaultdict(lambda: [0, 0.0])
+    for row_company, row_user, category, status, expense_date, count, amount in session.execute(grouped):
+        total = totals[summary_key(row_company, row_user, expense_date, category, status)]
+        total[0] += count
+        total[1] += float(amount or 0)
+
+    rows = [
+        dict(zip(SUMMARY_KEY, key), expense_count=count, total_base_amount=round(amount, 2))
+        for key, (count, amount) in totals.items()
+    ]
+    if rows:
+        session.execute(insert(ExpenseSummary), rows)
+    return len(rows)
+
+
+def _grouping(group_by, source):
+    """(key column, label column, joins) for grouping rows of `source` (ExpenseSummary or Expense)."""
+    if group_by == 'submitter':
+        return source.user_id, User.full_name, [(User, source.user_id == User.id)]
+    if group_by == 'team':
+        manager = aliased(User)
+        return User.manager_id, manager.full_name, [(User, source.user_id == User.id), (manager, User.manager_id == manager.id)]
+    column = getattr(source, 'month' if group_by == 'month' else group_by)
+    return column, column, []
+
+
+def _grouped(statement, joins, key, label):
+    for index, (target, condition) in enumerate(joins):
+        # The manager of a team may be missing (top of the tree)
+        statement = statement.outerjoin(target, condition) if index else statement.join(target, condition)
+    return statement.group_by(key, label)
+
+
+def query_summary(company_id, group_by, filters):
+    """
+    Totals grouped by one of GROUP_BY_OPTIONS for exactly the requested dates. Whole
+    months come from the rollup; the days of a partially covered first or last month
+    are aggregated from Expense directly (see split_range).
+    """
+    whole, partial = split_range(filters.get('start_date'), filters.get('end_date'))
+    totals = defaultdict(lambda: [0, 0.0])
+
+    if whole is not None:
+        key, label, joins = _grouping(group_by, ExpenseSummary)
+        statement = select(
+            key.label('key'), label.label('label'),
+            func.sum(ExpenseSummary.expense_count), func.sum(ExpenseSummary.total_base_amount)
+        ).where(ExpenseSummary.company_id == company_id)
+        if 'status' in filters:
+            statement = statement.where(ExpenseSummary.status == filters['status'])
+        if 'category' in filters:
+            statement = statement.where(ExpenseSummary.category == filters['category'])
+        if whole[0] is not None:
+            statement = statement.where(ExpenseSummary.month >= whole[0])
+        if whole[1] is not None:
+            statement = statement.where(ExpenseSummary.month <= whole[1])
+        for row_key, row_label, count, amount in db.session.execute(_grouped(statement, joins, key, label)):
+            total = totals[(row_key, row_label)]
+            total[0] += int(count or 0)
+            total[1] += float(amount or 0)
+
+    for from_date, to_date in partial:
+        if group_by == 'month':
+            # A partial range lies within one month
+            key = label = None
+            joins = []
+        else:
+            key, label, joins = _grouping(group_by, Expense)
+        statement = select(
+            *([key.label('key'), label.label('label')] if key is not None else []),
+            func.count(Expense.id), func.sum(Expense.base_amount)
+        ).where(Expense.company_id == company_id, Expense.date.between(from_date, to_date))
+        if 'status' in filters:
+            statement = statement.where(Expense.status == filters['status'])
+        if 'category' in filters:
+            statement = statement.where(Expense.category == filters['category'])
+        if key is not None:
+            statement = _grouped(statement, joins, key, label)
+        for row in db.session.execute(statement):
+            row_key, row_label = (row[0], row[1]) if key is not None else (month_of(from_date), month_of(from_date))
+            total = totals[(row_key, row_label)]
+            total[0] += int(row[-2] or 0)
+            total[1] += float(row[-1] or 0)
+
+    # Rows drained to zero by status moves stay in the rollup; hide empty groups
+    groups = []
+    for (row_key, row_label), (count, amount) in totals.items():
+        if count <= 0:
+            continue
+        groups.append({
+            'key': row_key.strftime('%Y-%m') if group_by == 'month' else row_key,
+            'label': row_label.strftime('%Y-%m') if group_by == 'month' else row_label,
+            'count': count,
+            'base_amount': round(amount, 2),
+        })
+    if group_by == 'month':
+        groups.sort(key=lambda group: group['key'])
+    else:
+        groups.sort(key=lambda group: -group['base_amount'])
+    return groups
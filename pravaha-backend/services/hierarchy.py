@@ -0,0 +1,165 @@
+# services/hierarchy.py
+from sqlalchemy import delete, insert, literal, select, true
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import Company, User, UserHierarchy
+
+
+class HierarchyCycleError(ValueError):
+    """Raised when a manager assignment would make a user report to themselves."""
+
+
+def add_user(user_id, manager_id=None, session=None):
+    """Closure rows for a newly created user: its self row, plus its manager's chain if it has one."""
+    session = session or db.session
+    session.execute(insert(UserHierarchy), [{'ancestor_id': user_id, 'descendant_id': user_id, 'depth': 0}])
+    if manager_id is not None:
+        session.execute(insert(UserHierarchy).from_select(
+            ['ancestor_id', 'descendant_id', 'depth'],
+            select(UserHierarchy.ancestor_id, literal(user_id), UserHierarchy.depth + 1).where(
+                UserHierarchy.descendant_id == manager_id
+            )
+        ))
+
+
+def lock_company(company_id, session=None):
+    """
+    Serializes hierarchy changes within a company: row-locks the company (SELECT ...
+    FOR UPDATE) until the caller's transaction ends. Take it before reading anything
+    the change is checked against, or two concurrent moves (A under B, B under A)
+    can both pass would_create_cycle(). SQLite ignores the lock; it allows one writer
+    at a time, so the later transaction fails instead of committing a cycle.
+    """
+    session = session or db.session
+    session.execute(select(Company.id).where(Company.id == company_id).with_for_update())
+
+
+def would_create_cycle(user_id, manager_id, session=None):
+    """True when manager_id is the user or anyone below them (one primary key lookup)."""
+    session = session or db.session
+    return session.execute(
+        select(UserHierarchy.depth).where(
+            UserHierarchy.ancestor_id == user_id, UserHierarchy.descendant_id == manager_id
+        )
+    ).first() is not None
+
+
+def move_subtree(user_id, manager_id, session=None):
+    """
+    Re-links user_id, and everyone under them, below manager_id (None makes them a
+    root). Runs inside the caller's transaction, which must hold lock_company(); the
+    caller updates User.manager_id. Raises HierarchyCycleError if manager_id is
+    inside the user's own subtree.
+    """
+    session = session or db.session
+    if manager_id is not None and would_create_cycle(user_id, manager_id, session):
+        raise HierarchyCycleError("Assignment would create a reporting cycle.")
+
+    # Detach: drop every link from the user's current managers into the subtree
+    subtree = select(UserHierarchy.descendant_id).where(UserHierarchy.ancestor_id == user_id)
+    above = select(UserHierarchy.ancestor_id).where(
+        UserHierarchy.descendant_id == user_id, UserHierarchy.depth > 0
+    )
+    session.execute(delete(UserHierarchy).where(
+        UserHierarchy.descendant_id.in_(subtree), UserHierarchy.ancestor_id.in_(above)
+    ))
+    if manager_id is None:
+        return
+
+    # Attach: every manager at or above manager_id to every user at or below user_id
+    upper, lower = aliased(UserHierarchy), aliased(UserHierarchy)
+    session.execute(insert(UserHierarchy).from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(upper.ancestor_id, lower.descendant_id, upper.depth + lower.depth + 1).select_from(
+            upper
+        ).join(lower, true()).where(
+            upper.descendant_id == manager_id, lower.ancestor_id == user_id
+        )
+    ))
+
+
+def reports_query(manager_id, max_depth=None):
+    """Users below manager_id (direct and indirect) with their distance, nearest first."""
+    query = select(
+        User.id, User.full_name, User.email, User.role, User.manager_id, UserHierarchy.depth
+    ).join(
+        UserHierarchy, UserHierarchy.descendant_id == User.id
+    ).where(
+        UserHierarchy.ancestor_id == manager_id, UserHierarchy.depth > 0
+    ).order_by(UserHierarchy.depth, User.id)
+    if max_depth is not None:
+        query = query.where(UserHierarchy.depth <= max_depth)
+    return query
+
+
+def approval_chain_query(user_id):
+    """Managers above user_id, from the direct manager up to the top of the tree."""
+    return select(User.id, User.full_name, User.role, UserHierarchy.depth).join(
+        UserHierarchy, UserHierarchy.ancestor_id == User.id
+    ).where(
+        UserHierarchy.descendant_id == user_id, UserHierarchy.depth > 0
+    ).order_by(UserHierarchy.depth)
+
+
+def reports_filter(user_id_column, manager_id, max_depth=None):
+    """WHERE clause limiting user_id_column to the users below manager_id."""
+    below = select(UserHierarchy.descendant_id).where(
+        UserHierarchy.ancestor_id == manager_id, UserHierarchy.depth > 0
+    )
+    if max_depth is not None:
+        below = below.where(UserHierarchy.depth <= max_depth)
+    return user_id_column.in_(below)
+
+
+def rebuild(company_id=None, session=None, chunk_size=5000):
+    """
+    Recomputes the closure table from User.manager_id (all companies, or one).
+    Existing cycles in manager_id are cut at the first repeated user and reported.
+    Returns the number of closure rows written.
+    """
+    session = session or db.session
+
+    users = select(User.id, User.manager_id)
+    if company_id is not None:
+        users = users.where(User.company_id == company_id)
+        session.execute(delete(UserHierarchy).where(
+            UserHierarchy.descendant_id.in_(select(User.id).where(User.company_id == company_id))
+        ))
+    else:
+        session.execute(delete(UserHierarchy))
+    manager_of = dict(session.execute(users).all())
+
+    # chains[user] = managers above the user, nearest first; each user is walked once
+    chains = {}
+    for start in manager_of:
+        path, seen = [], set()
+        current = start
+        while current in manager_of and current not in chains and current not in seen:
+            seen.add(current)
+            path.append(current)
+            current = manager_of[current]
+
+        if current in seen:
+            print(f"Manager cycle through user {current}; treating user {path[-1]} as a root.")
+        # Ends at a root (None), a user already resolved, a cycle, or a manager outside the scope
+        above = [current] + chains[current] if current in chains else []
+        for user_id in reversed(path):
+            chains[user_id] = above
+            above = [user_id] + above
+
+    rows, written = [], 0
+    for user_id, chain in chains.items():
+        rows.append({'ancestor_id': user_id, 'descendant_id': user_id, 'depth': 0})
+        rows.extend(
+            {'ancestor_id': manager_id, 'descendant_id': user_id, 'depth': depth}
+            for depth, manager_id in enumerate(chain, start=1)
+        )
+        if len(rows) >= chunk_size:
+            session.execute(insert(UserHierarchy), rows)
+            written += len(rows)
+            rows = []
+    if rows:
+        session.execute(insert(UserHierarchy), rows)
+        written += len(rows)
+    return written
@@ -0,0 +1,252 @@
+# services/http_client.py
+import os
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from services import metrics
+from services.singleflight import SingleFlight
+
+# Responses worth another attempt; anything else (e.g. 404) fails straight away
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class HttpError(Exception):
+    """Raised when an outbound request fails for good (after retries, or refused by the breaker)."""
+
+
+class CircuitOpen(HttpError):
+    """Raised without calling out while an endpoint's circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calls to an endpoint after `threshold` consecutive failures. After
+    `reset_timeout` seconds one trial call is let through (half-open): success
+    closes the circuit, failure opens it for another `reset_timeout`.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record(self, ok):
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class _EndpointStats:
+    __slots__ = ('requests', 'errors', 'retries', 'coalesced', 'rejected', 'latencies')
+
+    def __init__(self, samples):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=samples)  # seconds per attempt
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class HttpClient:
+    """
+    Shared outbound HTTP client.
+
+    One requests.Session keeps connections alive per host (`pool_size` each), so
+    repeated calls skip DNS, TCP and TLS setup. Connection errors, timeouts and
+    429/5xx responses are retried up to `retries` times with full-jitter exponential
+    backoff. Each endpoint (a caller-chosen name, the host by default) has its own
+    circuit breaker and latency record, and concurrent GETs of the same URL share a
+    single request.
+    """
+
+    def __init__(self, timeout=5, retries=2, backoff=0.2, max_backoff=2.0, pool_size=10,
+                 breaker_threshold=5, breaker_reset=30, latency_samples=512, sleep=time.sleep):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.latency_samples = latency_samples
+        self.sleep = sleep
+        self._session = None
+        self._breakers = {}
+        self._stats = {}
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            timeout=float(os.getenv('HTTP_TIMEOUT', 5)),
+            retries=int(os.getenv('HTTP_RETRIES', 2)),
+            backoff=float(os.getenv('HTTP_BACKOFF', 0.2)),
+            pool_size=int(os.getenv('HTTP_POOL_SIZE', 10)),
+            breaker_threshold=int(os.getenv('HTTP_BREAKER_THRESHOLD', 5)),
+            breaker_reset=float(os.getenv('HTTP_BREAKER_RESET', 30)),
+        )
+
+    def _get_session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests  # deferred: only needed once something is fetched
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    # Retries are ours (with jitter and the breaker), not urllib3's
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def _endpoint(self, name):
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+                self._stats[name] = _EndpointStats(self.latency_samples)
+            return self._breakers[name], self._stats[name]
+
+    def get_json(self, url, endpoint=None, timeout=None):
+        """
+        GETs `url` and returns the decoded JSON body. Raises HttpError once retries are
+        used up, and CircuitOpen while the endpoint's breaker is open.
+        """
+        endpoint = endpoint or urlsplit(url).netloc
+        breaker, stats = self._endpoint(endpoint)
+        result, shared = self._flight.do(url, lambda: self._fetch(url, endpoint, breaker, stats, timeout))
+        if shared:
+            with self._lock:
+                stats.coalesced += 1
+        return result
+
+    def _fetch(self, url, endpoint, breaker, stats, timeout):
+        import requests
+
+        if not breaker.allow():
+            with self._lock:
+                stats.rejected += 1
+            raise CircuitOpen(f"{endpoint}: circuit open, not calling out.")
+
+        session = self._get_session()
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # Full jitter keeps retrying callers from hitting the endpoint in lockstep
+                self.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1))))
+            started = time.perf_counter()
+            try:
+                response = session.get(url, timeout=timeout or self.timeout)
+            except requests.exceptions.RequestException as e:
+                # Connection errors and timeouts
+                error, retryable = e, True
+            else:
+                if response.status_code < 400:
+                    try:
+                        body = response.json()
+                    except ValueError:
+                        error, retryable = "response is not valid JSON", False
+                    else:
+                        self._record(endpoint, stats, started, attempt, ok=True)
+                        breaker.record(True)
+                        return body
+                else:
+                    error, retryable = f"HTTP {response.status_code}", response.status_code in RETRY_STATUSES
+
+            self._record(endpoint, stats, started, attempt, ok=False)
+            if not retryable:
+                break
+
+        # A 4xx or malformed body is the request's fault, not a sign the endpoint is down
+        breaker.record(not retryable)
+        raise HttpError(f"{endpoint}: {error}")
+
+    def _record(self, endpoint, stats, started, attempt, ok):
+        elapsed = time.perf_counter() - started
+        metrics.record_section(f"http.{endpoint}", elapsed)
+        with self._lock:
+            stats.requests += 1
+            stats.retries += attempt > 0
+            stats.errors += not ok
+            stats.latencies.append(elapsed)
+
+    def stats(self):
+        """Per-endpoint counters, breaker state and latency percentiles (ms) over recent attempts."""
+        output = {}
+        with self._lock:
+            endpoints = list(self._stats.items())
+        for name, stats in endpoints:
+            latencies = sorted(stats.latencies)
+            output[name] = {
+                'requests': stats.requests,
+                'errors': stats.errors,
+                'retries': stats.retries,
+                'coalesced': stats.coalesced,
+                'rejected': stats.rejected,
+                'circuit': self._breakers[name].state,
+                'p50_ms': round(_percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+                'p95_ms': round(_percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+            }
+        return output
+
+    def close(self):
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide HttpClient, configured from HTTP_* environment variables on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient.from_env()
+    return _client
+
+
+def set_client(client):
+    """Swaps the shared client (e.g. one with a fake sleep in benchmarks); closes the previous one."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    if previous is not None:
+        previous.close()
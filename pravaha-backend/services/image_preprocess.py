@@ -0,0 +1,96 @@
+# services/image_preprocess.py
+import io
+import os
+import time
+
+
+def _pillow():
+    # Imported on first use; Pillow is optional and without it images go to OCR untouched
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None, None
+    return Image, ImageOps
+
+
+class ImagePreprocessor:
+    """
+    Shrinks receipt photos before OCR: decode, auto-rotate (EXIF orientation),
+    downscale so the longer side is at most `max_dimension`, convert to grayscale
+    and re-encode as JPEG at `quality`.
+
+    process() returns (image_bytes, report). The report carries byte counts before
+    and after and the milliseconds spent in each stage. The original bytes are
+    returned when Pillow is missing, the image cannot be decoded, or re-encoding
+    would not make it smaller.
+    """
+
+    def __init__(self, enabled=True, max_dimension=1600, grayscale=True, quality=80):
+        self.enabled = enabled
+        self.max_dimension = max_dimension
+        self.grayscale = grayscale
+        self.quality = quality
+
+    def process(self, image_bytes):
+        report = {'bytes_in': len(image_bytes), 'bytes_out': len(image_bytes), 'applied': False, 'timings_ms': {}}
+        if not self.enabled:
+            report['skipped'] = 'disabled'
+            return image_bytes, report
+        Image, ImageOps = _pillow()
+        if Image is None:
+            report['skipped'] = 'Pillow is not installed'
+            return image_bytes, report
+
+        timings = report['timings_ms']
+        started = time.perf_counter()
+
+        def lap(stage):
+            nonlocal started
+            now = time.perf_counter()
+            timings[stage] = round((now - started) * 1000, 2)
+            started = now
+
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+            report['original_size'] = list(image.size)
+            # JPEG only: let the decoder skip detail we are about to throw away
+            image.draft('L' if self.grayscale else 'RGB', (self.max_dimension, self.max_dimension))
+            image.load()
+        except Exception:
+            report['skipped'] = 'not a decodable image'
+            return image_bytes, report
+        lap('decode')
+
+        image = ImageOps.exif_transpose(image)
+        lap('rotate')
+
+        if max(image.size) > self.max_dimension:
+            image.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+        lap('resize')
+
+        image = image.convert('L' if self.grayscale else 'RGB')
+        lap('grayscale' if self.grayscale else 'convert')
+
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=self.quality, optimize=True)
+        lap('encode')
+
+        report['size'] = list(image.size)
+        processed = buffer.getvalue()
+        if len(processed) >= len(image_bytes) and report['size'] == report['original_size']:
+            report['skipped'] = 'already compact'
+            return image_bytes, report
+
+        report['bytes_out'] = len(processed)
+        report['applied'] = True
+        return processed, report
+
+
+def from_env():
+    """Preprocessor configured from OCR_PREPROCESS, OCR_MAX_DIMENSION, OCR_GRAYSCALE and OCR_JPEG_QUALITY."""
+    return ImagePreprocessor(
+        enabled=os.getenv('OCR_PREPROCESS', '1') != '0',
+        max_dimension=int(os.getenv('OCR_MAX_DIMENSION', 1600)),
+        grayscale=os.getenv('OCR_GRAYSCALE', '1') != '0',
+        quality=int(os.getenv('OCR_JPEG_QUALITY', 80))
+    )
@@ -0,0 +1,297 @@
+# services/metrics.py
+import contextvars
+import functools
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Seconds; Prometheus' default latency buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Statements per request
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+SQL_OPERATIONS = frozenset({'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'})
+
+
+class _Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self, size):
+        self.counts = [0] * size  # per bucket, not cumulative; the last is +Inf
+        self.total = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """A labelled histogram family with fixed upper bounds, rendered cumulatively."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = _Histogram(len(self.buckets) + 1)
+            series.counts[bisect_left(self.buckets, value)] += 1
+            series.total += value
+            series.count += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(s.counts), s.total, s.count) for labels, s in self._series.items())
+        for labels, counts, total, count in series:
+            base = _labels(self.labelnames, labels)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = bound if isinstance(bound, str) else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{base} {total:.6f}")
+            lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+    def snapshot(self):
+        """{labels: (count, sum)} for benchmarks and tests."""
+        with self._lock:
+            return {labels: (s.count, s.total) for labels, s in self._series.items()}
+
+
+class Counter:
+    """A labelled, monotonically increasing counter family."""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in values)
+        return lines
+
+
+class Collected:
+    """
+    A labelled family read at scrape time: `collect()` returns {labels: value}. For
+    state kept elsewhere, e.g. cache sizes (kind 'gauge') and the hit/miss totals the
+    caches count themselves (kind 'counter').
+    """
+
+    def __init__(self, name, help_text, labelnames=(), collect=dict, kind='gauge'):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in sorted(self.collect().items()))
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+REQUESTS = Counter('pravaha_http_requests_total', "HTTP requests served.", ('method', 'route', 'status'))
+REQUEST_SECONDS = Histogram('pravaha_http_request_duration_seconds', "HTTP request latency.", ('method', 'route'))
+REQUEST_STATEMENTS = Histogram(
+    'pravaha_http_request_db_statements', "SQL statements executed per HTTP request.", ('route',), COUNT_BUCKETS
+)
+DB_SECONDS = Histogram('pravaha_db_statement_duration_seconds', "SQL statement latency.", ('operation',))
+SECTION_SECONDS = Histogram(
+    'pravaha_section_duration_seconds', "Time spent in instrumented sections (currency conversion, OCR and its preprocessing stages, outbound HTTP).",
+    ('section',)
+)
+PROFILES = Counter('pravaha_profiles_written_total', "Sampled request profiles dumped to disk.", ('route',))
+
+FAMILIES = [REQUESTS, REQUEST_SECONDS, REQUEST_STATEMENTS, DB_SECONDS, SECTION_SECONDS, PROFILES]
+
+
+class RequestStats:
+    """What one request spent: SQL statements and time, and time per instrumented section."""
+    __slots__ = ('started', 'statements', 'db_seconds', 'sections')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.sections = {}
+
+
+_current = contextvars.ContextVar('pravaha_request_stats', default=None)
+
+
+def begin_request():
+    stats = RequestStats()
+    _current.set(stats)
+    return stats
+
+
+def end_request(method, route, status):
+    """Records the finished request in the registry; returns its RequestStats and duration."""
+    stats = _current.get()
+    if stats is None:
+        return None, 0.0
+    _current.set(None)
+    elapsed = time.perf_counter() - stats.started
+    REQUESTS.inc(method, route, str(status))
+    REQUEST_SECONDS.observe(elapsed, method, route)
+    REQUEST_STATEMENTS.observe(stats.statements, route)
+    return stats, elapsed
+
+
+def record_section(section, seconds):
+    SECTION_SECONDS.observe(seconds, section)
+    stats = _current.get()
+    if stats is not None:
+        stats.sections[section] = stats.sections.get(section, 0.0) + seconds
+
+
+def timed(section):
+    """Decorator recording each call's duration under `section`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapped(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record_section(section, time.perf_counter() - started)
+        return wrapped
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('pravaha_query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('pravaha_query_started')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    operation = statement.lstrip()[:7].split(None, 1)
+    operation = operation[0].upper() if operation else ''
+    DB_SECONDS.observe(elapsed, operation if operation in SQL_OPERATIONS else 'OTHER')
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    starts = context.connection.info.get('pravaha_query_started') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+_sql_lock = threading.Lock()
+_sql_installed = False
+
+
+def instrument_sql():
+    """Times every SQL statement of every engine in the process (idempotent)."""
+    global _sql_installed
+    with _sql_lock:
+        if not _sql_installed:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+            _sql_installed = True
+
+
+class Profiler:
+    """
+    Opt-in request profiling. A `sample_rate` share of requests (and any request the
+    caller forces) runs under cProfile; the profile is written to `directory` only if
+    the request took at least `slow_ms` (forced requests are always written). One
+    request is profiled at a time, since cProfile cannot nest.
+    """
+
+    def __init__(self, directory, sample_rate=0.0, slow_ms=500, rng=random.random):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.rng = rng
+        self._busy = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def start(self, force=False):
+        """A running cProfile.Profile for this request, or None if it is not sampled."""
+        if not self.enabled or not (force or self.rng() < self.sample_rate):
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        import cProfile  # deferred: only needed once profiling is switched on
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is already active
+            self._busy.release()
+            return None
+        return profile
+
+    def finish(self, profile, route, elapsed, force=False):
+        """Stops `profile`; dumps it if the request was slow (or forced). Returns the file path or None."""
+        try:
+            profile.disable()
+        finally:
+            self._busy.release()
+        if not force and elapsed * 1000 < self.slow_ms:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', route).strip('_') or 'root'
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{elapsed * 1000:.0f}ms-{name}.prof")
+        profile.dump_stats(path)
+        PROFILES.inc(route)
+        return path
+
+
+def server_timing(stats, elapsed):
+    """A Server-Timing header value: total, SQL and per-section milliseconds of one request."""
+    parts = [f"app;dur={elapsed * 1000:.1f}", f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.statements} queries"']
+    for name, seconds in stats.sections.items():
+        parts.append(f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)};dur={seconds * 1000:.1f}")
+    return ', '.join(parts)
+
+
+def render(*extra):
+    """The whole registry, then the `extra` families, in the Prometheus text exposition format."""
+    lines = []
+    for family in FAMILIES + list(extra):
+        lines.extend(family.render())
+    return '\n'.join(lines) + '\n'
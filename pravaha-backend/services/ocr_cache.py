@@ -0,0 +1,123 @@
+# services/ocr_cache.py
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from services.singleflight import SingleFlight
+
+
+def image_key(image_bytes):
+    """Content address of a receipt image: SHA-256 of the decoded bytes."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class OcrResultCache:
+    """
+    Content-addressed cache of parsed OCR results (the extracted_data dict).
+
+    An in-memory LRU of `max_entries` results sits in front of an optional on-disk
+    tier (`directory`, one JSON file per image hash) that survives restarts.
+    Entries are kept per `namespace` (the OCR engine name), so a result read by one
+    engine is never served once another is configured. Concurrent requests for the
+    same image share one OCR call. Error results are never cached.
+    """
+
+    def __init__(self, max_entries=256, directory=None):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, image_bytes, compute, namespace='default'):
+        """Returns a copy of the cached result for these bytes, running compute(image_bytes) on a miss."""
+        key = (namespace, image_key(image_bytes))
+
+        result = self._get_memory(key)
+        if result is not None:
+            return dict(result)
+
+        result = self._read_disk(key)
+        if result is not None:
+            with self._lock:
+                self.disk_hits += 1
+            self._put_memory(key, result)
+            return dict(result)
+
+        result, shared = self._flight.do(key, lambda: self._compute(key, image_bytes, compute))
+        return dict(result)
+
+    def _compute(self, key, image_bytes, compute):
+        with self._lock:
+            self.misses += 1
+        result = compute(image_bytes)
+        if 'error' not in result:
+            self._put_memory(key, result)
+            self._write_disk(key, result)
+        return result
+
+    def _get_memory(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return result
+
+    def _put_memory(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key):
+        namespace, digest = key
+        return os.path.join(self.directory, namespace, digest[:2], f'{digest}.json')
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, result):
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename, so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write OCR cache entry {path}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'coalesced': self._flight.coalesced,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'disk': bool(self.directory),
+            }
@@ -0,0 +1,167 @@
+# services/ocr_engines.py
+import io
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+
+class OcrEngineError(Exception):
+    """Raised by an engine when text detection cannot run or fails."""
+
+
+class GoogleVisionEngine:
+    """
+    Google Cloud Vision text detection. Relies on GOOGLE_APPLICATION_CREDENTIALS.
+
+    The google.cloud.vision import and the client (credentials, gRPC channel) are
+    deferred to the first detect_text() call, so processes that never run OCR do
+    not pay for them. A failed initialization is not retried.
+
+    Each request has a deadline of `timeout` seconds (OCR_VISION_TIMEOUT, else
+    OCR_JOB_TIMEOUT): a hung RPC would otherwise hold an OCR worker for good.
+    """
+
+    name = 'google'
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout or float(os.getenv('OCR_VISION_TIMEOUT') or os.getenv('OCR_JOB_TIMEOUT') or 30)
+        self._vision = None
+        self.client = None
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    try:
+                        from google.cloud import vision
+                        self._vision = vision
+                        self.client = vision.ImageAnnotatorClient()
+                    except Exception as e:
+                        print(f"Vision client initialization failed: {e}")
+                    self._initialized = True
+        return self.client
+
+    def detect_text(self, image_bytes):
+        client = self._get_client()
+        if not client:
+            raise OcrEngineError("Vision client not initialized. Check GOOGLE_APPLICATION_CREDENTIALS.")
+
+        # Create the Vision Image object directly from the raw bytes
+        image = self._vision.Image(content=image_bytes)
+        try:
+            response = client.text_detection(image=image, timeout=self.timeout)
+        except Exception as e:
+            # google.api_core errors, DeadlineExceeded included
+            raise OcrEngineError(f"Vision text detection failed: {e}")
+        if response.error.message:
+            raise OcrEngineError(response.error.message)
+
+        # Full detected text is the first element of 'text_annotations'
+        return response.text_annotations[0].description if response.text_annotations else ""
+
+
+class StaticTextEngine:
+    """
+    Local stand-in for tests and benchmarks: returns canned text without any network.
+    `texts` maps exact image bytes to text; anything else gets `default_text`.
+    `delay` (seconds) simulates engine latency.
+    """
+
+    name = 'static'
+
+    def __init__(self, default_text='', texts=None, delay=0.0):
+        self.default_text = default_text
+        self.texts = dict(texts or {})
+        self.delay = delay
+
+    def detect_text(self, image_bytes):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.texts.get(bytes(image_bytes), self.default_text)
+
+
+def _tesseract_text(image_bytes, lang, config, timeout):
+    # Runs in a pool process; returns (text, error) so nothing unpicklable crosses back
+    import pytesseract
+    from PIL import Image
+    try:
+        return pytesseract.image_to_string(
+            Image.open(io.BytesIO(image_bytes)), lang=lang, config=config, timeout=timeout
+        ), None
+    except pytesseract.TesseractNotFoundError:
+        return None, "Tesseract binary not found. Install tesseract-ocr or set OCR_ENGINE=google."
+    except Exception as e:
+        return None, f"Tesseract failed: {e}"
+
+
+class TesseractEngine:
+    """
+    Local, offline text detection with Tesseract (pytesseract + Pillow).
+
+    Recognition is CPU bound, so calls are spread over a process pool of `workers`
+    processes (default: one per core), started on first use. Settings default to
+    OCR_TESSERACT_WORKERS, OCR_TESSERACT_LANG, OCR_TESSERACT_CONFIG and
+    OCR_TESSERACT_TIMEOUT.
+    """
+
+    name = 'tesseract'
+
+    def __init__(self, workers=None, lang=None, config=None, timeout=None):
+        # Fail at startup, not on the first receipt, when the Python packages are missing
+        import pytesseract  # noqa: F401
+        import PIL  # noqa: F401
+        self.workers = workers or int(os.getenv('OCR_TESSERACT_WORKERS', 0)) or os.cpu_count()
+        self.lang = lang or os.getenv('OCR_TESSERACT_LANG', 'eng')
+        # --psm 6: treat the image as one uniform block of text, which suits receipts
+        self.config = config if config is not None else os.getenv('OCR_TESSERACT_CONFIG', '--psm 6')
+        self.timeout = timeout or int(os.getenv('OCR_TESSERACT_TIMEOUT', 30))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # OCR workers call this concurrently; only one may start the pool
+        executor = self._executor
+        if executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                executor = self._executor
+        return executor
+
+    def detect_text(self, image_bytes):
+        future = self._get_executor().submit(_tesseract_text, bytes(image_bytes), self.lang, self.config, self.timeout)
+        try:
+            # Queueing time counts too; give the pool a little slack past Tesseract's own timeout
+            text, error = future.result(timeout=self.timeout + 5)
+        except FutureTimeout:
+            future.cancel()
+            raise OcrEngineError(f"Tesseract did not finish within {self.timeout} seconds.")
+        except Exception as e:
+            raise OcrEngineError(f"Tesseract worker failed: {e}")
+        if error:
+            raise OcrEngineError(error)
+        return text
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+ENGINES = {
+    GoogleVisionEngine.name: GoogleVisionEngine,
+    TesseractEngine.name: TesseractEngine,
+    StaticTextEngine.name: StaticTextEngine,
+}
+
+
+def create_engine(name='google', **options):
+    try:
+        engine_class = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown OCR engine '{name}'. Available: {', '.join(sorted(ENGINES))}.")
+    return engine_class(**options)
@@ -0,0 +1,133 @@
+# services/ocr_jobs.py
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the queue is at its maximum depth."""
+
+
+class _Job:
+    __slots__ = ('id', 'future', 'submitted_at', 'finished_at', 'result', 'error', 'timed_out')
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.future = None
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.timed_out = False
+
+
+class OcrJobQueue:
+    """
+    Bounded background OCR queue.
+
+    `extract` is called with the raw image bytes in a worker (thread or process pool)
+    and returns the extracted_data dict. At most `max_depth` jobs may be queued or
+    running at once; further submits raise QueueFull. A job that has not finished
+    within `timeout` seconds of submission is reported as timed out and its result is
+    discarded. Finished jobs are kept for `result_ttl` seconds for polling.
+    """
+
+    def __init__(self, extract, workers=2, max_depth=32, timeout=30, result_ttl=600, executor='thread'):
+        if executor not in ('thread', 'process'):
+            raise ValueError("executor must be 'thread' or 'process'")
+        self.extract = extract
+        self.workers = workers
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self.executor_kind = executor
+        self._executor = None
+        self._jobs = {}
+        self._active = 0
+        # Re-entrant: cancelling a future under the lock runs _finish synchronously
+        self._lock = threading.RLock()
+
+    def _get_executor(self):
+        # Workers are only started once the first job arrives
+        if self._executor is None:
+            pool = ProcessPoolExecutor if self.executor_kind == 'process' else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.workers)
+        return self._executor
+
+    def submit(self, image_bytes):
+        """Queues one extraction and returns its job id. Raises QueueFull under backpressure."""
+        job = _Job()
+        with self._lock:
+            self._purge(job.submitted_at)
+            if self._active >= self.max_depth:
+                raise QueueFull(f"OCR queue is full ({self.max_depth} jobs).")
+            self._active += 1
+            self._jobs[job.id] = job
+            executor = self._get_executor()
+
+        job.future = executor.submit(self.extract, image_bytes)
+        job.future.add_done_callback(lambda future: self._finish(job, future))
+        return job.id
+
+    def _finish(self, job, future):
+        with self._lock:
+            self._active -= 1
+            job.finished_at = time.monotonic()
+            if future.cancelled():
+                job.error = "Job was cancelled."
+                return
+            error = future.exception()
+            if error is not None:
+                job.error = f"OCR processing failed: {error}"
+            elif not job.timed_out:
+                result = future.result()
+                if 'error' in result:
+                    job.error = result['error']
+                else:
+                    job.result = result
+
+    def _purge(self, now):
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.result_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """Returns the job's status dict, or None if the id is unknown or expired."""
+        now = time.monotonic()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+
+            if job.finished_at is None and now - job.submitted_at > self.timeout:
+                # Stop a job that never started; a running one finishes but is discarded
+                job.timed_out = True
+                if job.future is not None:
+                    job.future.cancel()
+
+            status = {'job_id': job.id}
+            if job.timed_out:
+                status['status'] = 'timeout'
+                status['error'] = f"OCR job exceeded {self.timeout} seconds."
+            elif job.finished_at is None:
+                status['status'] = 'running' if job.future is not None and job.future.running() else 'queued'
+            elif job.error:
+                status['status'] = 'failed'
+                status['error'] = job.error
+            else:
+                status['status'] = 'done'
+                status['result'] = job.result
+            return status
+
+    def stats(self):
+        with self._lock:
+            return {'active': self._active, 'tracked': len(self._jobs), 'max_depth': self.max_depth}
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
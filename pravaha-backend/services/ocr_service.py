@@ -1,83 +1,98 @@
 # services/ocr_service.py
-from google.cloud import vision
-import io
-import re
+import os
 import base64
+import binascii
+import threading
 
-# Initialize the Vision client globally
-# NOTE: It relies on the GOOGLE_APPLICATION_CREDENTIALS env var
-try:
-    client = vision.ImageAnnotatorClient()
-except Exception as e:
-    print(f"Vision client initialization failed: {e}")
-    client = None
+from services.ocr_cache import OcrResultCache, image_key
+from services.ocr_engines import OcrEngineError, create_engine
+from services import image_preprocess, metrics
+from services.receipt_parser import ReceiptParser, load_category_table
+
+# The OCR engine is created on first use (OCR_ENGINE: google | tesseract | static)
+# NOTE: The Google engine relies on the GOOGLE_APPLICATION_CREDENTIALS env var;
+# tesseract runs offline in a local process pool (see TesseractEngine)
+engine = None
+parser = None
+_init_lock = threading.Lock()
+
+# Parsed results keyed by image hash (OCR_CACHE_DIR adds a tier that survives restarts)
+cache = OcrResultCache(
+    max_entries=int(os.getenv('OCR_CACHE_SIZE', 256)),
+    directory=os.getenv('OCR_CACHE_DIR') or None
+)
+
+# Decode/rotate/downscale/grayscale before OCR (OCR_PREPROCESS=0 sends the original bytes)
+preprocessor = image_preprocess.from_env()
+
+def get_engine():
+    global engine
+    if engine is None:
+        with _init_lock:
+            if engine is None:
+                engine = create_engine(os.getenv('OCR_ENGINE', 'google'))
+    return engine
+
+def get_parser():
+    """Receipt text parser, compiled once (RECEIPT_CATEGORIES_FILE: JSON {category: [keywords]})."""
+    global parser
+    if parser is None:
+        with _init_lock:
+            if parser is None:
+                parser = ReceiptParser(load_category_table(os.getenv('RECEIPT_CATEGORIES_FILE')))
+    return parser
+
+def set_engine(new_engine):
+    """Swaps the OCR backend, e.g. for a StaticTextEngine in tests and benchmarks."""
+    global engine
+    with _init_lock:
+        previous, engine = engine, new_engine
+    if hasattr(previous, 'close'):
+        previous.close()
+    cache.clear()
 
 def extract_text_from_image(image_base64_data):
     """Detects text (OCR) in an image provided as base64 data."""
-    if not client:
-        return {"error": "Vision client not initialized. Check GOOGLE_APPLICATION_CREDENTIALS."}
-
     try:
-        # --- FIX APPLIED HERE ---
-        # 1. Decode the Base64 string into raw image bytes.
+        # Decode the Base64 string into raw image bytes
         image_bytes = base64.b64decode(image_base64_data)
-        
-        # 2. Create the Vision Image object directly from the raw bytes.
-        image = vision.Image(content=image_bytes)
-        # ------------------------
+    except (binascii.Error, ValueError) as e:
+        # Added check for common Base64 padding error
+        if 'incorrect padding' in str(e).lower():
+             return {"error": "OCR processing failed: Invalid Base64 string (padding error)."}
+        return {"error": f"OCR processing failed: {e}"}
+
+    return extract_text_from_bytes(image_bytes)
+
+# Covers extract_text_from_image too, which decodes and delegates here
+@metrics.timed('ocr')
+def extract_text_from_bytes(image_bytes):
+    """
+    Detects text (OCR) in raw image bytes and suggests amount, currency and category.
+    Re-uploads of the same image are served from the result cache (per engine).
+    """
+    return cache.get_or_compute(image_bytes, _extract_uncached, namespace=get_engine().name)
+
+def _extract_uncached(image_bytes):
+    try:
+        # Shrink the photo before it is shipped to the engine
+        ocr_bytes, preprocessing = preprocessor.process(image_bytes)
+        for stage, ms in preprocessing['timings_ms'].items():
+            metrics.record_section(f"ocr_preprocess.{stage}", ms / 1000)
 
-        # Perform the text detection
-        response = client.text_detection(image=image)
-        
-        # Get the full detected text (first element of 'text_annotations')
-        full_text = response.text_annotations[0].description if response.text_annotations else ""
-        
-        # Basic heuristic to find amount and currency (highly simplified)
-        # Looks for patterns like 'USD 100.00' or 'TOTAL 5000 INR'
-        
-        # Pattern for common currency symbols/codes followed by a number
-        currency_pattern = r'([A-Z]{3}|\$|€|£|¥)\s*(\d{1,3}(?:[.,]\d{3})*(?:[.,]\d{2})?)'
-        
-        # Find all matches
-        matches = re.findall(currency_pattern, full_text, re.IGNORECASE)
-        
-        extracted_data = {
-            'full_text': full_text,
-            'suggested_amount': None,
-            'suggested_currency': None,
-            'suggested_category': 'Miscellaneous' # Default category
-        }
+        # Perform the text detection with the configured engine
+        full_text = get_engine().detect_text(ocr_bytes)
 
-        if matches:
-            # We assume the last match is the total amount
-            last_match = matches[-1]
-            currency_symbol = last_match[0].upper()
-            amount_str = last_match[1].replace(',', '') # Clean up thousand separators
-            
-            # Convert common symbols to codes
-            if currency_symbol == '$': suggested_currency = 'USD'
-            elif currency_symbol == '€': suggested_currency = 'EUR'
-            elif currency_symbol == '£': suggested_currency = 'GBP'
-            elif currency_symbol == '¥': suggested_currency = 'JPY'
-            else: suggested_currency = currency_symbol # Keep 3-letter code
-            
-            extracted_data['suggested_amount'] = float(amount_str)
-            extracted_data['suggested_currency'] = suggested_currency
-            
-            # Simple keyword categorization (for demo)
-            if re.search(r'uber|taxi|transport|flight|train', full_text, re.IGNORECASE):
-                extracted_data['suggested_category'] = 'Travel'
-            elif re.search(r'hotel|lodging|inn|resort', full_text, re.IGNORECASE):
-                extracted_data['suggested_category'] = 'Lodging'
-            elif re.search(r'food|restaurant|cafe|dinner', full_text, re.IGNORECASE):
-                extracted_data['suggested_category'] = 'Food'
+        # Suggest amount, currency and category from the detected text
+        result = get_parser().parse(full_text)
+        result['preprocessing'] = preprocessing
+        # Sent back with the submission, so the same photo cannot be claimed twice
+        result['receipt_hash'] = image_key(image_bytes)
+        return result
 
-        return extracted_data
+    except OcrEngineError as e:
+        return {"error": str(e)}
 
     except Exception as e:
-        # Added check for common Base64 padding error
-        if 'incorrect padding' in str(e).lower():
-             return {"error": "OCR processing failed: Invalid Base64 string (padding error)."}
-        
         print(f"OCR processing error: {e}")
-        return {"error": f"OCR processing failed: {e}"}
\ No newline at end of file
+        return {"error": f"OCR processing failed: {e}"}
@@ -0,0 +1,131 @@
+# services/rate_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+from services import http_client
+
+# Using ExchangeRate-API for the full rate table of a base currency
+EXCHANGE_API_URL = "https://api.exchangerate-api.com/v4/latest/{BASE_CURRENCY}"
+
+
+class HttpRateSource:
+    """
+    Fetches the full `rates` table for a base currency from ExchangeRate-API, through
+    the shared pooled HTTP client (or `client`, if given).
+    """
+
+    def __init__(self, url=EXCHANGE_API_URL, timeout=5, client=None):
+        self.url = url
+        self.timeout = timeout
+        self.client = client
+
+    def fetch(self, base_currency):
+        """Returns {currency_code: rate} where rate is units per 1 base unit, or None on failure."""
+        client = self.client or http_client.get_client()
+        try:
+            body = client.get_json(
+                self.url.format(BASE_CURRENCY=base_currency), endpoint='exchange-rates', timeout=self.timeout
+            )
+        except http_client.HttpError as e:
+            print(f"Error fetching exchange rates for {base_currency}: {e}")
+            return None
+        return (body.get('rates') if isinstance(body, dict) else None) or None
+
+
+class StaticRateSource:
+    """In-memory source for tests and benchmarks: {base_currency: {currency_code: rate}}."""
+
+    def __init__(self, tables):
+        self.tables = {base.upper(): dict(rates) for base, rates in tables.items()}
+        self.fetch_count = 0
+
+    def fetch(self, base_currency):
+        self.fetch_count += 1
+        return self.tables.get(base_currency)
+
+
+class RateCache:
+    """
+    Process-local cache of full rate tables, keyed by base currency.
+
+    Each entry holds one downloaded `rates` table and is reused for every target
+    currency until `ttl` seconds have passed. At most `max_entries` tables are kept
+    (least recently used are evicted first). When `pivot` is set, only the pivot
+    table is ever downloaded and every pair is derived as a cross rate through it.
+    """
+
+    def __init__(self, source=None, ttl=3600, max_entries=32, pivot=None):
+        self.source = source or HttpRateSource()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.pivot = pivot.upper() if pivot else None
+        self._tables = OrderedDict()  # base -> (fetched_at, rates)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get_rates(self, base_currency):
+        """Returns the rate table for `base_currency`, fetching it on a miss or after expiry."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._tables.get(base_currency)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self._tables.move_to_end(base_currency)
+                    self.hits += 1
+                    return entry[1]
+                self.stale += 1
+            else:
+                self.misses += 1
+
+        rates = self.source.fetch(base_currency)
+
+        with self._lock:
+            if rates is None:
+                # Serve the expired table rather than failing the caller outright
+                return entry[1] if entry is not None else None
+
+            rates = dict(rates)
+            rates.setdefault(base_currency, 1.0)
+            self._tables[base_currency] = (time.monotonic(), rates)
+            self._tables.move_to_end(base_currency)
+            while len(self._tables) > self.max_entries:
+                self._tables.popitem(last=False)
+            return rates
+
+    def get_rate(self, base_currency, target_currency):
+        """Returns target units per 1 base unit, or None if the pair cannot be priced."""
+        base_currency = base_currency.upper()
+        target_currency = target_currency.upper()
+        if base_currency == target_currency:
+            return 1.0
+
+        if self.pivot:
+            rates = self.get_rates(self.pivot)
+            if not rates or base_currency not in rates or target_currency not in rates:
+                return None
+            # Cross rate: (target per pivot) / (base per pivot)
+            return rates[target_currency] / rates[base_currency]
+
+        rates = self.get_rates(base_currency)
+        if not rates:
+            return None
+        return rates.get(target_currency)
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'entries': len(self._tables),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'pivot': self.pivot,
+            }
@@ -0,0 +1,135 @@
+# services/rate_store.py
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from sqlalchemy import delete, func, insert, select
+
+from extensions import db
+from models import ExchangeRate
+
+# Snapshots are stored against a single base; every pair is derived as a cross rate
+STORE_BASE_CURRENCY = os.getenv('EXCHANGE_RATE_STORE_BASE', 'USD').upper()
+# A snapshot older than this (relative to the requested date) is treated as missing
+MAX_SNAPSHOT_AGE_DAYS = int(os.getenv('EXCHANGE_RATE_MAX_AGE_DAYS', 7))
+# How long a looked-up rate is reused in this process. Snapshots are usually imported by another
+# process (flask import-rates), so this bounds how long a replaced or new snapshot goes unnoticed.
+LOOKUP_TTL = float(os.getenv('EXCHANGE_RATE_STORE_TTL', 60))
+LOOKUP_MAX_ENTRIES = 4096
+
+_lookups = OrderedDict()  # (base, target, as_of) -> (looked_up_at, rate)
+_lookups_lock = threading.Lock()
+
+
+def rebase(rates, from_currency, to_currency=STORE_BASE_CURRENCY):
+    """
+    Re-expresses a table of rates per 1 `from_currency` as rates per 1 `to_currency`.
+    Raises ValueError when the table has no rate for `to_currency`.
+    """
+    from_currency, to_currency = from_currency.upper(), to_currency.upper()
+    rates = {code.upper(): rate for code, rate in rates.items() if rate}
+    if from_currency == to_currency:
+        return rates
+    pivot = rates.get(to_currency)
+    if not pivot:
+        raise ValueError(f"A {from_currency}-based snapshot needs a {to_currency} rate to be stored.")
+    rebased = {code: rate / pivot for code, rate in rates.items() if code != to_currency}
+    rebased[from_currency] = 1 / pivot
+    return rebased
+
+
+def import_snapshot(rates, as_of=None, base_currency=STORE_BASE_CURRENCY, commit=True):
+    """
+    Stores one day's rate table ({currency_code: rate per 1 base unit}). Tables for
+    another base are rebased onto STORE_BASE_CURRENCY first (see rebase), since
+    lookups only read that base. Re-importing the same day replaces the previous
+    rows. Returns the row count.
+    """
+    as_of = as_of or date.today()
+    rates = rebase(rates, base_currency)
+    base_currency = STORE_BASE_CURRENCY
+
+    rows = [
+        {'base_currency': base_currency, 'currency': code, 'rate_date': as_of, 'rate': rate}
+        for code, rate in rates.items()
+    ]
+
+    db.session.execute(
+        delete(ExchangeRate).where(
+            ExchangeRate.base_currency == base_currency,
+            ExchangeRate.rate_date == as_of
+        )
+    )
+    if rows:
+        db.session.execute(insert(ExchangeRate), rows)
+    if commit:
+        db.session.commit()
+
+    clear_lookups()
+    return len(rows)
+
+
+def import_daily_snapshot(source, as_of=None, base_currency=STORE_BASE_CURRENCY):
+    """Pulls today's table for the store base from a rate source and stores it."""
+    rates = source.fetch(base_currency.upper())
+    if not rates:
+        return 0
+    return import_snapshot(rates, as_of=as_of, base_currency=base_currency)
+
+
+def get_rate(base_currency, target_currency, as_of):
+    """Returns target units per 1 base unit as of the given date, or None if no snapshot covers it."""
+    base_currency = base_currency.upper()
+    target_currency = target_currency.upper()
+    if base_currency == target_currency:
+        return 1.0
+
+    key = (base_currency, target_currency, as_of)
+    now = time.monotonic()
+    with _lookups_lock:
+        entry = _lookups.get(key)
+        if entry is not None and now - entry[0] < LOOKUP_TTL:
+            return entry[1]
+
+    rate = _lookup_rate(base_currency, target_currency, as_of)
+    # "No snapshot yet" is not remembered: the next import must be picked up right away
+    if rate is not None:
+        with _lookups_lock:
+            _lookups[key] = (now, rate)
+            _lookups.move_to_end(key)
+            while len(_lookups) > LOOKUP_MAX_ENTRIES:
+                _lookups.popitem(last=False)
+    return rate
+
+
+def clear_lookups():
+    """Forgets the rates looked up by this process (other processes expire theirs after LOOKUP_TTL)."""
+    with _lookups_lock:
+        _lookups.clear()
+
+
+def _lookup_rate(base_currency, target_currency, as_of):
+    # Latest snapshot day on or before as_of, resolved in the same statement
+    snapshot_date = select(func.max(ExchangeRate.rate_date)).where(
+        ExchangeRate.base_currency == STORE_BASE_CURRENCY,
+        ExchangeRate.rate_date <= as_of,
+        ExchangeRate.rate_date >= as_of - timedelta(days=MAX_SNAPSHOT_AGE_DAYS)
+    ).scalar_subquery()
+
+    rows = db.session.execute(
+        select(ExchangeRate.currency, ExchangeRate.rate).where(
+            ExchangeRate.base_currency == STORE_BASE_CURRENCY,
+            ExchangeRate.rate_date == snapshot_date,
+            ExchangeRate.currency.in_([base_currency, target_currency])
+        )
+    ).all()
+
+    rates = {code: float(rate) for code, rate in rows}
+    rates.setdefault(STORE_BASE_CURRENCY, 1.0)
+
+    if base_currency not in rates or target_currency not in rates:
+        return None
+    # Cross rate: (target per store base) / (base per store base)
+    return rates[target_currency] / rates[base_currency]
@@ -0,0 +1,190 @@
+# services/receipt_parser.py
+import json
+import re
+
+from services.currency_service import known_currency_codes
+
+# Category -> keywords. Order is the tie-break priority when two categories score the same.
+DEFAULT_CATEGORY_KEYWORDS = {
+    'Travel': ['uber', 'lyft', 'ola', 'taxi', 'cab', 'transport', 'flight', 'airline', 'airport',
+               'train', 'railway', 'metro', 'bus', 'fuel', 'petrol', 'parking', 'toll'],
+    'Lodging': ['hotel', 'lodging', 'inn', 'resort', 'motel', 'hostel', 'suite', 'room charge'],
+    'Food': ['food', 'restaurant', 'cafe', 'coffee', 'dinner', 'lunch', 'breakfast', 'bistro',
+             'pizza', 'burger', 'bar', 'grill', 'kitchen', 'bakery'],
+}
+
+DEFAULT_CATEGORY = 'Miscellaneous'
+
+CURRENCY_SYMBOLS = {'$': 'USD', '€': 'EUR', '£': 'GBP', '¥': 'JPY', '₹': 'INR'}
+
+_NUMBER = r'\d{1,3}(?:[,.]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?'
+
+# Amount with a currency marker on either side: "USD 12.50", "$12.50", "12.50 EUR", "12,50 €".
+# Two patterns, so a word that is not a currency code cannot swallow the next amount. Codes must be
+# upper case: item words such as "Cup" or "pen" would otherwise read as CUP or PEN.
+_PREFIXED_AMOUNT = re.compile(r'(?P<marker>\b[A-Z]{3}\b|[$€£¥₹])\s{0,2}(?P<number>' + _NUMBER + r')')
+_SUFFIXED_AMOUNT = re.compile(r'(?P<number>' + _NUMBER + r')\s{0,2}(?P<marker>\b[A-Z]{3}\b|[€£¥₹])')
+# Bare amounts must carry decimals, so dates, phone numbers and item counts are skipped
+_BARE_AMOUNT = re.compile(
+    r'(?<![\d.,])(\d{1,3}(?:,\d{3})+\.\d{2}|\d{1,3}(?:\.\d{3})+,\d{2}|\d+[.,]\d{2})(?![\d.,]*\d)'
+)
+
+# Labels that mark the payable total, strongest first. "Subtotal" never counts.
+_TOTAL_LABELS = [
+    (3, re.compile(r'\bgrand\s*total\b', re.IGNORECASE)),
+    (2, re.compile(
+        r'(?<!sub)(?<!sub )(?<!sub-)\btotal\b(?!\s*(?:items?|qty|quantity|tax|vat|savings|discount))'
+        r'|\b(?:amount|balance)\s+due\b|\bto\s+pay\b',
+        re.IGNORECASE
+    )),
+    (1, re.compile(r'\b(?:amount|net)\b', re.IGNORECASE)),
+]
+
+# Words that do not tell one merchant from another
+_MERCHANT_STOPWORDS = frozenset({
+    'the', 'and', 'of', 'to', 'at', 'welcome', 'receipt', 'invoice', 'bill', 'tax', 'store', 'shop',
+    'ltd', 'inc', 'llc', 'co', 'pvt', 'plc', 'gmbh',
+})
+_WORD = re.compile(r'[^\W\d_]{2,}')
+
+
+def _parse_number(text):
+    """'1,234.56', '1.234,56' and '12,50' -> float."""
+    if ',' in text and '.' in text:
+        # The right-most separator is the decimal point
+        if text.rfind(',') > text.rfind('.'):
+            text = text.replace('.', '').replace(',', '.')
+        else:
+            text = text.replace(',', '')
+    elif ',' in text:
+        head, _, tail = text.rpartition(',')
+        text = f"{head.replace(',', '')}.{tail}" if len(tail) <= 2 else text.replace(',', '')
+    elif text.count('.') > 1 or ('.' in text and len(text.rpartition('.')[2]) == 3):
+        # "1.234.567" or "1.234": dots as thousands separators
+        text = text.replace('.', '')
+    return float(text)
+
+
+def merchant_tokens(text, max_lines=3, max_tokens=4):
+    """
+    Normalized merchant name: the words of the first of the top `max_lines` lines
+    that has any (receipts print the merchant first), lower-cased, de-duplicated
+    and sorted, so "Blue Door Cafe" and "BLUE DOOR CAFE  " agree. '' if none.
+    """
+    for line in text.splitlines()[:max_lines]:
+        words = sorted({word.lower() for word in _WORD.findall(line)} - _MERCHANT_STOPWORDS)
+        if words:
+            return ' '.join(words[:max_tokens])
+    return ''
+
+
+def load_category_table(path):
+    """Reads a {category: [keywords]} JSON file; falls back to the defaults when path is empty."""
+    if not path:
+        return DEFAULT_CATEGORY_KEYWORDS
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ReceiptParser:
+    """
+    Turns OCR text into suggested amount, currency and category.
+
+    All patterns are compiled once per parser. Categories are matched with a single
+    combined keyword pattern in one pass over the text; the category with the most
+    keyword hits wins (ties go to the earlier category in the table). The amount comes
+    from the strongest TOTAL-style line, or the line right after a bare label.
+    """
+
+    def __init__(self, categories=None, default_category=DEFAULT_CATEGORY, currency_codes=None):
+        self.categories = list((categories or DEFAULT_CATEGORY_KEYWORDS).items())
+        self.default_category = default_category
+        self.currency_codes = set(currency_codes) if currency_codes is not None else known_currency_codes()
+
+        self._priority = {category: rank for rank, (category, _) in enumerate(self.categories)}
+        self._keyword_category = {}
+        for category, keywords in self.categories:
+            for keyword in keywords:
+                self._keyword_category.setdefault(keyword.lower(), category)
+
+        # Longest keywords first so "room charge" wins over a shorter overlapping keyword
+        alternation = '|'.join(
+            re.escape(keyword).replace(r'\ ', r'\s+')
+            for keyword in sorted(self._keyword_category, key=len, reverse=True)
+        )
+        self._keywords = re.compile(r'\b(' + alternation + r')(?:s|es)?\b', re.IGNORECASE) if alternation else None
+
+    def _currency(self, marker):
+        if marker in CURRENCY_SYMBOLS:
+            return CURRENCY_SYMBOLS[marker]
+        return marker if marker in self.currency_codes else None
+
+    def _line_amounts(self, line):
+        """[(amount, currency or None)] in line order."""
+        amounts, taken = [], set()
+        for pattern in (_PREFIXED_AMOUNT, _SUFFIXED_AMOUNT):
+            for match in pattern.finditer(line):
+                currency = self._currency(match.group('marker'))
+                if currency is None or match.start('number') in taken:
+                    continue
+                taken.add(match.start('number'))
+                amounts.append((match.start('number'), _parse_number(match.group('number')), currency))
+
+        for match in _BARE_AMOUNT.finditer(line):
+            if match.start(1) not in taken:
+                amounts.append((match.start(1), _parse_number(match.group(1)), None))
+
+        amounts.sort()
+        return [(amount, currency) for _, amount, currency in amounts]
+
+    def classify(self, text):
+        if self._keywords is None:
+            return self.default_category
+        scores = {}
+        for match in self._keywords.finditer(text):
+            category = self._keyword_category[re.sub(r'\s+', ' ', match.group(1).lower())]
+            scores[category] = scores.get(category, 0) + 1
+        if not scores:
+            return self.default_category
+        return min(scores, key=lambda category: (-scores[category], self._priority[category]))
+
+    def parse(self, text):
+        lines = text.splitlines()
+        line_amounts = [self._line_amounts(line) for line in lines]
+
+        best = None  # (label rank, line index, amount, currency)
+        for index, line in enumerate(lines):
+            rank = next((rank for rank, pattern in _TOTAL_LABELS if pattern.search(line)), 0)
+            if not rank:
+                continue
+            candidates = line_amounts[index]
+            if not candidates and index + 1 < len(lines):
+                # Label on its own line, value printed underneath
+                candidates = line_amounts[index + 1][:1]
+            if candidates and (best is None or rank >= best[0]):
+                amount, currency = candidates[-1]
+                best = (rank, index, amount, currency)
+
+        all_amounts = [entry for amounts in line_amounts for entry in amounts]
+        tagged = [entry for entry in all_amounts if entry[1]]
+
+        if best is not None:
+            amount, currency = best[2], best[3]
+        elif tagged:
+            # No total label: the largest priced amount is the likeliest total
+            amount, currency = max(tagged)
+        else:
+            amount, currency = None, None
+
+        if amount is not None and currency is None and tagged:
+            # Currency printed elsewhere on the receipt (header, item lines)
+            codes = [code for _, code in tagged]
+            currency = max(set(codes), key=codes.count)
+
+        return {
+            'full_text': text,
+            'suggested_amount': amount,
+            'suggested_currency': currency,
+            'suggested_category': self.classify(text),
+            'merchant': merchant_tokens(text) or None,
+        }
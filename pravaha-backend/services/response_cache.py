@@ -0,0 +1,67 @@
+# services/response_cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def etag(body):
+    """Strong validator for a serialized body: a short content hash."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """
+    Serialized read responses keyed by (path, query, versions of the data scopes
+    they read), e.g. scope ('company', 3) or ('user', 12).
+
+    Writes bump the versions of the scopes they touch once they have committed, so
+    the next read computes a new key and recomputes; superseded entries just age
+    out of the LRU (`max_entries`, 0 disables storing). Versions live in this
+    process only: `ttl` bounds how long an entry can outlive a write made by
+    another worker process.
+    """
+
+    def __init__(self, max_entries=512, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._versions = {}
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def versions(self, scopes):
+        with self._lock:
+            return tuple(self._versions.get(scope, 0) for scope in scopes)
+
+    def bump(self, *scopes):
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
@@ -0,0 +1,26 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import db
+import migrations
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App on a fresh SQLite file at the latest schema, with the response cache off."""
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'pravaha.db'}",
+        'SECRET_KEY': 'test-secret',
+        'METRICS_ENABLED': False,
+        'RESPONSE_CACHE_SIZE': 0,
+    })
+    with app.app_context():
+        migrations.upgrade(echo=lambda message: None)
+        yield app
+        db.session.remove()
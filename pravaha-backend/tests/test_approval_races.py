@@ -0,0 +1,109 @@
+# tests/test_approval_races.py
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import ApprovalRule, Company, Expense, User
+from services import approval_engine, bulk_expenses
+
+
+def seed_workflow():
+    """A Pending expense whose only step needs both of two approvers. Returns (expense_id, approver ids)."""
+    company = Company(name='acme', currency_code='INR')
+    db.session.add(company)
+    db.session.flush()
+    users = []
+    for index, role in enumerate(('Employee', 'Finance', 'Finance')):
+        user = User(email=f'user{index}@acme.test', full_name=f'User {index}', role=role, company_id=company.id)
+        user.set_password('secret')
+        users.append(user)
+    db.session.add_all(users)
+    db.session.flush()
+    submitter, *approvers = users
+    db.session.add(ApprovalRule(
+        company_id=company.id, name='Two signatures', priority=1, conditions={},
+        steps=[{'approver': 'users', 'user_ids': [approver.id for approver in approvers], 'min_approvals': 2}]
+    ))
+    expense = Expense(
+        amount=10, currency='USD', base_amount=800, category='Travel', description='Taxi',
+        date=date(2025, 1, 1), status='Pending', user_id=submitter.id, company_id=company.id
+    )
+    db.session.add(expense)
+    db.session.flush()
+    approval_engine.invalidate(company.id)
+    assert approval_engine.start_workflows([expense]) == 1
+    db.session.commit()
+    return expense.id, [approver.id for approver in approvers]
+
+
+def approve(expense_id, approver_id, locked=None, release=None):
+    """One approver's decision in its own session, as the approve route makes it. Returns the final status set, if any."""
+    with Session(db.engine) as session:
+        approval_engine.lock_expenses([expense_id], session)
+        steps = approval_engine.load_steps([expense_id], session)[expense_id]
+        outcome, final_status = approval_engine.decide(steps, approver_id, 'Approved')
+        assert outcome == 'recorded'
+        if final_status:
+            session.execute(update(Expense).where(Expense.id == expense_id).values(status=final_status))
+        if locked is not None:
+            locked.set()
+            release.wait(5)
+        session.commit()
+        return final_status
+
+
+def test_concurrent_approvals_of_one_step_finish_the_workflow(app):
+    # Both approvers decide while the other's decision is still uncommitted; without the
+    # lock each tallies one approval of two and the expense would stay Pending for good
+    expense_id, (first, second) = seed_workflow()
+    locked, release = threading.Event(), threading.Event()
+    finals = {}
+
+    def run(approver_id, **events):
+        with app.app_context():
+            finals[approver_id] = approve(expense_id, approver_id, **events)
+
+    leader = threading.Thread(target=run, args=(first,), kwargs={'locked': locked, 'release': release})
+    leader.start()
+    assert locked.wait(5)
+    follower = threading.Thread(target=run, args=(second,))
+    follower.start()
+    time.sleep(0.2)  # the follower is now waiting for the lock
+    release.set()
+    leader.join(10)
+    follower.join(10)
+
+    assert finals == {first: None, second: 'Approved'}
+    assert db.session.scalar(select(Expense.status).where(Expense.id == expense_id)) == 'Approved'
+
+
+def test_bulk_update_skips_rows_changed_since_they_were_read(app, monkeypatch):
+    expense_id, _ = seed_workflow()
+    db.session.execute(update(Expense).where(Expense.id == expense_id).values(status='Rejected'))
+    db.session.commit()
+    company_id = db.session.scalar(select(Expense.company_id).where(Expense.id == expense_id))
+    manager = User(email='manager@acme.test', full_name='Manager', role='Manager', company_id=company_id)
+    manager.set_password('secret')
+    db.session.add(manager)
+    db.session.commit()
+    # No workflow in the way, and another writer approves the row between the read and the UPDATE
+    monkeypatch.setattr(approval_engine, 'load_steps', lambda expense_ids, session=None: {})
+    load_rows = db.session.execute
+
+    def execute(statement, *args, **kwargs):
+        result = load_rows(statement, *args, **kwargs)
+        if getattr(statement, 'is_select', False) and 'same_company' in str(statement):
+            rows = result.all()
+            load_rows(update(Expense).where(Expense.id == expense_id).values(status='Approved'))
+            return rows
+        return result
+    monkeypatch.setattr(db.session, 'execute', execute)
+
+    results, updated = bulk_expenses.update_status_bulk([expense_id], 'Approved', manager.id, direct=True)
+
+    assert updated == 0
+    assert results[0]['status'] == 'conflict'
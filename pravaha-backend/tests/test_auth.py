@@ -0,0 +1,155 @@
+# tests/test_auth.py
+from datetime import date
+
+import pytest
+
+from extensions import db
+from models import Company, Expense, User
+from services import auth, hierarchy
+
+READ_ROUTES = [
+    '/api/admin/users',
+    '/api/expenses/company/1/export',
+    '/api/expenses/pending',
+    '/api/users/1/reports',
+    '/api/users/1/approval-chain',
+    '/api/companies/1/approval-rules',
+    '/api/expenses/1/approvals',
+    '/api/approvals/pending',
+    '/api/analytics/summary',
+]
+
+
+def seed_company(name):
+    """A company with one user per role and a Pending expense of the employee. Returns {role: User}."""
+    company = Company(name=name, currency_code='INR')
+    db.session.add(company)
+    db.session.flush()
+    users = {}
+    for role in ('Admin', 'Manager', 'Finance', 'Employee'):
+        user = User(email=f'{role.lower()}@{name}.test', full_name=f'{role} {name}', role=role, company_id=company.id)
+        user.set_password('secret')
+        users[role] = user
+    db.session.add_all(users.values())
+    db.session.flush()
+    users['Employee'].manager_id = users['Manager'].id
+    for user in users.values():
+        hierarchy.add_user(user.id, user.manager_id)
+    db.session.add(Expense(
+        amount=10, currency='USD', base_amount=800, category='Food', description='Lunch', date=date(2025, 1, 2),
+        status='Pending', user_id=users['Employee'].id, company_id=company.id
+    ))
+    db.session.commit()
+    return users
+
+
+def bearer(app, user):
+    return {'Authorization': f"Bearer {app.extensions['auth'].issue(user)}"}
+
+
+@pytest.mark.parametrize('url', READ_ROUTES)
+def test_read_routes_need_a_token(app, url):
+    seed_company('acme')
+    response = app.test_client().get(url)
+    assert response.status_code == 401
+
+
+def test_reads_are_scoped_to_the_token_company(app):
+    acme, other = seed_company('acme'), seed_company('other')
+    client = app.test_client()
+
+    # A company_id argument no longer picks the company
+    url = f"/api/expenses/pending?company_id={other['Admin'].company_id}"
+    response = client.get(url, headers=bearer(app, acme['Admin']))
+    assert [row['user_id'] for row in response.get_json()] == [acme['Employee'].id]
+
+    response = client.get(f"/api/users/{other['Employee'].id}/approval-chain", headers=bearer(app, acme['Admin']))
+    assert response.status_code == 404
+
+    response = client.get('/api/admin/users', headers=bearer(app, acme['Admin']))
+    assert {user['email'] for user in response.get_json()} == {user.email for user in acme.values()}
+
+
+def test_company_export_needs_a_report_role(app):
+    users = seed_company('acme')
+    other = seed_company('other')
+    client = app.test_client()
+    url = f"/api/expenses/company/{users['Admin'].company_id}/export"
+
+    assert client.get(url, headers=bearer(app, users['Employee'])).status_code == 403
+    assert client.get(url, headers=bearer(app, other['Finance'])).status_code == 404
+    response = client.get(url, headers=bearer(app, users['Finance']))
+    assert response.status_code == 200
+    assert len(response.get_data(as_text=True).splitlines()) == 1
+
+
+def test_forged_and_outdated_tokens_are_refused(app):
+    users = seed_company('acme')
+    client = app.test_client()
+    headers = bearer(app, users['Manager'])
+
+    forged = {'Authorization': headers['Authorization'][:-2] + 'xx'}
+    response = client.get('/api/approvals/pending', headers=forged)
+    assert response.status_code == 401
+    assert response.get_json()['message'] == "Invalid access token."
+
+    # A role change takes effect once the cached principal is dropped
+    users['Manager'].role = 'Employee'
+    db.session.commit()
+    app.extensions['auth'].invalidate(users['Manager'].id)
+    response = client.get('/api/approvals/pending', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['message'] == "Your account has changed. Please log in again."
+
+
+def test_principal_cache_evicts_the_least_recently_used():
+    loads = []
+
+    def loader(user_id):
+        loads.append(user_id)
+        return auth.Principal(user_id, 'Employee', 1, None)
+
+    authenticator = auth.Authenticator('test-secret', max_principals=2, loader=loader)
+    for user_id in (1, 2, 1, 3):
+        authenticator.get_principal(user_id)
+    assert loads == [1, 2, 3]
+
+    # 2 was the least recently used when 3 came in; 1 is still cached
+    authenticator.get_principal(1)
+    authenticator.get_principal(2)
+    assert loads == [1, 2, 3, 2]
+    assert authenticator.stats() == {'hits': 2, 'misses': 4, 'entries': 2}
+
+
+def test_login_is_throttled_after_repeated_failures(app):
+    users = seed_company('acme')
+    client = app.test_client()
+    limit = app.extensions['auth'].throttle.max_failures
+    wrong = {'email': users['Employee'].email, 'password': 'wrong'}
+
+    for _ in range(limit):
+        assert client.post('/api/login', json=wrong).status_code == 401
+    # Refused even with the right password until the window passes
+    response = client.post('/api/login', json={**wrong, 'password': 'secret'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+
+    # Other accounts are unaffected
+    assert client.post('/api/login', json={'email': users['Admin'].email, 'password': 'secret'}).status_code == 200
+
+
+def test_login_throttle_window_and_reset(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(auth.time, 'monotonic', lambda: now[0])
+    throttle = auth.LoginThrottle(max_failures=2, window=60)
+
+    throttle.failure('key')
+    throttle.failure('key')
+    assert throttle.retry_after('key') == 61
+    now[0] += 60
+    assert throttle.retry_after('key') == 0
+
+    throttle.failure('key')
+    throttle.failure('key')
+    throttle.success('key')
+    assert throttle.retry_after('key') == 0
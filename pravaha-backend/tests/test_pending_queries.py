@@ -0,0 +1,82 @@
+# tests/test_pending_queries.py
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+from models import Company, Expense, User
+from services import hierarchy
+
+
+def seed_company(name, pending):
+    """
+    A company with an admin, a manager, two reports and `pending` Pending expenses split
+    between the reports. Returns (admin, manager id).
+    """
+    company = Company(name=name, currency_code='INR')
+    db.session.add(company)
+    db.session.flush()
+    admin = User(email=f'admin@{name}.test', full_name='Admin', role='Admin', company_id=company.id)
+    manager = User(email=f'manager@{name}.test', full_name='Manager', role='Manager', company_id=company.id)
+    for user in (admin, manager):
+        user.set_password('secret')
+    db.session.add_all([admin, manager])
+    db.session.flush()
+    reports = []
+    for index in range(2):
+        report = User(
+            email=f'employee{index}@{name}.test', full_name=f'Employee {index}', role='Employee',
+            company_id=company.id, manager_id=manager.id
+        )
+        report.set_password('secret')
+        db.session.add(report)
+        reports.append(report)
+    db.session.flush()
+    for user in (admin, manager, *reports):
+        hierarchy.add_user(user.id, user.manager_id)
+
+    db.session.add_all(
+        Expense(
+            amount=10 + index, currency='USD', base_amount=800 + index, category='Food', description='Lunch',
+            date=date(2025, 1, 1 + index % 28), status='Pending', user_id=reports[index % 2].id,
+            company_id=company.id
+        )
+        for index in range(pending)
+    )
+    db.session.commit()
+    return admin, manager.id
+
+
+def get_counting_statements(client, url, headers):
+    """(number of SQL statements the request ran, JSON body)"""
+    statements = []
+
+    def record(*args):
+        statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url, headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200, response.get_json()
+    return len(statements), response.get_json()
+
+
+@pytest.mark.parametrize('by_manager', [False, True])
+def test_pending_listing_runs_one_query_whatever_the_size(app, by_manager):
+    client = app.test_client()
+    counts = {}
+    for pending in (10, 200):
+        admin, manager_id = seed_company(f'acme{pending}', pending)
+        # The company comes from the token, which also primes the principal cache
+        headers = {'Authorization': f"Bearer {app.extensions['auth'].issue(admin)}"}
+        url = "/api/expenses/pending"
+        if by_manager:
+            url += f"?manager_id={manager_id}"
+
+        counts[pending], rows = get_counting_statements(client, url, headers)
+        assert len(rows) == pending
+        assert {row['user_name'] for row in rows} == {'Employee 0', 'Employee 1'}
+
+    assert counts[10] == counts[200] == 1
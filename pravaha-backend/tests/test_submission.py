@@ -0,0 +1,32 @@
+# tests/test_submission.py
+import pytest
+
+from extensions import db
+from models import Company, Expense, User
+
+
+@pytest.fixture
+def employee_headers(app):
+    company = Company(name='acme', currency_code='INR')
+    db.session.add(company)
+    db.session.flush()
+    employee = User(email='employee@acme.test', full_name='Employee', role='Employee', company_id=company.id)
+    employee.set_password('secret')
+    db.session.add(employee)
+    db.session.commit()
+    return {'Authorization': f"Bearer {app.extensions['auth'].issue(employee)}"}
+
+
+@pytest.mark.parametrize('currency', [840, ['USD'], {'code': 'USD'}, 'US', 'USDT', 'U$D', ' '])
+def test_invalid_currency_is_a_bad_request(app, employee_headers, currency):
+    expense = {'amount': 12.5, 'currency': currency, 'category': 'Food', 'date': '2025-01-02'}
+    client = app.test_client()
+
+    response = client.post('/api/expenses', json=expense, headers=employee_headers)
+    assert response.status_code == 400
+    assert response.get_json()['message'] in ("Invalid currency code.", "Missing required expense fields.")
+
+    response = client.post('/api/expenses/bulk', json={'expenses': [expense]}, headers=employee_headers)
+    assert response.status_code == 400
+    assert response.get_json()['results'][0]['status'] == 'error'
+    assert db.session.query(Expense).count() == 0
@@ -4,6 +4,12 @@ import { Camera, Upload, CheckCircle, XCircle, Clock, DollarSign, Users, FileTex
 // API Base URL
 const API_BASE = 'http://localhost:5000/api';
 
+// JSON headers carrying the access token issued at login
+const authHeaders = (user) => ({
+  'Content-Type': 'application/json',
+  Authorization: `Bearer ${user.access_token}`
+});
+
 // Theme colors
 const colors = {
   bg: '#0a0a0a',
@@ -30,6 +36,11 @@ function App() {
     const savedUser = localStorage.getItem('currentUser');
     if (savedUser) {
       const user = JSON.parse(savedUser);
+      // Sessions saved before access tokens existed have to log in again
+      if (!user.access_token) {
+        localStorage.removeItem('currentUser');
+        return;
+      }
       setCurrentUser(user);
       setCurrentView(user.role === 'Admin' ? 'dashboard' : 'myExpenses');
       loadExpenses(user.user_id);
@@ -470,7 +481,7 @@ function Dashboard({ user }) {
   const loadDashboardStats = async () => {
     try {
       // Fetch users count
-      const usersRes = await fetch(`${API_BASE}/admin/users?company_id=${user.company_id}`);
+      const usersRes = await fetch(`${API_BASE}/admin/users`, { headers: authHeaders(user) });
       const usersData = await usersRes.json();
       
       // Fetch all expenses count
@@ -478,7 +489,7 @@ function Dashboard({ user }) {
       const expensesData = await expensesRes.json();
       
       // Fetch pending expenses count
-      const pendingRes = await fetch(`${API_BASE}/expenses/pending?company_id=${user.company_id}`);
+      const pendingRes = await fetch(`${API_BASE}/expenses/pending`, { headers: authHeaders(user) });
       const pendingData = await pendingRes.json();
       
       setStats({
@@ -661,15 +672,25 @@ function SubmitExpense({ user, onSuccess }) {
     setLoading(true);
 
     try {
-      const response = await fetch(`${API_BASE}/expenses`, {
+      let response = await fetch(`${API_BASE}/expenses`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          ...formData,
-          user_id: user.user_id
-        })
+        headers: authHeaders(user),
+        body: JSON.stringify(formData)
       });
 
+      // Possible duplicate: let the user confirm before it is stored twice
+      if (response.status === 409) {
+        const data = await response.json();
+        if (!window.confirm(`${data.message}\n\nSubmit anyway?`)) {
+          return;
+        }
+        response = await fetch(`${API_BASE}/expenses`, {
+          method: 'POST',
+          headers: authHeaders(user),
+          body: JSON.stringify({ ...formData, allow_duplicate: true })
+        });
+      }
+
       if (response.ok) {
         alert('Expense submitted successfully!');
         onSuccess();
@@ -688,34 +709,34 @@ function SubmitExpense({ user, onSuccess }) {
     const file = e.target.files[0];
     if (!file) return;
 
-    const reader = new FileReader();
-    reader.onload = async () => {
-      const base64Data = reader.result.split(',')[1];
-      
-      try {
-        const response = await fetch(`${API_BASE}/ocr/process`, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ image_data: base64Data })
-        });
+    // Upload the raw file as multipart; no base64 encoding needed
+    const body = new FormData();
+    body.append('receipt', file);
 
-        const data = await response.json();
-        if (data.suggested_amount) {
-          setFormData({
-            ...formData,
-            amount: data.suggested_amount,
-            currency: data.suggested_currency || 'USD',
-            category: data.suggested_category || 'Miscellaneous'
-          });
-          alert('Receipt scanned successfully!');
-        } else {
-          alert('Could not extract data from receipt');
-        }
-      } catch (error) {
-        alert('OCR processing failed');
+    try {
+      const response = await fetch(`${API_BASE}/ocr/process`, {
+        method: 'POST',
+        body
+      });
+
+      const data = await response.json();
+      if (data.suggested_amount) {
+        setFormData({
+          ...formData,
+          amount: data.suggested_amount,
+          currency: data.suggested_currency || 'USD',
+          category: data.suggested_category || 'Miscellaneous',
+          // Lets the server recognise a second submission of the same receipt
+          receipt_hash: data.receipt_hash,
+          merchant: data.merchant
+        });
+        alert('Receipt scanned successfully!');
+      } else {
+        alert(data.message || 'Could not extract data from receipt');
       }
-    };
-    reader.readAsDataURL(file);
+    } catch (error) {
+      alert('OCR processing failed');
+    }
   };
 
   return (
@@ -885,7 +906,7 @@ function ManageUsers({ user }) {
   const loadUsers = async () => {
     setLoading(true);
     try {
-      const response = await fetch(`${API_BASE}/admin/users?company_id=${user.company_id}`);
+      const response = await fetch(`${API_BASE}/admin/users`, { headers: authHeaders(user) });
       const data = await response.json();
       setUsers(data);
       setManagers(data.filter(u => u.role === 'Manager' || u.role === 'Admin'));
@@ -902,12 +923,8 @@ function ManageUsers({ user }) {
     try {
       const response = await fetch(`${API_BASE}/admin/user`, {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          ...formData,
-          company_id: user.company_id,
-          requester_role: user.role
-        })
+        headers: authHeaders(user),
+        body: JSON.stringify(formData)
       });
 
       if (response.ok) {
@@ -928,11 +945,10 @@ function ManageUsers({ user }) {
     try {
       const response = await fetch(`${API_BASE}/admin/assign-manager`, {
         method: 'PATCH',
-        headers: { 'Content-Type': 'application/json' },
+        headers: authHeaders(user),
         body: JSON.stringify({
           employee_id: employeeId,
-          manager_id: managerId,
-          requester_role: user.role
+          manager_id: managerId
         })
       });
 
@@ -1120,11 +1136,8 @@ function ApproveExpenses({ user }) {
   const loadPendingExpenses = async () => {
     setLoading(true);
     try {
-      const url = user.role === 'Manager' 
-        ? `${API_BASE}/expenses/pending?company_id=${user.company_id}&manager_id=${user.user_id}`
-        : `${API_BASE}/expenses/pending?company_id=${user.company_id}`;
-      
-      const response = await fetch(url);
+      // Managers get the expenses of the people below them; Admins the whole company's
+      const response = await fetch(`${API_BASE}/expenses/pending`, { headers: authHeaders(user) });
       const data = await response.json();
       setPendingExpenses(data);
     } catch (error) {
@@ -1138,12 +1151,8 @@ function ApproveExpenses({ user }) {
     try {
       const response = await fetch(`${API_BASE}/expenses/approve/${expenseId}`, {
         method: 'PATCH',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          status,
-          manager_id: user.user_id,
-          requester_role: user.role
-        })
+        headers: authHeaders(user),
+        body: JSON.stringify({ status })
       });
 
       if (response.ok) {